@@ -1,10 +1,33 @@
-from flask import Flask, render_template, request, session, redirect, url_for, flash
-import json
-import random
+from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify, abort
 import sqlite3
 from datetime import datetime
 
+import hmac
 import os
+import secrets
+
+from basedatos import PoolConexiones
+from catalogo import CargadorCatalogo
+from clasificacion import Clasificacion, estadisticas_usuario
+from diccionario import MAX_RESULTADOS, RESULTADOS_POR_DEFECTO
+from ejercicios import generar_opciones
+from escritura import MODO_ESCRIBIR, MODO_OPCIONES, MODOS, explicar
+from estaticos import Recursos
+from exportar import FORMATOS, FiltroInvalido, exportar, filtros, nombre_archivo
+from fichas import FichaInvalida, FichasEjercicio, LimiteRespuestas, RegistroUsos
+from lotes import (EJERCICIOS_POR_LOTE, MAX_EJERCICIOS_POR_LOTE, VIDAS_INICIALES, VIGENCIA_LOTE, FirmaLotes,
+                   LoteInvalido, corregir, generar_lote)
+from medios import CACHE_MANIFIESTO, AlmacenMedios
+from migraciones import migrar
+from paginas import CachePaginas
+from progreso import ColaEscritura
+from repaso import cargar_plan
+from sesiones import AlmacenMemoria, crear_interfaz
+from usuarios import BuscadorUsuarios, USUARIOS_POR_PAGINA
+import metricas
+
+# Segundos que un plan de repaso se queda en memoria sin usarse
+TTL_PLANES = 3600
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'tu_clave_secreta_aqui')  # Cambia esto por una clave segura
@@ -19,79 +42,119 @@ class AprendizajeMayaKicheWeb:
 
     def conectar_db(self):
         """Conectar a la base de datos SQLite"""
-        self.conn = sqlite3.connect('maya_kiche.db', check_same_thread=False)
-        self.c = self.conn.cursor()
+        # Una conexión por hilo de trabajo, en modo WAL (y medida si hay métricas)
+        self.db = PoolConexiones(fabrica=metricas.ConexionMedida if metricas.activas else None)
 
-        # Crear tablas si no existen
-        self.c.execute('''CREATE TABLE IF NOT EXISTS usuarios
-                         (id INTEGER PRIMARY KEY, nombre TEXT UNIQUE, puntos INTEGER DEFAULT 0, leccion_actual INTEGER DEFAULT 1)''')
+        # Crear o actualizar el esquema (compartido con kiche.py)
+        migrar(self.db.conexion())
 
-        self.c.execute('''CREATE TABLE IF NOT EXISTS progreso
-                         (usuario_id INTEGER, leccion_id INTEGER, completada BOOLEAN DEFAULT FALSE,
-                         fecha_completado DATE, FOREIGN KEY(usuario_id) REFERENCES usuarios(id))''')
+        # Respuestas, puntos y lecciones completadas se escriben en segundo plano
+        self.progreso = ColaEscritura(self.db)
 
-        self.conn.commit()
+        # Búsqueda de usuarios por prefijo para la pantalla de login
+        self.usuarios = BuscadorUsuarios(self.db)
+
+        # Clasificación por puntos, a partir de los agregados de `estadisticas`
+        self.clasificacion = Clasificacion(self.db)
+
+        # Planes de repetición espaciada por (usuario, lección) en este worker
+        self.planes = AlmacenMemoria(capacidad=5000)
 
     def cargar_lecciones(self):
         """Cargar lecciones desde archivo JSON o crear datos de ejemplo"""
-        try:
-            with open('lecciones_maya_kiche.json', 'r', encoding='utf-8') as f:
-                self.lecciones = json.load(f)
-        except FileNotFoundError:
-            # Crear datos de ejemplo si el archivo no existe
-            self.lecciones = {
-                "basico": [
-                    {
-                        "id": 1,
-                        "titulo": "Saludos Básicos",
-                        "tipo": "vocabulario",
-                        "contenido": [
-                            {"maya": "Saqarik", "espanol": "Buenos días", "imagen": "sol.png"},
-                            {"maya": "Xqa q'ij", "espanol": "Buenas tardes", "imagen": "tarde.png"},
-                            {"maya": "Xokaq'ab'", "espanol": "Buenas noches", "imagen": "noche.png"},
-                            {"maya": "Utz awach?", "espanol": "¿Cómo estás?", "imagen": "saludo.png"},
-                            {"maya": "Utz tinimit", "espanol": "Estoy bien", "imagen": "bien.png"}
-                        ]
-                    },
-                    {
-                        "id": 2,
-                        "titulo": "Números 1-10",
-                        "tipo": "numeros",
-                        "contenido": [
-                            {"maya": "Jun", "espanol": "Uno", "imagen": "1.png"},
-                            {"maya": "Kieb'", "espanol": "Dos", "imagen": "2.png"},
-                            {"maya": "Oxib'", "espanol": "Tres", "imagen": "3.png"},
-                            {"maya": "Kajib'", "espanol": "Cuatro", "imagen": "4.png"},
-                            {"maya": "Job'", "espanol": "Cinco", "imagen": "5.png"}
-                        ]
-                    }
-                ],
-                "intermedio": [
-                    {
-                        "id": 3,
-                        "titulo": "Familia",
-                        "tipo": "vocabulario",
-                        "contenido": [
-                            {"maya": "Na", "espanol": "Madre", "imagen": "madre.png"},
-                            {"maya": "Te", "espanol": "Padre", "imagen": "padre.png"},
-                            {"maya": "Ali", "espanol": "Hijo/Hija", "imagen": "hijo.png"},
-                            {"maya": "Achijab'", "espanol": "Hermano", "imagen": "hermano.png"}
-                        ]
-                    }
-                ]
-            }
-
-            # Guardar datos de ejemplo
-            with open('lecciones_maya_kiche.json', 'w', encoding='utf-8') as f:
-                json.dump(self.lecciones, f, ensure_ascii=False, indent=2)
+        # El cargador valida el archivo y lo recarga si cambia, sin reiniciar
+        self.cargador = CargadorCatalogo('lecciones_maya_kiche.json')
+
+    @property
+    def catalogo(self):
+        """Índice de lecciones vigente"""
+        return self.cargador.actual()
+
+    @property
+    def diccionario(self):
+        """Diccionario del catálogo vigente (se construye en la primera búsqueda)"""
+        return self.catalogo.diccionario()
+
+    def plan_repaso(self, usuario_id, leccion_id, catalogo, recargar=False):
+        """Plan de repetición espaciada del usuario para una lección.
+
+        Se guarda en memoria entre ejercicios; si no está (otro worker,
+        expiró o cambió el catálogo) se reconstruye desde la base de datos.
+        """
+        clave = (usuario_id, leccion_id, catalogo.version)
+        plan = None if recargar else self.planes.obtener(clave)
+        if plan is None:
+            palabras = [p["maya"] for p in catalogo.leccion(leccion_id)["contenido"]]
+            plan = cargar_plan(self.db.conexion(), usuario_id, leccion_id, palabras)
+        self.planes.guardar(clave, plan, TTL_PLANES)
+        return plan
 
 # Instancia global de la aplicación
 app_maya = AprendizajeMayaKicheWeb()
 
+# Sesión en el servidor opcional: SESSION_BACKEND=memoria|sqlite (por defecto, cookie firmada)
+interfaz_sesion = crear_interfaz(os.environ.get('SESSION_BACKEND', 'cookie'), pool=app_maya.db)
+if interfaz_sesion:
+    app.session_interface = interfaz_sesion
+
+# Tokens de los lotes de ejercicios de la API JSON
+firma_lotes = FirmaLotes(app.secret_key)
+lotes_corregidos = RegistroUsos(VIGENCIA_LOTE)
+
+# La respuesta correcta se comprueba en el servidor con fichas firmadas,
+# y cada usuario tiene un límite de respuestas por segundo
+fichas = FichasEjercicio(app.secret_key)
+limite_respuestas = LimiteRespuestas()
+
+# Páginas renderizadas por plantilla y versión del catálogo, con ETag
+paginas = CachePaginas()
+
+# Imágenes y audios de las palabras, por huella de contenido (MAYA_MEDIOS)
+medios = AlmacenMedios()
+
+# Métricas en /metrics (METRICAS=0 para desactivarlas, METRICAS_TOKEN para leerlas) y perfilador opcional
+if metricas.activas:
+    metricas.instrumentar(app)
+    metricas.medir_caches({'paginas': paginas, 'usuarios': app_maya.usuarios, 'planes': app_maya.planes,
+                           'medios': medios.cache})
+    metricas.registro.medidor(lambda: [('maya_cola_pendientes', (), app_maya.progreso.pendientes()),
+                                       ('maya_sqlite_conexiones', (), app_maya.db.abiertas())])
+perfilador = metricas.PerfiladorMuestreo(float(os.environ['PERFIL_HZ'])) if os.environ.get('PERFIL_HZ') else None
+if perfilador:
+    app.before_request(perfilador.arrancar)
+
+# CSS/JS minificados, con huella en el nombre y precomprimidos al arrancar
+recursos = Recursos()
+app.jinja_env.globals['recurso'] = recursos.url
+
+@app.route('/recursos/<path:nombre>')
+def recurso(nombre):
+    """Servir un CSS/JS con huella, con caché inmutable"""
+    respuesta = recursos.responder(app, nombre)
+    if respuesta is None:
+        abort(404)
+    return respuesta
+
+@app.route('/medios/<clave>')
+def medio(clave):
+    """Servir una imagen o un audio por su huella, con caché inmutable y rangos"""
+    respuesta = medios.responder(app, clave)
+    if respuesta is None:
+        abort(404)
+    return respuesta
+
 @app.route('/')
 def index():
     """Página de inicio"""
-    return render_template('index.html')
+    return paginas.responder(('index',), 'index.html')
+
+def iniciar_sesion(usuario_id, nombre):
+    """Entrar como el usuario con una sesión vacía y, si vive en el servidor, con un id nuevo"""
+    session.clear()
+    if hasattr(session, 'regenerar'):
+        session.regenerar()
+    session['usuario_id'] = usuario_id
+    session['usuario_nombre'] = nombre
 
 @app.route('/registro', methods=['GET', 'POST'])
 def registro():
@@ -101,10 +164,10 @@ def registro():
 
         if nombre:
             try:
-                app_maya.c.execute("INSERT INTO usuarios (nombre) VALUES (?)", (nombre,))
-                app_maya.conn.commit()
-                session['usuario_id'] = app_maya.c.lastrowid
-                session['usuario_nombre'] = nombre
+                with app_maya.db.transaccion() as conn:
+                    cursor = conn.execute("INSERT INTO usuarios (nombre) VALUES (?)", (nombre,))
+                iniciar_sesion(cursor.lastrowid, nombre)
+                app_maya.usuarios.invalidar()
                 flash(f"Usuario {nombre} creado correctamente", "success")
                 return redirect(url_for('lecciones'))
             except sqlite3.IntegrityError:
@@ -112,7 +175,7 @@ def registro():
         else:
             flash("Por favor ingresa un nombre de usuario", "error")
 
-    return render_template('registro.html')
+    return paginas.responder(('registro',), 'registro.html')
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -120,22 +183,35 @@ def login():
     if request.method == 'POST':
         nombre = request.form['nombre']
 
-        app_maya.c.execute("SELECT id, nombre FROM usuarios WHERE nombre = ?", (nombre,))
-        usuario = app_maya.c.fetchone()
+        usuario = app_maya.db.conexion().execute(
+            "SELECT id, nombre FROM usuarios WHERE nombre = ?", (nombre,)).fetchone()
 
         if usuario:
-            session['usuario_id'] = usuario[0]
-            session['usuario_nombre'] = usuario[1]
+            iniciar_sesion(usuario[0], usuario[1])
             flash(f"Hola {usuario[1]}!", "success")
             return redirect(url_for('lecciones'))
         else:
             flash("Usuario no encontrado", "error")
 
-    # Obtener lista de usuarios para el dropdown
-    app_maya.c.execute("SELECT nombre FROM usuarios")
-    usuarios = [fila[0] for fila in app_maya.c.fetchall()]
+    # La lista de usuarios se carga desde /api/usuarios mientras se escribe
+    return paginas.responder(('login',), 'login.html')
 
-    return render_template('login.html', usuarios=usuarios)
+@app.route('/api/usuarios')
+def buscar_usuarios():
+    """Buscar usuarios por prefijo, paginando con el último nombre recibido"""
+    prefijo = request.args.get('q', '').strip()
+    despues = request.args.get('despues', '')
+    limite = request.args.get('limite', USUARIOS_POR_PAGINA, type=int)
+
+    nombres, siguiente = app_maya.usuarios.buscar(prefijo, despues, limite)
+    return jsonify(usuarios=nombres, siguiente=siguiente)
+
+@app.route('/api/diccionario')
+def diccionario():
+    """Buscar una palabra en todo el vocabulario, en maya o en español"""
+    consulta = request.args.get('q', '').strip()
+    limite = max(1, min(request.args.get('limite', RESULTADOS_POR_DEFECTO, type=int), MAX_RESULTADOS))
+    return jsonify(resultados=app_maya.diccionario.buscar(consulta, limite))
 
 @app.route('/lecciones')
 def lecciones():
@@ -143,7 +219,9 @@ def lecciones():
     if 'usuario_id' not in session:
         return redirect(url_for('index'))
 
-    return render_template('lecciones.html', lecciones=app_maya.lecciones)
+    catalogo = app_maya.catalogo
+    return paginas.responder(('lecciones', catalogo.version), 'lecciones.html',
+                             lecciones=catalogo.por_nivel)
 
 @app.route('/leccion/<int:leccion_id>')
 def iniciar_leccion(leccion_id):
@@ -152,89 +230,325 @@ def iniciar_leccion(leccion_id):
         return redirect(url_for('index'))
 
     # Buscar la lección por ID
-    leccion = None
-    for nivel, lecciones_nivel in app_maya.lecciones.items():
-        for l in lecciones_nivel:
-            if l['id'] == leccion_id:
-                leccion = l
-                break
-        if leccion:
-            break
+    leccion = app_maya.catalogo.leccion(leccion_id)
 
     if not leccion:
         flash("Lección no encontrada", "error")
         return redirect(url_for('lecciones'))
 
-    # Reiniciar estado de la sesión para la nueva lección
-    session['leccion_actual'] = leccion
-    session['puntos'] = 0
-    session['vidas'] = 3
-    session['palabras_preguntadas'] = []
+    # ?modo=escribir: el alumno escribe la palabra en vez de elegirla
+    modo = request.args.get('modo', MODO_OPCIONES)
+    reiniciar_leccion(leccion_id, modo if modo in MODOS else MODO_OPCIONES)
 
     return redirect(url_for('ejercicio'))
 
+def reiniciar_leccion(leccion_id, modo=MODO_OPCIONES):
+    """Reiniciar el estado de la sesión para empezar una lección"""
+    # Solo se guarda el id; el contenido se resuelve desde el catálogo.
+    session.pop('leccion_actual', None)
+    session.pop('palabras_preguntadas', None)
+    session.pop('preguntadas', None)
+    session.pop('pregunta', None)
+    session.pop('lote', None)
+    session['leccion_id'] = leccion_id
+    session['modo'] = modo
+    session['puntos'] = 0
+    session['vidas'] = VIDAS_INICIALES
+
+    # Leer el estado de repaso guardado del usuario para esta lección, con
+    # lo que aún tenga en la cola de escritura ya escrito
+    app_maya.progreso.vaciar_usuario(session['usuario_id'])
+    app_maya.plan_repaso(session['usuario_id'], leccion_id, app_maya.catalogo, recargar=True)
+
+def terminar_leccion():
+    """Olvidar la lección al completarla o quedarse sin vidas: ya no se puede seguir sumando puntos"""
+    session.pop('leccion_id', None)
+    session.pop('pregunta', None)
+    session.pop('lote', None)
+
 @app.route('/ejercicio', methods=['GET', 'POST'])
 def ejercicio():
     """Mostrar un ejercicio de la lección actual"""
-    if 'usuario_id' not in session or 'leccion_actual' not in session:
+    if 'usuario_id' not in session or 'leccion_id' not in session:
         return redirect(url_for('index'))
 
-    leccion = session['leccion_actual']
+    leccion_id = session['leccion_id']
+    # Una sola versión del catálogo durante toda la petición
+    catalogo = app_maya.catalogo
+    leccion = catalogo.leccion(leccion_id)
+    if not leccion:
+        flash("Lección no encontrada", "error")
+        return redirect(url_for('lecciones'))
+
     puntos = session.get('puntos', 0)
     vidas = session.get('vidas', 3)
-    palabras_preguntadas = session.get('palabras_preguntadas', [])
+    modo = session.get('modo', MODO_OPCIONES)
+    usuario_id = session['usuario_id']
+    plan = app_maya.plan_repaso(usuario_id, leccion_id, catalogo)
+    # Índice de la palabra que se acaba de contestar; no se guarda en la sesión, que
+    # con la cookie firmada de Flask el cliente puede leer
+    pregunta = None
 
     if request.method == 'POST':
-        respuesta = request.form['respuesta']
-        correcta = request.form['correcta']
+        if not limite_respuestas.permitir(usuario_id):
+            return "Demasiadas respuestas seguidas; espera un momento", 429
+
+        # La ficha dice qué palabra se preguntó; la respuesta correcta sale del catálogo
+        try:
+            pregunta = fichas.verificar(request.form.get('ficha', ''), usuario_id,
+                                        leccion_id, catalogo.version)
+        except FichaInvalida as e:
+            flash(str(e), "error")
+            return redirect(url_for('ejercicio'))
+
+        respuesta = request.form.get('respuesta', '')
+        correcta = leccion["contenido"][pregunta]["maya"]
+        if modo == MODO_ESCRIBIR:
+            # Forma normalizada y árbol BK de la lección, preparados una vez por catálogo
+            correccion = catalogo.respuestas_escritas(leccion_id).corregir(respuesta, pregunta)
+            acierto = correccion.acierto
+            explicacion = explicar(correccion, leccion["contenido"], pregunta)
+        else:
+            acierto = respuesta == correcta
+            explicacion = None
+
+        app_maya.progreso.registrar_respuesta(usuario_id, leccion_id, correcta,
+                                              acierto, puntos=10 if acierto else 0)
 
-        if respuesta == correcta:
+        estado = plan.registrar(pregunta, acierto)
+        app_maya.progreso.registrar_repaso(usuario_id, leccion_id, correcta, estado)
+
+        if acierto:
             puntos += 10
             session['puntos'] = puntos
-            flash("¡Respuesta correcta! +10 puntos", "success")
+            flash(f"{explicacion} +10 puntos" if explicacion else "¡Respuesta correcta! +10 puntos", "success")
 
             if puntos >= 100:
+                app_maya.progreso.registrar_leccion_completada(usuario_id, leccion_id)
+                app_maya.clasificacion.invalidar()
+                terminar_leccion()
                 flash(f"¡Felicidades! Has completado la lección con {puntos} puntos!", "success")
                 return redirect(url_for('lecciones'))
         else:
             vidas -= 1
             session['vidas'] = vidas
 
+            if explicacion:
+                flash(explicacion, "error")
             if vidas <= 0:
+                terminar_leccion()
                 flash(f"Juego terminado. Puntos finales: {puntos}", "error")
                 return redirect(url_for('lecciones'))
             else:
                 flash(f"Respuesta incorrecta. Te quedan {vidas} vidas", "error")
 
-    # Obtener palabra aleatoria que no haya sido preguntada
-    contenido = leccion["contenido"]
-    palabras_disponibles = [p for p in contenido if p["espanol"] not in palabras_preguntadas]
-
-    if not palabras_disponibles:
-        # Si todas las palabras han sido preguntadas, reiniciar la lista
-        session['palabras_preguntadas'] = []
-        palabras_disponibles = contenido
-
-    palabra = random.choice(palabras_disponibles)
-    palabras_preguntadas.append(palabra["espanol"])
-    session['palabras_preguntadas'] = palabras_preguntadas
+    # La palabra que toca según la repetición espaciada, sin repetir la anterior
+    indice = plan.siguiente(evitar=pregunta)
+    palabra = leccion["contenido"][indice]
 
-    # Obtener opciones incorrectas
-    opciones_incorrectas = []
-    while len(opciones_incorrectas) < 3:
-        opcion = random.choice(contenido)
-        if opcion["maya"] != palabra["maya"] and opcion["maya"] not in opciones_incorrectas:
-            opciones_incorrectas.append(opcion["maya"])
-
-    # Mezclar opciones
-    opciones = [palabra["maya"]] + opciones_incorrectas
-    random.shuffle(opciones)
+    # Opciones: la correcta y distractores sin repetir, ya mezcladas
+    opciones = []
+    if modo == MODO_OPCIONES:
+        with metricas.registro.tramo('distractores'):
+            opciones = generar_opciones(catalogo.respuestas_distintas(leccion_id), palabra["maya"])
 
     return render_template('ejercicio.html',
                          palabra=palabra,
+                         imagen=medios.url(palabra.get("imagen")),
+                         ficha=fichas.emitir(usuario_id, leccion_id, catalogo.version, indice),
+                         modo=modo,
                          opciones=opciones,
                          puntos=puntos,
-                         vidas=vidas)
+                         vidas=vidas,
+                         leccion_id=leccion_id)
+
+@app.route('/api/leccion/<int:leccion_id>/ejercicios')
+def lote_ejercicios(leccion_id):
+    """Generar un lote de ejercicios para contestarlos en el navegador"""
+    if 'usuario_id' not in session:
+        return jsonify(error="Sesión no iniciada"), 401
+
+    catalogo = app_maya.catalogo
+    if leccion_id not in catalogo:
+        return jsonify(error="Lección no encontrada"), 404
+    if session.get('leccion_id') != leccion_id:
+        reiniciar_leccion(leccion_id)
+
+    cantidad = request.args.get('n', EJERCICIOS_POR_LOTE, type=int)
+    cantidad = max(1, min(cantidad, MAX_EJERCICIOS_POR_LOTE))
+
+    usuario_id = session['usuario_id']
+    modo = session.get('modo', MODO_OPCIONES)
+    plan = app_maya.plan_repaso(usuario_id, leccion_id, catalogo)
+    indices, ejercicios = generar_lote(plan, catalogo, leccion_id, cantidad, modo=modo)
+    for ejercicio in ejercicios:
+        ejercicio['imagen'] = medios.url(ejercicio['imagen'])
+        ejercicio['audio'] = medios.url(ejercicio['audio'])
+
+    # Cada lote se corrige una sola vez: el nonce vigente vive en la sesión
+    nonce = secrets.token_urlsafe(8)
+    session['lote'] = nonce
+    token = firma_lotes.firmar(usuario_id, leccion_id, catalogo.version, indices, nonce, modo)
+
+    return jsonify(token=token, modo=modo, ejercicios=ejercicios,
+                   puntos=session.get('puntos', 0), vidas=session.get('vidas', VIDAS_INICIALES))
+
+@app.route('/api/leccion/<int:leccion_id>/medios')
+def medios_leccion(leccion_id):
+    """Manifiesto de precarga: URLs de todas las imágenes y audios de la lección"""
+    leccion = app_maya.catalogo.leccion(leccion_id)
+    if not leccion:
+        return jsonify(error="Lección no encontrada"), 404
+
+    respuesta = jsonify(leccion=leccion_id, **medios.manifiesto(leccion))
+    respuesta.headers['Cache-Control'] = CACHE_MANIFIESTO
+    respuesta.add_etag()
+    return respuesta.make_conditional(request)
+
+@app.route('/api/leccion/<int:leccion_id>/respuestas', methods=['POST'])
+def corregir_lote(leccion_id):
+    """Corregir de una vez todas las respuestas de un lote"""
+    if 'usuario_id' not in session:
+        return jsonify(error="Sesión no iniciada"), 401
+
+    datos = request.get_json(silent=True) or {}
+    respuestas = datos.get('respuestas')
+    if not isinstance(respuestas, list) or not all(r is None or isinstance(r, str) for r in respuestas):
+        return jsonify(error="Se esperaba una lista de respuestas"), 400
+
+    usuario_id = session['usuario_id']
+    catalogo = app_maya.catalogo
+    try:
+        lote = firma_lotes.verificar(str(datos.get('token', '')), usuario_id, leccion_id, catalogo.version)
+    except LoteInvalido as e:
+        return jsonify(error=str(e)), 400
+    if session.get('leccion_id') != leccion_id or session.get('lote') != lote['n']:
+        return jsonify(error="Este lote ya se corrigió"), 409
+
+    # Corregir no tiene efectos: primero se corrige y luego se cobran al límite
+    # solo las respuestas corregidas (no las saltadas ni las de después del final)
+    contenido = catalogo.leccion(leccion_id)["contenido"]
+    correctas = [contenido[indice]["maya"] for indice in lote['p']]
+    calificar = None
+    if lote['m'] == MODO_ESCRIBIR:
+        escritas = catalogo.respuestas_escritas(leccion_id)
+        correcciones = [None if respuesta is None else escritas.corregir(respuesta, indice)
+                        for indice, respuesta in zip(lote['p'], respuestas)]
+
+        def calificar(posicion, respuesta):
+            return correcciones[posicion].acierto
+    aciertos, puntos, vidas, terminado = corregir(
+        correctas, respuestas, session.get('puntos', 0), session.get('vidas', VIDAS_INICIALES), calificar)
+    if not limite_respuestas.permitir(usuario_id, sum(a is not None for a in aciertos)):
+        return jsonify(error="Demasiadas respuestas seguidas; espera un momento"), 429
+    # La sesión puede volver atrás (cookie repetida): el nonce se recuerda también aquí
+    if not lotes_corregidos.primera_vez(lote['n']):
+        return jsonify(error="Este lote ya se corrigió"), 409
+    session.pop('lote')
+
+    plan = app_maya.plan_repaso(usuario_id, leccion_id, catalogo)
+    for indice, correcta, acierto in zip(lote['p'], correctas, aciertos):
+        if acierto is None:
+            continue
+        app_maya.progreso.registrar_respuesta(usuario_id, leccion_id, correcta,
+                                              acierto, puntos=10 if acierto else 0)
+        estado = plan.registrar(indice, acierto)
+        app_maya.progreso.registrar_repaso(usuario_id, leccion_id, correcta, estado)
+
+    session['puntos'] = puntos
+    session['vidas'] = vidas
+    if terminado == 'completada':
+        app_maya.progreso.registrar_leccion_completada(usuario_id, leccion_id)
+        app_maya.clasificacion.invalidar()
+        flash(f"¡Felicidades! Has completado la lección con {puntos} puntos!", "success")
+    elif terminado == 'sin_vidas':
+        flash(f"Juego terminado. Puntos finales: {puntos}", "error")
+    if terminado:
+        terminar_leccion()
+
+    # De los ejercicios saltados o sin corregir no se da la respuesta: no cuentan para el
+    # límite, y con la correcta el lote podría pedirse solo para ver las soluciones
+    resultados = [{"acierto": a} if a is None else {"correcta": c, "acierto": a}
+                  for c, a in zip(correctas, aciertos)]
+    if calificar is not None:
+        for posicion, resultado in enumerate(resultados):
+            if resultado["acierto"] is not None:
+                correccion = correcciones[posicion]
+                resultado["tipo"] = correccion.tipo
+                resultado["explicacion"] = explicar(correccion, contenido, lote['p'][posicion])
+
+    return jsonify(resultados=resultados, puntos=puntos, vidas=vidas, terminado=terminado)
+
+@app.route('/api/clasificacion')
+def clasificacion():
+    """Los primeros de la clasificación por puntos"""
+    cantidad = max(1, min(request.args.get('n', 10, type=int), 100))
+    primeros = app_maya.clasificacion.primeros(cantidad)
+    return jsonify(primeros=[{"posicion": posicion, "nombre": nombre, "puntos": puntos}
+                             for posicion, nombre, puntos in primeros],
+                   total=len(app_maya.clasificacion))
+
+@app.route('/api/estadisticas')
+def estadisticas():
+    """Estadísticas del usuario de la sesión y su posición en la clasificación"""
+    if 'usuario_id' not in session:
+        return jsonify(error="Sesión no iniciada"), 401
+
+    usuario_id = session['usuario_id']
+    datos = estadisticas_usuario(app_maya.db.conexion(), usuario_id)
+    return jsonify(posicion=app_maya.clasificacion.posicion(usuario_id), **datos)
+
+def metricas_autorizadas():
+    """/metrics exige METRICAS_TOKEN en Authorization: Bearer <token>; sin él está cerrado"""
+    token = os.environ.get('METRICAS_TOKEN')
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode())
+
+def exportacion_autorizada():
+    """La exportación web exige EXPORTAR_TOKEN en Authorization: Bearer <token>; sin él está desactivada"""
+    token = os.environ.get('EXPORTAR_TOKEN')
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode())
+
+@app.route('/api/exportar')
+def exportar_progreso():
+    """Progreso de los alumnos en CSV o NDJSON, en streaming (ver exportar.py)"""
+    if not exportacion_autorizada():
+        abort(403)
+    formato = request.args.get('formato', 'csv')
+    titulos = {leccion_id: leccion['titulo'] for leccion_id, leccion in app_maya.catalogo.por_id.items()}
+    try:
+        elegidos = filtros(request.args.get('desde'), request.args.get('hasta'), request.args.get('leccion'))
+        cuerpo = exportar(app_maya.db.ruta, formato, titulos, **elegidos)
+    except FiltroInvalido as e:
+        return jsonify(error=str(e)), 400
+
+    respuesta = app.response_class(cuerpo, mimetype=FORMATOS[formato])
+    respuesta.headers['Content-Disposition'] = f'attachment; filename="{nombre_archivo(formato, **elegidos)}"'
+    respuesta.headers['Cache-Control'] = 'no-store'
+    # Que un proxy (nginx) no acumule la respuesta: el primer trozo sale enseguida
+    respuesta.headers['X-Accel-Buffering'] = 'no'
+    return respuesta
+
+@app.route('/metrics')
+def metrics():
+    """Métricas de este proceso en formato Prometheus"""
+    if not metricas.activas:
+        abort(404)
+    if not metricas_autorizadas():
+        abort(403)
+    return app.response_class(metricas.registro.exportar(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/perfil')
+def perfil():
+    """Pilas muestreadas por el perfilador (PERFIL_HZ), en formato collapsed"""
+    if perfilador is None:
+        abort(404)
+    if not metricas_autorizadas():
+        abort(403)
+    return app.response_class(perfilador.exportar(), mimetype='text/plain')
 
 @app.route('/logout')
 def logout():
@@ -250,13 +564,21 @@ def eliminar_usuario():
 
     usuario_id = session['usuario_id']
 
-    # Eliminar progreso del usuario
-    app_maya.c.execute("DELETE FROM progreso WHERE usuario_id = ?", (usuario_id,))
+    # Escribir lo pendiente antes de borrar, para no dejar filas huérfanas
+    app_maya.progreso.vaciar()
+
+    with app_maya.db.transaccion() as conn:
+        # Eliminar progreso del usuario
+        conn.execute("DELETE FROM progreso WHERE usuario_id = ?", (usuario_id,))
+        conn.execute("DELETE FROM respuestas WHERE usuario_id = ?", (usuario_id,))
+        conn.execute("DELETE FROM repaso WHERE usuario_id = ?", (usuario_id,))
+        conn.execute("DELETE FROM estadisticas WHERE usuario_id = ?", (usuario_id,))
 
-    # Eliminar usuario
-    app_maya.c.execute("DELETE FROM usuarios WHERE id = ?", (usuario_id,))
+        # Eliminar usuario
+        conn.execute("DELETE FROM usuarios WHERE id = ?", (usuario_id,))
 
-    app_maya.conn.commit()
+    app_maya.usuarios.invalidar()
+    app_maya.clasificacion.quitar(usuario_id)
 
     session.clear()
     flash("Usuario eliminado correctamente", "success")
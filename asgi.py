@@ -0,0 +1,222 @@
+"""Modo ASGI de la aplicación web.
+
+    MODO_ASGI=1 gunicorn asgi:aplicacion        # workers de uvicorn (gunicorn.conf.py)
+    uvicorn asgi:aplicacion --workers 4           # sin gunicorn
+
+Las conexiones se atienden en el bucle de eventos de uvicorn: un cliente
+lento o una conexión keep-alive inactiva solo ocupan un socket y unos KB,
+no un worker. El cuerpo de la petición se lee de forma asíncrona antes de
+tocar la aplicación.
+
+Las rutas más frecuentes que no usan la sesión (búsqueda de usuarios,
+clasificación, diccionario y recursos estáticos) tienen manejadores async propios; la consulta a SQLite
+se espera con BaseDatosAsync y la búsqueda en el diccionario, en el pool de hilos. El resto de las rutas son las vistas de
+Flask de app.py, que se ejecutan en un pool de hilos acotado.
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Request
+
+from app import app, app_maya, recursos
+from basedatos import BaseDatosAsync
+import metricas
+from diccionario import MAX_RESULTADOS, RESULTADOS_POR_DEFECTO
+from usuarios import USUARIOS_POR_PAGINA
+
+# Hilos que ejecutan vistas de Flask a la vez en cada worker
+HILOS_VISTAS = int(os.environ.get('HILOS_ASGI', 16))
+HILOS_BASE_DATOS = 4
+
+
+def entorno_wsgi(scope, cuerpo):
+    """Construir el entorno WSGI de una petición HTTP de ASGI"""
+    servidor = scope.get('server') or ('localhost', 80)
+    cliente = scope.get('client') or ('', 0)
+    entorno = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': '',
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': servidor[0],
+        'SERVER_PORT': str(servidor[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': cliente[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(cuerpo),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for nombre, valor in scope['headers']:
+        nombre = nombre.decode('latin-1').upper().replace('-', '_')
+        if nombre not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            nombre = 'HTTP_' + nombre
+        valor = valor.decode('latin-1')
+        entorno[nombre] = f"{entorno[nombre]},{valor}" if nombre in entorno else valor
+    return entorno
+
+
+class AplicacionAsgi:
+    """Adaptador ASGI para la aplicación Flask con manejadores async propios"""
+
+    def __init__(self, app_flask, hilos=HILOS_VISTAS):
+        self.app = app_flask
+        self.db = BaseDatosAsync(app_maya.db, HILOS_BASE_DATOS)
+        # Los hilos se crean al llegar peticiones, ya dentro del worker
+        self._vistas = ThreadPoolExecutor(hilos, thread_name_prefix='vistas')
+        # endpoint de Flask -> manejador async que lo sustituye
+        self.manejadores = {
+            'buscar_usuarios': self.buscar_usuarios,
+            'clasificacion': self.clasificacion,
+            'diccionario': self.diccionario,
+            'recurso': self.recurso,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._ciclo_de_vida(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensaje['type'] == 'lifespan.shutdown':
+                self.cerrar()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        # Leer el cuerpo sin ocupar ningún hilo, por lento que sea el cliente
+        trozos = []
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'http.disconnect':
+                return
+            trozos.append(mensaje.get('body', b''))
+            if not mensaje.get('more_body'):
+                break
+        entorno = entorno_wsgi(scope, b''.join(trozos))
+
+        endpoint, argumentos = self._buscar_endpoint(entorno)
+        manejador = self.manejadores.get(endpoint)
+        if manejador is not None:
+            inicio = time.perf_counter()
+            respuesta = await manejador(Request(entorno), **argumentos)
+            if metricas.activas:
+                # Las vistas de Flask se miden en app.wsgi_app; estas no pasan por ahí
+                etiquetas = (('ruta', endpoint),)
+                metricas.registro.observar('maya_peticion_segundos', time.perf_counter() - inicio, etiquetas)
+                metricas.registro.incrementar('maya_peticiones_total',
+                                              etiquetas + (('estado', str(respuesta.status_code)),))
+            await self._enviar_respuesta(send, respuesta)
+        else:
+            await self._vista_flask(send, entorno)
+
+    def _buscar_endpoint(self, entorno):
+        try:
+            return self.app.url_map.bind_to_environ(entorno).match()
+        except HTTPException:
+            # 404, 405 y redirecciones las resuelve Flask
+            return None, None
+
+    async def _enviar_respuesta(self, send, respuesta):
+        await send({
+            'type': 'http.response.start',
+            'status': respuesta.status_code,
+            'headers': [(nombre.lower().encode('latin-1'), valor.encode('latin-1'))
+                        for nombre, valor in respuesta.headers.items()],
+        })
+        await send({'type': 'http.response.body', 'body': respuesta.get_data()})
+
+    async def _vista_flask(self, send, entorno):
+        """Ejecutar la aplicación WSGI en el pool de hilos, enviando la respuesta por trozos"""
+        bucle = asyncio.get_running_loop()
+        estado, cabeceras, iterable, iterador, trozo = await bucle.run_in_executor(
+            self._vistas, self._iniciar_wsgi, entorno)
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': estado,
+                'headers': [(nombre.lower().encode('latin-1'), valor.encode('latin-1'))
+                            for nombre, valor in cabeceras],
+            })
+            while trozo is not None:
+                siguiente = await bucle.run_in_executor(self._vistas, next, iterador, None)
+                await send({'type': 'http.response.body', 'body': trozo,
+                            'more_body': siguiente is not None})
+                trozo = siguiente
+        finally:
+            if hasattr(iterable, 'close'):
+                await bucle.run_in_executor(self._vistas, iterable.close)
+
+    def _iniciar_wsgi(self, entorno):
+        """Llamar a la aplicación WSGI y leer el primer trozo de la respuesta"""
+        inicio = {}
+
+        def start_response(estado, cabeceras, exc_info=None):
+            inicio['estado'] = int(estado.split(' ', 1)[0])
+            inicio['cabeceras'] = cabeceras
+
+        iterable = self.app(entorno, start_response)
+        iterador = iter(iterable)
+        trozo = next(iterador, None)
+        # Una respuesta vacía se envía igualmente con un cuerpo vacío
+        return inicio['estado'], inicio['cabeceras'], iterable, iterador, b'' if trozo is None else trozo
+
+    async def buscar_usuarios(self, peticion):
+        """Versión async de /api/usuarios"""
+        prefijo = peticion.args.get('q', '').strip()
+        despues = peticion.args.get('despues', '')
+        limite = peticion.args.get('limite', USUARIOS_POR_PAGINA, type=int)
+
+        nombres, siguiente = await self.db.ejecutar(app_maya.usuarios.buscar, prefijo, despues, limite)
+        return self.app.json.response(usuarios=nombres, siguiente=siguiente)
+
+    async def clasificacion(self, peticion):
+        """Versión async de /api/clasificacion: el refresco desde SQLite va en el pool de la base"""
+        cantidad = max(1, min(peticion.args.get('n', 10, type=int), 100))
+        primeros = await self.db.ejecutar(app_maya.clasificacion.primeros, cantidad)
+        return self.app.json.response(
+            primeros=[{"posicion": posicion, "nombre": nombre, "puntos": puntos}
+                      for posicion, nombre, puntos in primeros],
+            total=len(app_maya.clasificacion))
+
+    async def diccionario(self, peticion):
+        """Versión async de /api/diccionario.
+
+        La primera búsqueda de cada versión del catálogo construye el índice
+        y leer el catálogo puede recargarlo: las dos cosas van al pool de
+        hilos, no al bucle de eventos.
+        """
+        consulta = peticion.args.get('q', '').strip()
+        limite = max(1, min(peticion.args.get('limite', RESULTADOS_POR_DEFECTO, type=int), MAX_RESULTADOS))
+        resultados = await asyncio.get_running_loop().run_in_executor(
+            self._vistas, lambda: app_maya.diccionario.buscar(consulta, limite))
+        return self.app.json.response(resultados=resultados)
+
+    async def recurso(self, peticion, nombre):
+        """Versión async de /recursos/<nombre>: el contenido ya está en memoria"""
+        respuesta = recursos.responder(self.app, nombre, peticion)
+        if respuesta is None:
+            respuesta = self.app.response_class('Not Found', status=404)
+        return respuesta
+
+    def cerrar(self):
+        """Escribir el progreso pendiente y detener los hilos"""
+        app_maya.progreso.cerrar()
+        self.db.cerrar()
+        self._vistas.shutdown(wait=True)
+
+
+aplicacion = AplicacionAsgi(app)
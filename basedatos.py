@@ -0,0 +1,206 @@
+import asyncio
+import functools
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+RUTA_DB = os.environ.get('MAYA_KICHE_DB', 'maya_kiche.db')
+
+# Milisegundos que una conexión espera un bloqueo antes de fallar
+BUSY_TIMEOUT_MS = 5000
+
+# Sentencias preparadas que sqlite3 mantiene en caché por conexión
+SENTENCIAS_EN_CACHE = 128
+
+
+def configurar_conexion(conn):
+    """Aplicar los PRAGMA compartidos por la web y la app de escritorio"""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def abrir_conexion(ruta=None, **kwargs):
+    """Abrir una conexión SQLite con WAL, busy_timeout y caché de sentencias"""
+    conn = sqlite3.connect(ruta or RUTA_DB, timeout=BUSY_TIMEOUT_MS / 1000,
+                           cached_statements=SENTENCIAS_EN_CACHE, **kwargs)
+    return configurar_conexion(conn)
+
+
+class _ConexionHilo:
+    """Guarda la conexión de un hilo en su threading.local; al terminar el hilo se libera"""
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+class PoolConexiones:
+    """Una conexión SQLite por hilo.
+
+    Cada hilo de trabajo (gunicorn --threads, el servidor de desarrollo de
+    Flask) reutiliza su propia conexión, así que no hay un cursor compartido
+    y `lastrowid`/`fetchone` no se mezclan entre peticiones. Las sentencias
+    usadas con el mismo texto SQL se reutilizan desde la caché de sqlite3.
+
+    Cuando un hilo termina (el servidor de desarrollo usa uno por petición)
+    Python borra su threading.local y la conexión se cierra con él, así que
+    no quedan conexiones ni descriptores de hilos que ya no existen.
+    """
+
+    def __init__(self, ruta=None, fabrica=None):
+        self.ruta = ruta or RUTA_DB
+        # Subclase de sqlite3.Connection para las conexiones (p. ej. metricas.ConexionMedida)
+        self._opciones = {'factory': fabrica} if fabrica else {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conexiones = set()
+        self._pid = os.getpid()
+
+    def conexion(self):
+        """Devolver la conexión del hilo actual, abriéndola si hace falta"""
+        if self._pid != os.getpid():
+            # Proceso hijo tras un fork: no heredar conexiones del padre
+            self._reiniciar()
+
+        titular = getattr(self._local, 'titular', None)
+        if titular is None:
+            conn = abrir_conexion(self.ruta, check_same_thread=False, **self._opciones)
+            titular = self._local.titular = _ConexionHilo(conn)
+            with self._lock:
+                self._conexiones.add(conn)
+            weakref.finalize(titular, self._soltar, conn)
+        return titular.conn
+
+    def _soltar(self, conn):
+        """Cerrar la conexión de un hilo que terminó"""
+        with self._lock:
+            self._conexiones.discard(conn)
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass
+
+    def abiertas(self):
+        """Número de conexiones abiertas ahora"""
+        return len(self._conexiones)
+
+    @contextmanager
+    def transaccion(self):
+        """Ejecutar un bloque en una transacción: commit al salir, rollback si falla"""
+        conn = self.conexion()
+        with conn:
+            yield conn
+
+    def cerrar(self):
+        """Cerrar todas las conexiones abiertas por el pool"""
+        with self._lock:
+            conexiones, self._conexiones = self._conexiones, set()
+        for conn in conexiones:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                pass
+        self._local = threading.local()
+
+    def _reiniciar(self):
+        with self._lock:
+            self._conexiones = set()
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+
+class BaseDatosAsync:
+    """Acceso a SQLite sin bloquear el bucle de eventos (modo ASGI).
+
+    sqlite3 no tiene API asíncrona: las llamadas se ejecutan en un pool de
+    hilos propio y pequeño, y cada hilo usa su conexión del PoolConexiones.
+    Así las consultas lentas no frenan a las demás conexiones abiertas, y
+    los hilos de base de datos no crecen con el número de clientes.
+    """
+
+    def __init__(self, pool, hilos=4):
+        self.pool = pool
+        self._ejecutor = ThreadPoolExecutor(hilos, thread_name_prefix='sqlite')
+
+    async def ejecutar(self, funcion, *args):
+        """Ejecutar `funcion(*args)` en un hilo de base de datos y esperar el resultado"""
+        bucle = asyncio.get_running_loop()
+        return await bucle.run_in_executor(self._ejecutor, functools.partial(funcion, *args))
+
+    async def consultar(self, sql, parametros=()):
+        """Devolver todas las filas de una consulta"""
+        return await self.ejecutar(lambda: self.pool.conexion().execute(sql, parametros).fetchall())
+
+    def cerrar(self):
+        self._ejecutor.shutdown(wait=True)
+
+
+class HiloBaseDatos:
+    """Un hilo dedicado a SQLite para una interfaz gráfica (kiche.py).
+
+    La interfaz encola funciones con enviar() y sigue atendiendo eventos;
+    el hilo las ejecuta en orden, cada una en una transacción con su
+    conexión del pool (WAL y busy_timeout, como la web), y deja el
+    resultado en una cola de respuestas. El hilo de la interfaz llama a
+    entregar() periódicamente (en Tk, con root.after): las funciones de
+    respuesta se ejecutan ahí, nunca en el hilo de la base de datos.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._peticiones = queue.Queue()
+        self._respuestas = queue.Queue()
+        self._hilo = threading.Thread(target=self._bucle, name='sqlite-interfaz', daemon=True)
+        self._hilo.start()
+
+    def enviar(self, funcion, *args, al_terminar=None, al_fallar=None):
+        """Ejecutar `funcion(conn, *args)` en el hilo de la base.
+
+        `al_terminar(resultado)` o `al_fallar(excepción)` se llaman después
+        desde entregar(). Las peticiones se atienden en el orden de llegada.
+        """
+        self._peticiones.put((funcion, args, al_terminar, al_fallar))
+
+    def entregar(self, maximo=100):
+        """Llamar a las funciones de respuesta pendientes; devuelve cuántas se llamaron"""
+        entregadas = 0
+        while entregadas < maximo:
+            try:
+                funcion, valor = self._respuestas.get_nowait()
+            except queue.Empty:
+                break
+            entregadas += 1
+            funcion(valor)
+        return entregadas
+
+    def _bucle(self):
+        while True:
+            peticion = self._peticiones.get()
+            if peticion is None:
+                break
+            funcion, args, al_terminar, al_fallar = peticion
+            try:
+                with self.pool.transaccion() as conn:
+                    resultado = funcion(conn, *args)
+            except Exception as error:
+                if al_fallar is None:
+                    logger.exception("Error en %s", getattr(funcion, '__name__', funcion))
+                else:
+                    self._respuestas.put((al_fallar, error))
+            else:
+                if al_terminar is not None:
+                    self._respuestas.put((al_terminar, resultado))
+
+    def cerrar(self, timeout=5):
+        """Terminar lo encolado y detener el hilo"""
+        self._peticiones.put(None)
+        self._hilo.join(timeout)
@@ -0,0 +1,1127 @@
+"""Micro-benchmarks de la aplicación web.
+
+Uso:
+    python benchmarks.py            # ejecutar todos
+    python benchmarks.py pool       # ejecutar solo uno
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from basedatos import PoolConexiones
+from catalogo import CatalogoLecciones
+from ejercicios import generar_opciones, respuestas_distintas
+from migraciones import migrar
+from progreso import SQL_ESTADISTICAS_RESPUESTA, SQL_PUNTOS, SQL_RESPUESTA, ColaEscritura
+from prueba_carga import arrancar_servidor
+from repaso import PlanRepaso
+from usuarios import BuscadorUsuarios
+
+BENCHMARKS = {}
+
+
+def benchmark(nombre):
+    """Registrar una función como benchmark ejecutable desde la línea de comandos"""
+    def decorador(funcion):
+        BENCHMARKS[nombre] = funcion
+        return funcion
+    return decorador
+
+
+def base_temporal():
+    """Crear una base de datos vacía en un directorio temporal"""
+    directorio = tempfile.mkdtemp(prefix='maya_bench_')
+    return os.path.join(directorio, 'bench.db')
+
+
+@benchmark('pool')
+def bench_pool(hilos=(1, 2, 4, 8), operaciones=2000):
+    """Registros e inicios de sesión por segundo según el número de hilos"""
+    ruta = base_temporal()
+    pool = PoolConexiones(ruta)
+    with pool.transaccion() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS usuarios
+                     (id INTEGER PRIMARY KEY, nombre TEXT UNIQUE, puntos INTEGER DEFAULT 0, leccion_actual INTEGER DEFAULT 1)''')
+
+    print(f"{'hilos':>6} {'registro/s':>12} {'login/s':>12}")
+    for n in hilos:
+        por_hilo = operaciones // n
+        nombres = [[f"u{n}_{h}_{i}" for i in range(por_hilo)] for h in range(n)]
+
+        def registrar(lista):
+            for nombre in lista:
+                with pool.transaccion() as conn:
+                    conn.execute("INSERT INTO usuarios (nombre) VALUES (?)", (nombre,))
+
+        def iniciar_sesion(lista):
+            for nombre in lista:
+                pool.conexion().execute(
+                    "SELECT id, nombre FROM usuarios WHERE nombre = ?", (nombre,)).fetchone()
+
+        resultados = []
+        for tarea in (registrar, iniciar_sesion):
+            trabajadores = [threading.Thread(target=tarea, args=(lista,)) for lista in nombres]
+            inicio = time.perf_counter()
+            for t in trabajadores:
+                t.start()
+            for t in trabajadores:
+                t.join()
+            resultados.append(por_hilo * n / (time.perf_counter() - inicio))
+        print(f"{n:>6} {resultados[0]:>12.0f} {resultados[1]:>12.0f}")
+
+    pool.cerrar()
+
+
+def app_temporal():
+    """Importar app.py usando una base de datos temporal"""
+    import basedatos
+    basedatos.RUTA_DB = base_temporal()
+    import app
+    app.app.config['TESTING'] = True
+    return app
+
+
+def lecciones_sinteticas(n_lecciones, palabras_por_leccion=10):
+    """Generar un catálogo con la misma forma que lecciones_maya_kiche.json"""
+    niveles = ('basico', 'intermedio', 'avanzado')
+    lecciones = {nivel: [] for nivel in niveles}
+    for i in range(1, n_lecciones + 1):
+        lecciones[niveles[i % len(niveles)]].append({
+            "id": i,
+            "titulo": f"Lección {i}",
+            "tipo": "vocabulario",
+            "contenido": [
+                {"maya": f"maya_{i}_{j}", "espanol": f"espanol_{i}_{j}", "imagen": f"{j}.png"}
+                for j in range(palabras_por_leccion)
+            ],
+        })
+    return lecciones
+
+
+@benchmark('catalogo')
+def bench_catalogo(tamanos=(10, 100, 1000, 10000), busquedas=20000):
+    """Coste de buscar una lección por id: recorrido lineal frente al índice"""
+    def buscar_lineal(lecciones, leccion_id):
+        for lecciones_nivel in lecciones.values():
+            for l in lecciones_nivel:
+                if l['id'] == leccion_id:
+                    return l
+        return None
+
+    print(f"{'lecciones':>10} {'lineal µs':>12} {'índice µs':>12}")
+    for n in tamanos:
+        lecciones = lecciones_sinteticas(n, palabras_por_leccion=2)
+        catalogo = CatalogoLecciones(lecciones)
+        ids = [random.randint(1, n) for _ in range(busquedas)]
+
+        repeticiones = max(10, busquedas // n)
+        inicio = time.perf_counter()
+        for leccion_id in ids[:repeticiones]:
+            buscar_lineal(lecciones, leccion_id)
+        lineal = (time.perf_counter() - inicio) / repeticiones
+
+        inicio = time.perf_counter()
+        for leccion_id in ids:
+            catalogo.leccion(leccion_id)
+        indice = (time.perf_counter() - inicio) / busquedas
+
+        print(f"{n:>10} {lineal * 1e6:>12.2f} {indice * 1e6:>12.3f}")
+
+
+@benchmark('sesion')
+def bench_sesion(tamanos=(5, 20, 50, 100), repeticiones=2000):
+    """Bytes de la cookie de sesión y tiempo de firmado: lección completa frente a id + máscara"""
+    from flask import Flask
+    from flask.sessions import SecureCookieSessionInterface
+
+    app = Flask(__name__)
+    app.secret_key = 'benchmark'
+    serializador = SecureCookieSessionInterface().get_signing_serializer(app)
+
+    print(f"{'palabras':>9} {'antes B':>9} {'antes µs':>9} {'después B':>10} {'después µs':>11}")
+    for n in tamanos:
+        leccion = lecciones_sinteticas(1, palabras_por_leccion=n)['intermedio'][0]
+        # Estado tras haber preguntado la mitad de las palabras
+        mitad = leccion['contenido'][:n // 2]
+        antes = {'usuario_id': 1, 'usuario_nombre': 'ana', 'puntos': 50, 'vidas': 3,
+                 'leccion_actual': leccion,
+                 'palabras_preguntadas': [p['espanol'] for p in mitad]}
+        despues = {'usuario_id': 1, 'usuario_nombre': 'ana', 'puntos': 50, 'vidas': 3,
+                   'leccion_id': leccion['id'], 'preguntadas': (1 << (n // 2)) - 1}
+
+        columnas = []
+        for estado in (antes, despues):
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                cookie = serializador.dumps(estado)
+                serializador.loads(cookie)
+            columnas.append((len(cookie), (time.perf_counter() - inicio) / repeticiones * 1e6))
+        print(f"{n:>9} {columnas[0][0]:>9} {columnas[0][1]:>9.1f} "
+              f"{columnas[1][0]:>10} {columnas[1][1]:>11.1f}")
+
+
+@benchmark('sesion_servidor')
+def bench_sesion_servidor(peticiones=3000):
+    """Coste por petición y bytes de cookie de cada backend de sesión"""
+    from flask import Flask, session
+    from sesiones import crear_interfaz
+
+    print(f"{'backend':>8} {'µs/petición':>12} {'cookie B':>9}")
+    for backend in ('cookie', 'memoria', 'sqlite'):
+        app = Flask(__name__)
+        app.secret_key = 'benchmark'
+        interfaz = crear_interfaz(backend, pool=PoolConexiones(base_temporal()))
+        if interfaz:
+            app.session_interface = interfaz
+
+        @app.route('/ejercicio')
+        def ejercicio():
+            # Misma forma de estado que guarda la ruta real al responder
+            session['puntos'] = session.get('puntos', 0) + 10
+            session['vidas'] = 3
+            session['preguntadas'] = session.get('preguntadas', 0) | 1
+            return ''
+
+        cliente = app.test_client()
+        with cliente.session_transaction() as s:
+            s.update({'usuario_id': 1, 'usuario_nombre': 'ana', 'leccion_id': 1})
+        inicio = time.perf_counter()
+        for _ in range(peticiones):
+            cliente.get('/ejercicio')
+        por_peticion = (time.perf_counter() - inicio) / peticiones * 1e6
+        cookie = cliente.get_cookie('session')
+        print(f"{backend:>8} {por_peticion:>12.1f} {len(cookie.value):>9}")
+
+
+@benchmark('distractores')
+def bench_distractores(tamanos=(4, 10, 100, 1000, 100000), repeticiones=5000):
+    """Generación de opciones: bucle de rechazo anterior frente a muestreo sin reemplazo"""
+
+    def rechazo(contenido, correcta):
+        opciones_incorrectas = []
+        while len(opciones_incorrectas) < 3:
+            opcion = random.choice(contenido)
+            if opcion != correcta and opcion not in opciones_incorrectas:
+                opciones_incorrectas.append(opcion)
+        return opciones_incorrectas
+
+    print(f"{'palabras':>9} {'repetidas':>10} {'rechazo µs':>11} {'muestreo µs':>12}")
+    for n in tamanos:
+        for repetidas in (False, True):
+            if repetidas:
+                # Todas las palabras menos cuatro comparten la misma respuesta
+                maya = tuple(['Jun'] * (n - 4) + ['Kieb\'', 'Oxib\'', 'Kajib\'', 'Job\''])
+            else:
+                maya = tuple(f"maya_{i}" for i in range(n))
+            distintas = respuestas_distintas(maya)
+            correcta = maya[-1]
+
+            # Con menos de 4 respuestas distintas el bucle anterior no termina
+            if len(set(maya) - {correcta}) >= 3:
+                # Con muchas repetidas el bucle anterior tarda O(n): menos vueltas
+                vueltas = max(5, repeticiones * 10 // n) if repetidas else repeticiones
+                inicio = time.perf_counter()
+                for _ in range(vueltas):
+                    rechazo(maya, correcta)
+                antes = f"{(time.perf_counter() - inicio) / vueltas * 1e6:.2f}"
+            else:
+                antes = 'no termina'
+
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                generar_opciones(distintas, correcta)
+            despues = (time.perf_counter() - inicio) / repeticiones * 1e6
+            print(f"{n:>9} {'sí' if repetidas else 'no':>10} {antes:>11} {despues:>12.2f}")
+
+
+@benchmark('generacion')
+def bench_generacion(tamanos=(10, 100, 1000, 10000), ejercicios=20000):
+    """Trabajo de un GET /ejercicio sin HTTP: siguiente palabra, opciones y ficha"""
+    from fichas import FichasEjercicio
+    fichas = FichasEjercicio(b'bench')
+    print(f"{'palabras':>9} {'siguiente µs':>13} {'opciones µs':>12} {'ficha µs':>9} {'total µs':>9}")
+    for n in tamanos:
+        catalogo = CatalogoLecciones(lecciones_sinteticas(1, n))
+        maya = catalogo.palabras_maya(1)
+        plan = PlanRepaso(list(maya))
+        distintas = catalogo.respuestas_distintas(1)
+        ahora = time.time()
+
+        indices = []
+        indice = None
+        inicio = time.perf_counter()
+        for pregunta in range(ejercicios):
+            indice = plan.siguiente(evitar=indice)
+            plan.registrar(indice, pregunta % 4 != 0, ahora=ahora + pregunta)
+            indices.append(indice)
+        siguiente = (time.perf_counter() - inicio) / ejercicios * 1e6
+
+        inicio = time.perf_counter()
+        for indice in indices:
+            generar_opciones(distintas, maya[indice])
+        opciones = (time.perf_counter() - inicio) / ejercicios * 1e6
+
+        inicio = time.perf_counter()
+        for indice in indices:
+            fichas.emitir(1, 1, catalogo.version, indice)
+        ficha = (time.perf_counter() - inicio) / ejercicios * 1e6
+
+        print(f"{n:>9} {siguiente:>13.2f} {opciones:>12.2f} {ficha:>9.2f} "
+              f"{siguiente + opciones + ficha:>9.2f}")
+
+
+@benchmark('cola')
+def bench_cola(respuestas=5000, hilos=8):
+    """Latencia de registrar una respuesta: commit síncrono frente a la cola diferida,
+    con un solo hilo y con `hilos` escribiendo a la vez (como los hilos de un worker)"""
+    pool = PoolConexiones(base_temporal())
+    # La cola también escribe los agregados de `estadisticas`: el esquema completo
+    migrar(pool.conexion())
+    with pool.transaccion() as conn:
+        conn.execute("INSERT INTO usuarios (nombre) VALUES ('ana')")
+
+    def sincrono():
+        # Las mismas sentencias que escribe la cola por respuesta
+        with pool.transaccion() as conn:
+            conn.execute(SQL_RESPUESTA, (1, 1, 'Jun', True, '2024-01-01T00:00:00'))
+            conn.execute(SQL_PUNTOS, (10, 1))
+            conn.execute(SQL_ESTADISTICAS_RESPUESTA, (1, 10, 1, time.time()))
+
+    cola = ColaEscritura(pool)
+
+    def encolar():
+        cola.registrar_respuesta(1, 1, 'Jun', True, puntos=10)
+
+    def medir(registrar, n):
+        tiempos = []
+        for _ in range(n):
+            inicio = time.perf_counter()
+            registrar()
+            tiempos.append(time.perf_counter() - inicio)
+        return tiempos
+
+    def concurrente(registrar):
+        tiempos = []
+        trabajadores = [threading.Thread(target=lambda: tiempos.extend(medir(registrar, respuestas // hilos)))
+                        for _ in range(hilos)]
+        inicio = time.perf_counter()
+        for t in trabajadores:
+            t.start()
+        for t in trabajadores:
+            t.join()
+        cola.vaciar()
+        return sorted(tiempos), time.perf_counter() - inicio
+
+    print(f"{'':>22} {'p50 µs':>8} {'p99 µs':>8} {'total µs/resp':>14}")
+    for etiqueta, registrar in (('síncrono', sincrono), ('cola', encolar)):
+        inicio = time.perf_counter()
+        tiempos = sorted(medir(registrar, respuestas))
+        cola.vaciar()
+        total = time.perf_counter() - inicio
+        print(f"{etiqueta + ', 1 hilo':>22} {tiempos[len(tiempos) // 2] * 1e6:>8.1f} "
+              f"{tiempos[int(len(tiempos) * 0.99)] * 1e6:>8.1f} {total / respuestas * 1e6:>14.1f}")
+    for etiqueta, registrar in (('síncrono', sincrono), ('cola', encolar)):
+        tiempos, total = concurrente(registrar)
+        print(f"{etiqueta + f', {hilos} hilos':>22} {tiempos[len(tiempos) // 2] * 1e6:>8.1f} "
+              f"{tiempos[int(len(tiempos) * 0.99)] * 1e6:>8.1f} {total / len(tiempos) * 1e6:>14.1f}")
+    cola.cerrar()
+    pool.cerrar()
+
+
+@benchmark('progreso')
+def bench_progreso(usuarios=100000, lecciones_por_usuario=10, consultas=50):
+    """Consulta y borrado por usuario con 1M filas de progreso, antes y después de migrar"""
+    import sqlite3
+
+    ruta = base_temporal()
+    conn = sqlite3.connect(ruta)
+    # Esquema anterior a las migraciones: progreso sin clave ni índices
+    conn.execute('''CREATE TABLE usuarios
+                 (id INTEGER PRIMARY KEY, nombre TEXT, puntos INTEGER, leccion_actual INTEGER)''')
+    conn.execute('''CREATE TABLE progreso
+                 (usuario_id INTEGER, leccion_id INTEGER, completada BOOLEAN,
+                 fecha_completado DATE, FOREIGN KEY(usuario_id) REFERENCES usuarios(id))''')
+    conn.executemany("INSERT INTO usuarios VALUES (?, ?, 0, 1)",
+                     ((i, f"usuario{i}") for i in range(1, usuarios + 1)))
+    conn.executemany("INSERT INTO progreso VALUES (?, ?, 1, '2024-01-01')",
+                     ((u, l) for u in range(1, usuarios + 1) for l in range(1, lecciones_por_usuario + 1)))
+    conn.commit()
+    print(f"filas de progreso: {usuarios * lecciones_por_usuario}")
+
+    def medir(etiqueta, ids):
+        inicio = time.perf_counter()
+        for usuario_id in ids:
+            conn.execute("SELECT leccion_id, completada FROM progreso WHERE usuario_id = ?",
+                         (usuario_id,)).fetchall()
+        consulta = (time.perf_counter() - inicio) / len(ids) * 1e3
+
+        inicio = time.perf_counter()
+        for usuario_id in ids:
+            conn.execute("DELETE FROM progreso WHERE usuario_id = ?", (usuario_id,))
+            conn.commit()
+        borrado = (time.perf_counter() - inicio) / len(ids) * 1e3
+        print(f"{etiqueta:>8}: consulta {consulta:.3f} ms, borrado {borrado:.3f} ms")
+
+    ids = random.sample(range(1, usuarios + 1), consultas * 2)
+    medir('antes', ids[:consultas])
+
+    inicio = time.perf_counter()
+    migrar(conn)
+    print(f"migración: {time.perf_counter() - inicio:.1f} s")
+    medir('después', ids[consultas:])
+    conn.close()
+
+
+@benchmark('usuarios')
+def bench_usuarios(usuarios=100000, busquedas=2000):
+    """Login con 100k usuarios: lista completa en el HTML frente a búsqueda por prefijo"""
+    import json
+    from html import escape
+
+    pool = PoolConexiones(base_temporal())
+    migrar(pool.conexion())
+    with pool.transaccion() as conn:
+        conn.executemany("INSERT INTO usuarios (nombre) VALUES (?)",
+                         ((f"{random.choice('abcdefghijklmnopqrstuvwxyz')}usuario{i}",) for i in range(usuarios)))
+
+    inicio = time.perf_counter()
+    nombres = [fila[0] for fila in pool.conexion().execute("SELECT nombre FROM usuarios")]
+    opciones = ''.join(f'<option value="{escape(n)}">{escape(n)}</option>' for n in nombres)
+    antes_ms = (time.perf_counter() - inicio) * 1e3
+    print(f"antes:   {len(opciones) / 1024:.0f} KB de <option>, {antes_ms:.1f} ms por GET /login")
+
+    buscador = BuscadorUsuarios(pool)
+    prefijos = [''.join(random.choices('abcdefghijklmnopqrstuvwxyz', k=random.randint(1, 4)))
+                for _ in range(busquedas)]
+    inicio = time.perf_counter()
+    tamano = 0
+    for prefijo in prefijos:
+        pagina, siguiente = buscador.buscar(prefijo)
+        tamano += len(json.dumps({'usuarios': pagina, 'siguiente': siguiente}))
+    despues_ms = (time.perf_counter() - inicio) / busquedas * 1e3
+    total = buscador.aciertos + buscador.fallos
+    print(f"después: {tamano / busquedas:.0f} B por página JSON, {despues_ms:.3f} ms por búsqueda, "
+          f"caché {buscador.aciertos}/{total} aciertos")
+    pool.cerrar()
+
+
+@benchmark('diccionario')
+def bench_diccionario(lecciones=10000, palabras_por_leccion=10, busquedas=1000):
+    """Diccionario con 100k palabras: índice de prefijos y de borrados frente a recorrer las lecciones"""
+    from diccionario import DISTANCIA_MAXIMA, LONGITUD_UNA_EDICION, Diccionario, distancia, normalizar
+
+    silabas = ['ja', "q'i", 'tz', 'ch', 'ix', 'ak', "b'a", 'le', 'ru', 'wa', 'xo', 'ki', "k'u", 'al']
+    aleatorio = random.Random(1)
+
+    def palabra():
+        return ''.join(aleatorio.choices(silabas, k=aleatorio.randint(2, 4)))
+
+    datos = lecciones_sinteticas(lecciones, palabras_por_leccion)
+    for nivel in datos.values():
+        for leccion in nivel:
+            for entrada in leccion['contenido']:
+                entrada['maya'] = palabra()
+    catalogo = CatalogoLecciones(datos)
+
+    antes = _rss_kb()
+    inicio = time.perf_counter()
+    diccionario = Diccionario(catalogo)
+    construir_ms = (time.perf_counter() - inicio) * 1e3
+    print(f"{len(diccionario)} entradas, {len(diccionario.claves)} claves, índice en {construir_ms:.0f} ms, "
+          f"RSS +{(_rss_kb() - antes) / 1024:.0f} MB")
+
+    prefijos = [palabra()[:aleatorio.randint(2, 5)] for _ in range(busquedas)]
+    # Errores de tecleo: una palabra del vocabulario con una letra cambiada
+    erratas = []
+    for _ in range(busquedas):
+        maya = aleatorio.choice(diccionario.pares)[0]
+        posicion = aleatorio.randrange(len(maya))
+        erratas.append(maya[:posicion] + 'e' + maya[posicion + 1:])
+
+    def lineal(consulta, aproximada):
+        clave = normalizar(consulta)
+        radio = 1 if len(clave) <= LONGITUD_UNA_EDICION else DISTANCIA_MAXIMA
+        encontradas = []
+        for leccion in catalogo.por_id.values():
+            for entrada in leccion['contenido']:
+                forma = normalizar(entrada['maya'])
+                if forma.startswith(clave) or (aproximada and distancia(clave, forma, radio) <= radio):
+                    encontradas.append(entrada)
+        return encontradas
+
+    print(f"{'búsqueda':>10} {'índice µs':>10} {'lineal µs':>10}")
+    for nombre, consultas, metodo, aproximada in (
+            ('prefijo', prefijos, diccionario.por_prefijo, False),
+            ('aproximada', erratas, diccionario.aproximadas, True)):
+        inicio = time.perf_counter()
+        for consulta in consultas:
+            metodo(consulta)
+        indice_us = (time.perf_counter() - inicio) / len(consultas) * 1e6
+        muestra = consultas[:20]
+        inicio = time.perf_counter()
+        for consulta in muestra:
+            lineal(consulta, aproximada)
+        lineal_us = (time.perf_counter() - inicio) / len(muestra) * 1e6
+        print(f"{nombre:>10} {indice_us:>10.1f} {lineal_us:>10.0f}")
+
+
+@benchmark('escritura')
+def bench_escritura(tamanos=(10, 100, 1000, 10000), respuestas=2000):
+    """Corregir una respuesta escrita: árbol BK de la lección frente a medir la distancia a cada palabra"""
+    from escritura import RespuestasEscritas, distancia, normalizar_respuesta, tolerancia
+
+    silabas = ['ja', "q'i", 'tz', 'ch', 'ix', 'ak', "b'a", 'le', 'ru', 'wa', 'xo', 'ki', "k'u", 'al']
+    aleatorio = random.Random(1)
+    print(f"{'palabras':>9} {'preparar ms':>12} {'árbol µs':>9} {'lineal µs':>10}")
+    for n in tamanos:
+        palabras = [''.join(aleatorio.choices(silabas, k=aleatorio.randint(2, 5))) for _ in range(n)]
+        inicio = time.perf_counter()
+        escritas = RespuestasEscritas(palabras)
+        preparar_ms = (time.perf_counter() - inicio) * 1e3
+
+        # La mitad exactas y la otra mitad con una letra cambiada
+        preguntas = []
+        for i in range(respuestas):
+            indice = aleatorio.randrange(n)
+            palabra = palabras[indice]
+            if i % 2:
+                posicion = aleatorio.randrange(len(palabra))
+                palabra = palabra[:posicion] + 'e' + palabra[posicion + 1:]
+            preguntas.append((palabra, indice))
+
+        inicio = time.perf_counter()
+        for respuesta, indice in preguntas:
+            escritas.corregir(respuesta, indice)
+        arbol_us = (time.perf_counter() - inicio) / respuestas * 1e6
+
+        def lineal(respuesta, indice):
+            escrita = normalizar_respuesta(respuesta)
+            radio = tolerancia(len(escrita))
+            return min(((distancia(escrita, forma), forma) for forma in escritas.formas
+                        if distancia(escrita, forma, radio) <= radio), default=None)
+
+        muestra = preguntas[:max(20, respuestas // n)]
+        inicio = time.perf_counter()
+        for respuesta, indice in muestra:
+            lineal(respuesta, indice)
+        lineal_us = (time.perf_counter() - inicio) / len(muestra) * 1e6
+        print(f"{n:>9} {preparar_ms:>12.1f} {arbol_us:>9.1f} {lineal_us:>10.1f}")
+
+
+@benchmark('exportar')
+def bench_exportar(usuarios=50000, lecciones_por_usuario=10):
+    """Exportar el progreso: fetchall y un solo texto frente al cursor por lotes en streaming"""
+    import csv
+    import io
+    import tracemalloc
+    from exportar import consulta, exportar
+
+    ruta = base_temporal()
+    pool = PoolConexiones(ruta)
+    migrar(pool.conexion())
+    with pool.transaccion() as conn:
+        conn.executemany("INSERT INTO usuarios (id, nombre) VALUES (?, ?)",
+                         ((i, f"alumno{i}") for i in range(1, usuarios + 1)))
+        conn.executemany("INSERT INTO progreso VALUES (?, ?, 1, ?)",
+                         ((u, l, f"2024-{(u + l) % 12 + 1:02d}-01")
+                          for u in range(1, usuarios + 1) for l in range(1, lecciones_por_usuario + 1)))
+    filas = usuarios * lecciones_por_usuario
+
+    def todo_junto():
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(pool.conexion().execute(*consulta()).fetchall())
+        yield buffer.getvalue().encode('utf-8')
+
+    print(f"{filas} filas de progreso")
+    print(f"{'método':>10} {'primer trozo ms':>16} {'total s':>8} {'pico memoria MB':>16}")
+    for nombre, generar in (('fetchall', todo_junto), ('streaming', lambda: exportar(ruta, 'csv'))):
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        trozos = generar()
+        next(trozos)
+        primero = time.perf_counter() - inicio
+        for _ in trozos:
+            pass
+        total = time.perf_counter() - inicio
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{nombre:>10} {primero * 1e3:>16.1f} {total:>8.2f} {pico / 1e6:>16.1f}")
+    pool.cerrar()
+
+
+def _rss_kb():
+    """Memoria residente del proceso actual en KB (solo Linux)"""
+    with open('/proc/self/status') as f:
+        for linea in f:
+            if linea.startswith('VmRSS:'):
+                return int(linea.split()[1])
+    return 0
+
+
+_MEDIR_CARGA = '''
+import sys, time
+sys.path.insert(0, {raiz!r})
+import benchmarks
+antes = benchmarks._rss_kb()
+inicio = time.perf_counter()
+{carga}
+tiempo = time.perf_counter() - inicio
+for leccion_id in range(1, len(catalogo) + 1, 7):
+    catalogo.leccion(leccion_id)["contenido"][0]
+print(tiempo * 1e3, benchmarks._rss_kb() - antes)
+'''
+
+
+@benchmark('paquete')
+def bench_paquete(lecciones=10000, palabras_por_leccion=20):
+    """Arranque y memoria de un worker: JSON + CatalogoLecciones frente al paquete compilado.
+
+    Los dos se cargan con CargadorCatalogo, como en un worker: el JSON sin
+    paquete al lado y el mismo JSON con su paquete compilado.
+    """
+    import json
+    import subprocess
+    from paquete import compilar_archivo
+
+    rutas = {}
+    for nombre in ('json', 'paquete'):
+        rutas[nombre] = os.path.join(os.path.dirname(base_temporal()), 'lecciones.json')
+        with open(rutas[nombre], 'w', encoding='utf-8') as f:
+            json.dump(lecciones_sinteticas(lecciones, palabras_por_leccion), f, ensure_ascii=False)
+    ruta_pack = compilar_archivo(rutas['paquete'])
+    print(f"{lecciones} lecciones x {palabras_por_leccion} palabras: "
+          f"JSON {os.path.getsize(rutas['json']) / 1024:.0f} KB, paquete {os.path.getsize(ruta_pack) / 1024:.0f} KB")
+
+    cargas = {nombre: f"from catalogo import CargadorCatalogo\ncatalogo = CargadorCatalogo({ruta!r}).actual()"
+              for nombre, ruta in rutas.items()}
+    raiz = os.path.dirname(os.path.abspath(__file__))
+    for nombre, carga in cargas.items():
+        salida = subprocess.run([sys.executable, '-c', _MEDIR_CARGA.format(raiz=raiz, carga=carga)],
+                                capture_output=True, text=True, check=True).stdout.split()
+        print(f"{nombre:>8}: carga {float(salida[0]):.1f} ms, RSS +{int(salida[1]) / 1024:.1f} MB")
+
+
+@benchmark('repaso')
+def bench_repaso(tamanos=(10, 100, 1000, 10000, 100000), preguntas=2000):
+    """Elegir la siguiente palabra: lista filtrada por petición frente al heap de repaso"""
+    print(f"{'palabras':>9} {'filtrado µs':>12} {'heap µs':>9}")
+    for n in tamanos:
+        contenido = [{"maya": f"maya_{i}", "espanol": f"espanol_{i}"} for i in range(n)]
+
+        preguntadas = set()
+        inicio = time.perf_counter()
+        for _ in range(preguntas):
+            disponibles = [p for p in contenido if p["espanol"] not in preguntadas]
+            if not disponibles:
+                preguntadas = set()
+                disponibles = contenido
+            preguntadas.add(random.choice(disponibles)["espanol"])
+        filtrado = (time.perf_counter() - inicio) / preguntas * 1e6
+
+        plan = PlanRepaso([p["maya"] for p in contenido])
+        ahora = time.time()
+        indice = None
+        inicio = time.perf_counter()
+        for pregunta in range(preguntas):
+            indice = plan.siguiente(evitar=indice)
+            plan.registrar(indice, pregunta % 3 != 0, ahora=ahora + pregunta)
+        heap = (time.perf_counter() - inicio) / preguntas * 1e6
+
+        print(f"{n:>9} {filtrado:>12.1f} {heap:>9.1f}")
+
+
+@benchmark('lecciones')
+def bench_lecciones(peticiones=3000):
+    """Peticiones por segundo a /lecciones: render en cada visita, caché y 304"""
+    from flask import render_template
+    modulo = app_temporal()
+    cliente = modulo.app.test_client()
+    cliente.post('/registro', data={'nombre': f'bench{time.time()}'})
+
+    class SinCache:
+        def responder(self, clave, plantilla, **contexto):
+            return render_template(plantilla, **contexto)
+
+    def medir(cabeceras=None):
+        inicio = time.perf_counter()
+        for _ in range(peticiones):
+            respuesta = cliente.get('/lecciones', headers=cabeceras)
+        return peticiones / (time.perf_counter() - inicio), respuesta
+
+    paginas = modulo.paginas
+    modulo.paginas = SinCache()
+    antes, _ = medir()
+    modulo.paginas = paginas
+    cache, respuesta = medir()
+    condicional, respuesta_304 = medir({'If-None-Match': respuesta.headers['ETag']})
+
+    print(f"render por petición: {antes:.0f} pet/s")
+    print(f"caché (200):         {cache:.0f} pet/s, {len(respuesta.data)} B")
+    print(f"condicional ({respuesta_304.status_code}):   {condicional:.0f} pet/s, {len(respuesta_304.data)} B")
+    cliente.post('/eliminar_usuario')
+
+
+@benchmark('recursos')
+def bench_recursos():
+    """Bytes transferidos por /ejercicio en la primera visita y en las siguientes"""
+    import re
+    modulo = app_temporal()
+    cliente = modulo.app.test_client()
+    cliente.post('/registro', data={'nombre': f'bench{time.time()}'})
+    cliente.get(f"/leccion/{next(iter(modulo.app_maya.catalogo.por_id))}")
+    html = cliente.get('/ejercicio', headers={'Accept-Encoding': 'gzip'}).data
+
+    urls = re.findall(rb'(?:href|src)="(/recursos/[^"]+)"', html)
+    for codificacion in ('identity', 'gzip', 'br'):
+        total = 0
+        for url in urls:
+            respuesta = cliente.get(url.decode(), headers={'Accept-Encoding': codificacion})
+            total += len(respuesta.data)
+        print(f"recursos ({codificacion:8}): {total} B en {len(urls)} archivo(s)")
+    print(f"HTML por ejercicio:     {len(html)} B (los recursos quedan en caché del navegador)")
+    cliente.post('/eliminar_usuario')
+
+
+@benchmark('lote')
+def bench_lote(lecciones=50):
+    """Lección completa: formulario por ejercicio frente a la API por lotes"""
+    import html
+    import re
+    from fichas import LimiteRespuestas
+    from lotes import FirmaLotes
+    modulo = app_temporal()
+    cliente = modulo.app.test_client()
+    cliente.post('/registro', data={'nombre': f'bench{time.time()}'})
+    leccion_id = next(iter(modulo.app_maya.catalogo.por_id))
+    contenido = modulo.app_maya.catalogo.leccion(leccion_id)['contenido']
+    # Solo para el benchmark: leer los índices del token para acertar todo
+    serializador = FirmaLotes(modulo.app.secret_key)._serializador
+    modulo.limite_respuestas = LimiteRespuestas(rafaga=10 ** 9)
+
+    def con_formulario():
+        peticiones = 1
+        pagina = cliente.get(f'/leccion/{leccion_id}', follow_redirects=True).data.decode()
+        while True:
+            ficha = html.unescape(re.search(r'name="ficha" value="([^"]*)"', pagina).group(1))
+            correcta = contenido[int(ficha.split('.')[0])]['maya']
+            respuesta = cliente.post('/ejercicio', data={'respuesta': correcta, 'ficha': ficha})
+            peticiones += 1
+            if respuesta.status_code == 302 and 'lecciones' in respuesta.headers['Location']:
+                return peticiones
+            pagina = respuesta.data.decode()
+
+    def con_lotes():
+        cliente.get(f'/leccion/{leccion_id}')
+        peticiones = 1
+        while True:
+            lote = cliente.get(f'/api/leccion/{leccion_id}/ejercicios').get_json()
+            indices = serializador.loads(lote['token'])['p']
+            resultado = cliente.post(f'/api/leccion/{leccion_id}/respuestas', json={
+                'token': lote['token'], 'respuestas': [contenido[i]['maya'] for i in indices]}).get_json()
+            peticiones += 2
+            if resultado['terminado']:
+                return peticiones
+
+    for nombre, jugar in (('formulario', con_formulario), ('lotes', con_lotes)):
+        inicio = time.perf_counter()
+        peticiones = sum(jugar() for _ in range(lecciones))
+        duracion = time.perf_counter() - inicio
+        print(f"{nombre:10}: {peticiones / lecciones:.1f} peticiones/lección, "
+              f"{lecciones / duracion:.1f} lecciones/s")
+    cliente.post('/eliminar_usuario')
+
+
+@benchmark('fichas')
+def bench_fichas(respuestas=200000):
+    """Coste por respuesta de emitir y verificar una ficha y del límite por usuario"""
+    from fichas import FichasEjercicio, LimiteRespuestas
+    fichas = FichasEjercicio('clave de prueba')
+    limite = LimiteRespuestas(rafaga=10 ** 9)
+    version = 'a' * 64
+
+    inicio = time.perf_counter()
+    emitidas = [fichas.emitir(i % 1000, 3, version, i % 20) for i in range(respuestas)]
+    emitir = (time.perf_counter() - inicio) / respuestas
+
+    inicio = time.perf_counter()
+    for i, ficha in enumerate(emitidas):
+        fichas.verificar(ficha, i % 1000, 3, version)
+    verificar = (time.perf_counter() - inicio) / respuestas
+
+    inicio = time.perf_counter()
+    for i in range(respuestas):
+        limite.permitir(i % 1000)
+    limitar = (time.perf_counter() - inicio) / respuestas
+
+    print(f"emitir:    {emitir * 1e6:.2f} µs")
+    print(f"verificar: {verificar * 1e6:.2f} µs (MAC, caducidad y repetición)")
+    print(f"límite:    {limitar * 1e6:.2f} µs")
+    print(f"total por respuesta: {(emitir + verificar + limitar) * 1e6:.2f} µs")
+
+
+@benchmark('asgi')
+def bench_asgi(inactivas=(0, 100, 1000), peticiones=200, hilos=8):
+    """Modo síncrono (gunicorn) frente a ASGI (uvicorn) con clientes lentos abiertos"""
+    import http.client
+    import socket
+    modos = {
+        'sync': (['gunicorn', 'app:app'], {}),
+        'asgi': (['gunicorn', 'asgi:aplicacion'], {'MODO_ASGI': '1'}),
+    }
+    print(f"{'modo':>5} {'inactivas':>10} {'pet/s':>8} {'p50 ms':>8} {'fallos':>7}")
+    for puerto, (modo, (comando, entorno)) in enumerate(modos.items(), start=18470):
+        proceso = arrancar_servidor(comando, entorno, puerto)
+        try:
+            for n_inactivas in inactivas:
+                # Clientes móviles lentos: conectan, envían media cabecera y esperan
+                lentas = []
+                for _ in range(n_inactivas):
+                    conexion = socket.create_connection(('127.0.0.1', puerto))
+                    conexion.sendall(b'GET /api/usuarios HTTP/1.1\r\nHost: bench\r\n')
+                    lentas.append(conexion)
+
+                latencias, fallos = [], []
+
+                def cliente(cantidad):
+                    for _ in range(cantidad):
+                        inicio = time.perf_counter()
+                        try:
+                            conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=2)
+                            conexion.request('GET', '/api/usuarios?q=a')
+                            conexion.getresponse().read()
+                            conexion.close()
+                            latencias.append(time.perf_counter() - inicio)
+                        except OSError:
+                            fallos.append(1)
+
+                trabajadores = [threading.Thread(target=cliente, args=(peticiones // hilos,))
+                                for _ in range(hilos)]
+                inicio = time.perf_counter()
+                for t in trabajadores:
+                    t.start()
+                for t in trabajadores:
+                    t.join()
+                duracion = time.perf_counter() - inicio
+                for conexion in lentas:
+                    conexion.close()
+
+                latencias.sort()
+                p50 = latencias[len(latencias) // 2] * 1000 if latencias else float('nan')
+                print(f"{modo:>5} {n_inactivas:>10} {len(latencias) / duracion:>8.0f} "
+                      f"{p50:>8.1f} {len(fallos):>7}")
+        finally:
+            proceso.terminate()
+            proceso.wait()
+
+
+@benchmark('clasificacion')
+def bench_clasificacion(usuarios=100000, consultas=2000, cambios=1000):
+    """Top 10 y posición de un usuario: SQL sobre los agregados frente a la lista en memoria"""
+    from clasificacion import Clasificacion
+    pool = PoolConexiones(base_temporal())
+    conn = pool.conexion()
+    migrar(conn)
+    with pool.transaccion() as conn:
+        conn.executemany("INSERT INTO usuarios (id, nombre) VALUES (?, ?)",
+                         ((i, f"usuario{i}") for i in range(1, usuarios + 1)))
+        # Actividad repartida a lo largo del último día
+        conn.executemany("INSERT INTO estadisticas (usuario_id, puntos, actualizado) VALUES (?, ?, ?)",
+                         ((i, random.randrange(0, 5000) * 10, time.time() - random.uniform(3600, 86400))
+                          for i in range(1, usuarios + 1)))
+    ids = [random.randrange(1, usuarios + 1) for _ in range(consultas)]
+
+    def medir(funcion):
+        inicio = time.perf_counter()
+        for usuario_id in ids:
+            funcion(usuario_id)
+        return (time.perf_counter() - inicio) / consultas * 1e6
+
+    sql_top = medir(lambda _: conn.execute(
+        "SELECT usuario_id, puntos FROM estadisticas ORDER BY puntos DESC, usuario_id LIMIT 10").fetchall())
+    sql_posicion = medir(lambda u: conn.execute(
+        "SELECT COUNT(*) FROM estadisticas WHERE puntos > (SELECT puntos FROM estadisticas WHERE usuario_id = ?)",
+        (u,)).fetchone())
+
+    clasificacion = Clasificacion(pool, intervalo=3600)
+    inicio = time.perf_counter()
+    clasificacion.refrescar(completa=True)
+    construir = time.perf_counter() - inicio
+    memoria_top = medir(lambda _: clasificacion.primeros(10))
+    memoria_posicion = medir(clasificacion.posicion)
+
+    # Refresco incremental tras `cambios` respuestas nuevas
+    with pool.transaccion() as conn:
+        conn.executemany("UPDATE estadisticas SET puntos = puntos + 10, actualizado = ? WHERE usuario_id = ?",
+                         ((time.time(), i) for i in random.sample(range(1, usuarios + 1), cambios)))
+    inicio = time.perf_counter()
+    clasificacion.refrescar()
+    refresco = time.perf_counter() - inicio
+
+    print(f"{usuarios} usuarios")
+    print(f"top 10:   SQL ORDER BY {sql_top:8.1f} µs   memoria {memoria_top:6.1f} µs")
+    print(f"posición: SQL COUNT(*) {sql_posicion:8.1f} µs   memoria {memoria_posicion:6.1f} µs")
+    print(f"construir la lista: {construir * 1000:.0f} ms; "
+          f"refresco incremental de {cambios} cambios: {refresco * 1000:.1f} ms")
+    pool.cerrar()
+
+
+_MEDIR_PETICIONES = '''
+import sys, time
+sys.path.insert(0, {raiz!r})
+import benchmarks
+modulo = benchmarks.app_temporal()
+cliente = modulo.app.test_client()
+cliente.post('/registro', data={{'nombre': 'metricas'}})
+cliente.get('/leccion/1')
+rutas = ('/ejercicio', '/api/usuarios?q=me', '/lecciones', '/api/clasificacion')
+for ruta in rutas:
+    cliente.get(ruta)
+inicio = time.perf_counter()
+for _ in range({peticiones}):
+    for ruta in rutas:
+        cliente.get(ruta)
+print((time.perf_counter() - inicio) / ({peticiones} * len(rutas)) * 1e6)
+'''
+
+
+@benchmark('metricas')
+def bench_metricas(peticiones=1000):
+    """Coste por petición de la instrumentación: METRICAS=0 frente a METRICAS=1"""
+    import subprocess
+    raiz = os.path.dirname(os.path.abspath(__file__))
+    codigo = _MEDIR_PETICIONES.format(raiz=raiz, peticiones=peticiones)
+    tiempos = {}
+    for valor in ('0', '1') * 4:
+        salida = subprocess.run([sys.executable, '-c', codigo], capture_output=True, text=True, check=True,
+                                cwd=raiz, env=dict(os.environ, METRICAS=valor)).stdout
+        tiempos.setdefault(valor, []).append(float(salida))
+    sin, con = min(tiempos['0']), min(tiempos['1'])
+    print(f"sin métricas: {sin:.1f} µs/petición")
+    print(f"con métricas: {con:.1f} µs/petición ({con - sin:+.1f} µs, {100 * (con - sin) / sin:+.1f}%)")
+
+    from metricas import Registro, LIMITES_SEGUNDOS
+    registro = Registro()
+    registro.definir('h', 'histogram', '', LIMITES_SEGUNDOS)
+    inicio = time.perf_counter()
+    for i in range(100000):
+        registro.observar('h', i * 1e-6, (('ruta', 'x'),))
+    print(f"observar un valor: {(time.perf_counter() - inicio) * 10:.2f} µs")
+
+
+@benchmark('medios')
+def bench_medios(peticiones=300, hilos=4):
+    """Servir imágenes y audio: LRU en memoria, disco por petición, sendfile y rangos"""
+    import http.client
+    from medios import AlmacenMedios
+    directorio = tempfile.mkdtemp(prefix='maya_medios_')
+    for i in range(20):
+        with open(os.path.join(directorio, f"{i}.png"), 'wb') as f:
+            f.write(os.urandom(20 * 1024))
+    with open(os.path.join(directorio, 'audio.mp3'), 'wb') as f:
+        f.write(os.urandom(4 * 1024 * 1024))
+    almacen = AlmacenMedios(directorio)
+    imagenes = [f"/medios/{almacen.clave(almacen.nombres[f'{i}.png'])}" for i in range(20)]
+    audio = f"/medios/{almacen.clave(almacen.nombres['audio.mp3'])}"
+
+    def medir(puerto, rutas, cabeceras):
+        def cliente(cantidad, bytes_leidos):
+            for n in range(cantidad):
+                conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=10)
+                conexion.request('GET', rutas[n % len(rutas)], headers=cabeceras)
+                bytes_leidos.append(len(conexion.getresponse().read()))
+                conexion.close()
+
+        leidos = [[] for _ in range(hilos)]
+        trabajadores = [threading.Thread(target=cliente, args=(peticiones // hilos, leidos[i]))
+                        for i in range(hilos)]
+        inicio = time.perf_counter()
+        for t in trabajadores:
+            t.start()
+        for t in trabajadores:
+            t.join()
+        duracion = time.perf_counter() - inicio
+        total = sum(map(sum, leidos))
+        return sum(map(len, leidos)) / duracion, total / duracion / 1e6
+
+    casos = [
+        ('imágenes 20 KB', imagenes, {}),
+        ('audio 4 MB', [audio], {}),
+        ('audio Range 256 KB', [audio], {'Range': 'bytes=1048576-1310719'}),
+    ]
+    servidores = [
+        ('LRU + sendfile', [], {}),
+        ('sin LRU', [], {'MEDIOS_CACHE_MB': '0'}),
+        ('sin sendfile', ['--no-sendfile'], {}),
+    ]
+    print(f"{'servidor':>16} {'caso':>20} {'pet/s':>8} {'MB/s':>8}")
+    for puerto, (servidor, opciones, entorno) in enumerate(servidores, start=18490):
+        proceso = arrancar_servidor(['gunicorn', 'app:app', '--threads', str(hilos)] + opciones,
+                                    dict(entorno, MAYA_MEDIOS=directorio), puerto)
+        try:
+            for caso, rutas, cabeceras in casos:
+                medir(puerto, rutas, cabeceras)
+                por_segundo, megas = medir(puerto, rutas, cabeceras)
+                print(f"{servidor:>16} {caso:>20} {por_segundo:>8.0f} {megas:>8.0f}")
+        finally:
+            proceso.terminate()
+            proceso.wait()
+
+
+@benchmark('hilo_db')
+def bench_hilo_db(bloqueo=0.5):
+    """kiche.py con la base bloqueada por otro proceso: consulta en el hilo de Tk frente a HiloBaseDatos"""
+    from basedatos import HiloBaseDatos, abrir_conexion
+    from kiche import crear_usuario
+    ruta = base_temporal()
+    pool = PoolConexiones(ruta)
+    migrar(pool.conexion())
+
+    def bloquear():
+        # Otra aplicación (la web) con una transacción de escritura abierta
+        conn = abrir_conexion(ruta, check_same_thread=False)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("INSERT INTO usuarios (nombre) VALUES (?)", (f"bloqueo{time.time()}",))
+        threading.Timer(bloqueo, conn.commit).start()
+
+    bloquear()
+    inicio = time.perf_counter()
+    with pool.transaccion() as conn:
+        crear_usuario(conn, 'directo')
+    directo = time.perf_counter() - inicio
+
+    hilo = HiloBaseDatos(pool)
+    resultado = []
+    bloquear()
+    inicio = time.perf_counter()
+    hilo.enviar(crear_usuario, 'hilo', al_terminar=resultado.append)
+    enviar = time.perf_counter() - inicio
+    while not hilo.entregar():
+        time.sleep(0.001)
+    entregado = time.perf_counter() - inicio
+    hilo.cerrar()
+
+    print(f"bloqueo de otro proceso: {bloqueo * 1000:.0f} ms")
+    print(f"en el hilo de Tk:   interfaz congelada {directo * 1000:.1f} ms")
+    print(f"con HiloBaseDatos:  interfaz ocupada {enviar * 1e6:.1f} µs, resultado a los {entregado * 1000:.1f} ms")
+
+
+@benchmark('tk')
+def bench_tk(preguntas=200, lecciones=3000):
+    """Coste de redibujar en kiche.py: reconstruir todos los widgets frente a reutilizar pantallas"""
+    import json
+    import tkinter as tk
+    from tkinter import ttk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        print("Sin pantalla (DISPLAY) no se puede medir Tkinter")
+        return
+    import kiche
+
+    directorio = tempfile.mkdtemp(prefix='maya_tk_')
+    with open(os.path.join(directorio, 'lecciones_maya_kiche.json'), 'w', encoding='utf-8') as f:
+        json.dump(lecciones_sinteticas(lecciones), f, ensure_ascii=False)
+    anterior = os.getcwd()
+    os.chdir(directorio)
+    try:
+        app = kiche.AprendizajeMayaKiche(root)
+        app.hilo_db.cerrar()
+        app.progreso.cerrar()
+        root.update()
+        ventana = tk.Toplevel(root)
+        ventana.geometry("800x600")
+        marco = tk.Frame(ventana, bg='#1a73e8')
+        marco.pack(fill=tk.BOTH, expand=True)
+
+        def medir(funcion, veces):
+            inicio = time.perf_counter()
+            for _ in range(veces):
+                funcion()
+                root.update()
+            return (time.perf_counter() - inicio) / veces * 1000
+
+        # Como mostrar_ejercicio antes de reutilizar pantallas: destruir y crear todo
+        leccion = app.catalogo.leccion(1)
+        distintas = app.catalogo.respuestas_distintas(1)
+
+        def pregunta_reconstruida():
+            for widget in marco.winfo_children():
+                widget.destroy()
+            palabra = leccion["contenido"][random.randrange(len(leccion["contenido"]))]
+            frame = tk.Frame(marco, bg='white', padx=20, pady=20)
+            frame.pack(fill=tk.BOTH, expand=True)
+            info = tk.Frame(frame, bg='white')
+            info.pack(fill=tk.X, pady=10)
+            tk.Label(info, text="Puntos: 0", font=('Arial', 12), bg='white').pack(side=tk.LEFT)
+            tk.Label(info, text="Vidas: 3", font=('Arial', 12), bg='white').pack(side=tk.RIGHT)
+            frame_pregunta = tk.Frame(frame, bg='white')
+            frame_pregunta.pack(pady=20)
+            tk.Label(frame_pregunta, text="¿Cómo se dice en Maya K'iche'?", font=('Arial', 16, 'bold'),
+                     bg='white').pack()
+            tk.Label(frame_pregunta, text=palabra["espanol"], font=('Arial', 20, 'bold'), bg='white',
+                     fg='#1a73e8').pack(pady=10)
+            opciones = tk.Frame(frame, bg='white')
+            opciones.pack(pady=20)
+            for opcion in generar_opciones(distintas, palabra["maya"]):
+                tk.Button(opciones, text=opcion, font=('Arial', 14), width=20, height=2,
+                          command=lambda o=opcion: None).pack(pady=5)
+            tk.Button(frame, text="Saltar", font=('Arial', 12)).pack(pady=10)
+
+        def lista_completa():
+            for widget in marco.winfo_children():
+                widget.destroy()
+            notebook = ttk.Notebook(marco)
+            notebook.pack(fill=tk.BOTH, expand=True)
+            for nivel, lecciones_nivel in app.lecciones.items():
+                canvas = tk.Canvas(notebook)
+                notebook.add(canvas, text=nivel)
+                interior = ttk.Frame(canvas)
+                canvas.create_window((0, 0), window=interior, anchor="nw")
+                for l in lecciones_nivel:
+                    fila = tk.Frame(interior, relief=tk.RAISED, borderwidth=1, padx=10, pady=10)
+                    fila.pack(fill=tk.X, padx=10, pady=5)
+                    tk.Label(fila, text=l["titulo"], font=('Arial', 14, 'bold')).pack(anchor=tk.W)
+                    tk.Label(fila, text=f"Tipo: {l['tipo']}", font=('Arial', 10)).pack(anchor=tk.W)
+                    tk.Button(fila, text="Iniciar Lección", font=('Arial', 10)).pack(anchor=tk.E)
+
+        antes = medir(pregunta_reconstruida, preguntas)
+        lista_antes = medir(lista_completa, 1)
+        ventana.destroy()
+
+        app.iniciar_leccion(leccion)
+        root.update()
+        despues = medir(app.mostrar_ejercicio, preguntas)
+        lista_primera = medir(app.mostrar_lecciones, 1)
+        app.mostrar_pantalla_inicio()
+        lista_despues = medir(app.mostrar_lecciones, 1)
+        lista = app.listas_lecciones['basico']
+        desplazar = medir(lambda: lista.desplazar('scroll', 1, 'units'), preguntas)
+        filas = len(lista.filas)
+
+        print(f"pregunta: reconstruir {antes:.2f} ms, actualizar {despues:.2f} ms")
+        print(f"lecciones ({lecciones}): crear todas las filas {lista_antes:.1f} ms; "
+              f"lista virtual {lista_primera:.1f} ms la primera vez, {lista_despues:.2f} ms después "
+              f"({filas} filas por nivel)")
+        print(f"desplazar una fila: {desplazar:.2f} ms")
+    finally:
+        os.chdir(anterior)
+        root.destroy()
+
+
+def main(argv):
+    nombres = argv or list(BENCHMARKS)
+    for nombre in nombres:
+        if nombre not in BENCHMARKS:
+            print(f"Benchmark desconocido: {nombre}. Disponibles: {', '.join(BENCHMARKS)}")
+            return 1
+        print(f"== {nombre} ==")
+        BENCHMARKS[nombre]()
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,282 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from diccionario import Diccionario
+from ejercicios import respuestas_distintas
+from escritura import RespuestasEscritas
+from paquete import CatalogoPaquete, huella_paquete, ruta_paquete
+
+logger = logging.getLogger(__name__)
+
+RUTA_LECCIONES = 'lecciones_maya_kiche.json'
+
+# Catálogo mínimo que se escribe si el archivo de lecciones no existe
+LECCIONES_EJEMPLO = {
+    "basico": [
+        {
+            "id": 1,
+            "titulo": "Saludos Básicos",
+            "tipo": "vocabulario",
+            "contenido": [
+                {"maya": "Saqarik", "espanol": "Buenos días", "imagen": "sol.png"},
+                {"maya": "Xqa q'ij", "espanol": "Buenas tardes", "imagen": "tarde.png"},
+                {"maya": "Xokaq'ab'", "espanol": "Buenas noches", "imagen": "noche.png"},
+                {"maya": "Utz awach?", "espanol": "¿Cómo estás?", "imagen": "saludo.png"},
+                {"maya": "Utz tinimit", "espanol": "Estoy bien", "imagen": "bien.png"}
+            ]
+        },
+        {
+            "id": 2,
+            "titulo": "Números 1-10",
+            "tipo": "numeros",
+            "contenido": [
+                {"maya": "Jun", "espanol": "Uno", "imagen": "1.png"},
+                {"maya": "Kieb'", "espanol": "Dos", "imagen": "2.png"},
+                {"maya": "Oxib'", "espanol": "Tres", "imagen": "3.png"},
+                {"maya": "Kajib'", "espanol": "Cuatro", "imagen": "4.png"},
+                {"maya": "Job'", "espanol": "Cinco", "imagen": "5.png"}
+            ]
+        }
+    ],
+    "intermedio": [
+        {
+            "id": 3,
+            "titulo": "Familia",
+            "tipo": "vocabulario",
+            "contenido": [
+                {"maya": "Na", "espanol": "Madre", "imagen": "madre.png"},
+                {"maya": "Te", "espanol": "Padre", "imagen": "padre.png"},
+                {"maya": "Ali", "espanol": "Hijo/Hija", "imagen": "hijo.png"},
+                {"maya": "Achijab'", "espanol": "Hermano", "imagen": "hermano.png"}
+            ]
+        }
+    ]
+}
+
+
+class CatalogoInvalido(ValueError):
+    """El archivo de lecciones no tiene la estructura esperada"""
+
+
+def validar_lecciones(lecciones):
+    """Comprobar la estructura del catálogo y lanzar CatalogoInvalido si falla"""
+    if not isinstance(lecciones, dict):
+        raise CatalogoInvalido("El catálogo debe ser un objeto nivel -> lista de lecciones")
+
+    ids = set()
+    for nivel, lecciones_nivel in lecciones.items():
+        if not isinstance(lecciones_nivel, list):
+            raise CatalogoInvalido(f"El nivel '{nivel}' debe ser una lista de lecciones")
+        for posicion, leccion in enumerate(lecciones_nivel):
+            donde = f"{nivel}[{posicion}]"
+            if not isinstance(leccion, dict):
+                raise CatalogoInvalido(f"{donde}: la lección debe ser un objeto")
+            leccion_id = leccion.get('id')
+            if not isinstance(leccion_id, int) or isinstance(leccion_id, bool):
+                raise CatalogoInvalido(f"{donde}: 'id' debe ser un entero")
+            if leccion_id in ids:
+                raise CatalogoInvalido(f"{donde}: id {leccion_id} repetido")
+            ids.add(leccion_id)
+            for campo in ('titulo', 'tipo'):
+                if not isinstance(leccion.get(campo), str):
+                    raise CatalogoInvalido(f"{donde}: '{campo}' debe ser texto")
+            contenido = leccion.get('contenido')
+            if not isinstance(contenido, list) or not contenido:
+                raise CatalogoInvalido(f"{donde}: 'contenido' debe ser una lista no vacía")
+            for i, palabra in enumerate(contenido):
+                if not isinstance(palabra, dict) or not all(
+                        isinstance(palabra.get(campo), str) for campo in ('maya', 'espanol')):
+                    raise CatalogoInvalido(f"{donde}.contenido[{i}]: se esperan 'maya' y 'espanol' como texto")
+                for campo in ('imagen', 'audio'):
+                    if not isinstance(palabra.get(campo, ''), str):
+                        raise CatalogoInvalido(f"{donde}.contenido[{i}]: '{campo}' debe ser un nombre de archivo")
+    return lecciones
+
+
+def escribir_ejemplo(ruta=RUTA_LECCIONES, lecciones=LECCIONES_EJEMPLO):
+    """Crear el archivo de lecciones de ejemplo si todavía no existe.
+
+    Se escribe en un temporal y se enlaza con os.link, que falla si el
+    archivo ya existe: si varios procesos arrancan a la vez solo uno lo
+    crea y nadie llega a leer un archivo a medio escribir.
+    """
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    fd, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(lecciones, f, ensure_ascii=False, indent=2)
+        try:
+            os.link(temporal, ruta)
+        except FileExistsError:
+            pass
+    finally:
+        os.unlink(temporal)
+
+
+def cargar_lecciones(ruta=RUTA_LECCIONES):
+    """Leer y validar el archivo de lecciones, creándolo con el ejemplo si no existe"""
+    if not os.path.exists(ruta):
+        escribir_ejemplo(ruta)
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return validar_lecciones(json.load(f))
+
+
+class CatalogoLecciones:
+    """Índice de lecciones construido una sola vez al cargar el catálogo.
+
+    - `por_nivel`: nivel -> lista ordenada de lecciones (como en el JSON)
+    - `por_id`: id -> lección, para búsquedas en O(1)
+    - `palabras`: id -> (tupla maya, tupla español), en el orden de `contenido`
+    - `distintas`: id -> respuestas maya sin duplicados, para los distractores
+    - `version`: huella del contenido del que se construyó
+
+    Las respuestas escritas de cada lección (escritura.py) se preparan la
+    primera vez que se corrige una, y el diccionario (diccionario.py) la
+    primera vez que se busca: cargar el catálogo no paga ninguno de los dos.
+    """
+
+    def __init__(self, lecciones, version=None):
+        self.version = version
+        self.por_nivel = {}
+        self.por_id = {}
+        self.palabras = {}
+        self.distintas = {}
+        self.nivel_de = {}
+        self._escritas = {}
+        self._diccionario = None
+        self._lock_diccionario = threading.Lock()
+
+        for nivel, lecciones_nivel in lecciones.items():
+            self.por_nivel[nivel] = list(lecciones_nivel)
+            for leccion in lecciones_nivel:
+                leccion_id = leccion['id']
+                self.por_id[leccion_id] = leccion
+                self.nivel_de[leccion_id] = nivel
+                contenido = leccion['contenido']
+                self.palabras[leccion_id] = (
+                    tuple(p['maya'] for p in contenido),
+                    tuple(p['espanol'] for p in contenido),
+                )
+                self.distintas[leccion_id] = respuestas_distintas(self.palabras[leccion_id][0])
+
+    def leccion(self, leccion_id):
+        """Devolver la lección con ese id, o None si no existe"""
+        return self.por_id.get(leccion_id)
+
+    def palabras_maya(self, leccion_id):
+        return self.palabras[leccion_id][0]
+
+    def palabras_espanol(self, leccion_id):
+        return self.palabras[leccion_id][1]
+
+    def respuestas_distintas(self, leccion_id):
+        return self.distintas[leccion_id]
+
+    def respuestas_escritas(self, leccion_id):
+        escritas = self._escritas.get(leccion_id)
+        if escritas is None:
+            escritas = self._escritas[leccion_id] = RespuestasEscritas(self.palabras_maya(leccion_id))
+        return escritas
+
+    def diccionario(self):
+        """Índice de búsqueda del vocabulario (diccionario.py), construido en la primera búsqueda"""
+        if self._diccionario is None:
+            # Bajo el lock: peticiones simultáneas no construyen cada una el suyo
+            with self._lock_diccionario:
+                if self._diccionario is None:
+                    self._diccionario = Diccionario(self)
+        return self._diccionario
+
+    def __contains__(self, leccion_id):
+        return leccion_id in self.por_id
+
+    def __len__(self):
+        return len(self.por_id)
+
+
+class CargadorCatalogo:
+    """Mantiene el catálogo actual y lo recarga cuando cambia el archivo.
+
+    Como mucho una vez cada `intervalo` segundos se mira el mtime y tamaño
+    del archivo. Si cambiaron, se lee y se calcula su SHA-256; si ese
+    contenido ya se compiló antes se reutiliza, y si no se valida y se
+    construye un CatalogoLecciones nuevo. El cambio es una sola asignación,
+    así que las peticiones en curso terminan con el catálogo que ya tenían.
+    Si el archivo nuevo no es válido se conserva el anterior.
+
+    Si junto al JSON hay un paquete compilado (paquete.py) de ese mismo
+    contenido, se abre con mmap en lugar de parsear el JSON.
+    """
+
+    def __init__(self, ruta=RUTA_LECCIONES, intervalo=1.0):
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._compilados = {}
+        self._firma = None
+        self._proxima_revision = 0.0
+        self._catalogo = None
+        self.recargar()
+
+    def actual(self):
+        """Devolver el catálogo vigente, recargándolo si el archivo cambió"""
+        if time.monotonic() >= self._proxima_revision:
+            self.recargar()
+        return self._catalogo
+
+    def recargar(self):
+        """Revisar el archivo ahora; devuelve True si se cambió el catálogo"""
+        # Una sola revisión a la vez; el resto sigue usando el catálogo actual
+        if not self._lock.acquire(blocking=self._catalogo is None):
+            return False
+        try:
+            self._proxima_revision = time.monotonic() + self.intervalo
+            if not os.path.exists(self.ruta):
+                escribir_ejemplo(self.ruta)
+            estado = os.stat(self.ruta)
+            firma = (estado.st_mtime_ns, estado.st_size)
+            if firma == self._firma:
+                return False
+
+            with open(self.ruta, 'rb') as f:
+                datos = f.read()
+            huella = hashlib.sha256(datos).hexdigest()
+            self._firma = firma
+            if self._catalogo is not None and huella == self._catalogo.version:
+                return False
+
+            catalogo = self._compilados.get(huella) or self._abrir_paquete(huella)
+            if catalogo is None:
+                try:
+                    lecciones = validar_lecciones(json.loads(datos.decode('utf-8')))
+                except (ValueError, UnicodeDecodeError) as error:
+                    if self._catalogo is None:
+                        raise
+                    logger.error("No se recargó %s: %s", self.ruta, error)
+                    return False
+                catalogo = CatalogoLecciones(lecciones, version=huella)
+                # Conservar solo la versión anterior por si se revierte el cambio
+                if self._catalogo is not None:
+                    self._compilados = {self._catalogo.version: self._catalogo}
+                self._compilados[huella] = catalogo
+
+            self._catalogo = catalogo
+            logger.info("Catálogo de lecciones cargado desde %s (%s)", self.ruta, huella[:12])
+            return True
+        finally:
+            self._lock.release()
+
+    def _abrir_paquete(self, huella):
+        ruta = ruta_paquete(self.ruta)
+        if huella_paquete(ruta) != huella:
+            return None
+        try:
+            return CatalogoPaquete(ruta)
+        except (OSError, ValueError) as error:
+            logger.warning("No se pudo abrir el paquete %s: %s", ruta, error)
+            return None
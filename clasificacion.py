@@ -0,0 +1,265 @@
+"""Clasificación de usuarios por puntos y estadísticas por usuario.
+
+Los agregados viven en la tabla `estadisticas`, que la cola de escritura
+actualiza con cada respuesta y cada lección completada. Cada worker
+guarda en memoria una lista ordenada por (-puntos, usuario_id) construida
+a partir de esa tabla, partida en bloques (ListaOrdenada): el top N es un
+corte del primer bloque, mover a un usuario toca un solo bloque y su
+posición es la suma de prefijos de los tamaños de los bloques anteriores
+(árbol de Fenwick) más una búsqueda binaria.
+
+Para ver lo que escriben otros workers, la lista se refresca leyendo solo
+las filas con `actualizado` reciente (hay un índice por esa columna), cada
+`intervalo` segundos o en cuanto se invalida al completar una lección.
+Los usuarios eliminados en otro worker desaparecen en la reconstrucción
+completa periódica, que lee la tabla entera en un hilo de fondo y cambia
+la lista de una vez: ninguna petición espera a que se construya (salvo
+la primera, cuando aún no hay lista).
+"""
+import bisect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Segundos entre refrescos incrementales y entre reconstrucciones completas
+INTERVALO_REFRESCO = 5
+INTERVALO_RECONSTRUCCION = 600
+
+# Las filas se releen con este margen: la cola de escritura las marca al
+# encolarlas y las escribe un poco después
+MARGEN_REFRESCO = 10
+
+# Elementos por bloque de ListaOrdenada (un bloque se parte al doblarlo)
+CARGA = 1000
+
+SQL_TODOS = '''SELECT e.usuario_id, u.nombre, e.puntos, e.actualizado
+               FROM estadisticas e JOIN usuarios u ON u.id = e.usuario_id'''
+SQL_CAMBIOS = SQL_TODOS + ' WHERE e.actualizado >= ?'
+SQL_USUARIO = '''SELECT puntos, respuestas, aciertos, lecciones FROM estadisticas
+                 WHERE usuario_id = ?'''
+
+
+class ListaOrdenada:
+    """Lista ordenada en bloques de hasta 2·CARGA elementos.
+
+    bisect.insort sobre la lista entera mueve todos los elementos
+    posteriores (8 MB con un millón de usuarios); aquí insertar o quitar
+    mueve los de un bloque. Un árbol de Fenwick sobre los tamaños de los
+    bloques da cuántos elementos hay antes de un bloque en O(log n), así
+    que la posición de un valor también es logarítmica. Partir o vaciar
+    un bloque (una vez cada CARGA inserciones, como mucho) lo reconstruye.
+    """
+
+    def __init__(self, ordenados=()):
+        ordenados = list(ordenados)
+        self._bloques = [ordenados[i:i + CARGA] for i in range(0, len(ordenados), CARGA)]
+        self._maximos = [bloque[-1] for bloque in self._bloques]
+        self._tamano = len(ordenados)
+        self._construir_arbol()
+
+    def _construir_arbol(self):
+        # Árbol de Fenwick (base 1) sobre len(bloque), construido en O(bloques)
+        arbol = [0] + [len(bloque) for bloque in self._bloques]
+        for i in range(1, len(arbol)):
+            padre = i + (i & -i)
+            if padre < len(arbol):
+                arbol[padre] += arbol[i]
+        self._arbol = arbol
+
+    def _sumar(self, i, delta):
+        i += 1
+        while i < len(self._arbol):
+            self._arbol[i] += delta
+            i += i & -i
+
+    def _anteriores(self, i):
+        """Elementos en los bloques anteriores al bloque `i`"""
+        total = 0
+        while i:
+            total += self._arbol[i]
+            i -= i & -i
+        return total
+
+    def __len__(self):
+        return self._tamano
+
+    def agregar(self, valor):
+        if not self._bloques:
+            self._bloques.append([valor])
+            self._maximos.append(valor)
+            self._construir_arbol()
+        else:
+            # Primer bloque cuyo máximo no es menor que `valor`, o el último
+            i = min(bisect.bisect_left(self._maximos, valor), len(self._bloques) - 1)
+            bloque = self._bloques[i]
+            bisect.insort(bloque, valor)
+            self._maximos[i] = bloque[-1]
+            if len(bloque) > 2 * CARGA:
+                self._bloques[i:i + 1] = [bloque[:CARGA], bloque[CARGA:]]
+                self._maximos[i:i + 1] = [bloque[CARGA - 1], bloque[-1]]
+                self._construir_arbol()
+            else:
+                self._sumar(i, 1)
+        self._tamano += 1
+
+    def quitar(self, valor):
+        """Quitar `valor`, que tiene que estar en la lista"""
+        i = bisect.bisect_left(self._maximos, valor)
+        bloque = self._bloques[i]
+        del bloque[bisect.bisect_left(bloque, valor)]
+        self._tamano -= 1
+        if bloque:
+            self._maximos[i] = bloque[-1]
+            self._sumar(i, -1)
+        else:
+            del self._bloques[i]
+            del self._maximos[i]
+            self._construir_arbol()
+
+    def indice(self, valor):
+        """Cuántos elementos son menores que `valor` (bisect_left sobre la lista entera)"""
+        i = bisect.bisect_left(self._maximos, valor)
+        if i == len(self._bloques):
+            return self._tamano
+        return self._anteriores(i) + bisect.bisect_left(self._bloques[i], valor)
+
+    def primeros(self, cantidad):
+        resultado = []
+        for bloque in self._bloques:
+            if len(resultado) >= cantidad:
+                break
+            resultado.extend(bloque[:cantidad - len(resultado)])
+        return resultado
+
+
+class Clasificacion:
+    """Lista ordenada de usuarios por puntos, refrescada desde `estadisticas`"""
+
+    def __init__(self, pool, intervalo=INTERVALO_REFRESCO, reconstruccion=INTERVALO_RECONSTRUCCION):
+        self.db = pool
+        self.intervalo = intervalo
+        self.reconstruccion = reconstruccion
+        self._claves = ListaOrdenada()   # (-puntos, usuario_id)
+        self._usuarios = {}              # usuario_id -> (puntos, nombre)
+        self._marca = 0.0
+        self._refrescada = 0.0
+        self._reconstruida = 0.0
+        # Usuarios quitados mientras se lee la tabla para reconstruir
+        self._quitados = set()
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._lock_hilo = threading.Lock()
+
+    def _colocar(self, usuario_id, nombre, puntos):
+        """Poner los puntos de un usuario, moviéndolo a su nueva posición"""
+        anterior = self._usuarios.get(usuario_id)
+        if anterior is not None:
+            if anterior[0] == puntos:
+                self._usuarios[usuario_id] = (puntos, nombre)
+                return
+            self._claves.quitar((-anterior[0], usuario_id))
+        self._claves.agregar((-puntos, usuario_id))
+        self._usuarios[usuario_id] = (puntos, nombre)
+
+    def quitar(self, usuario_id):
+        with self._lock:
+            self._quitados.add(usuario_id)
+            anterior = self._usuarios.pop(usuario_id, None)
+            if anterior is not None:
+                self._claves.quitar((-anterior[0], usuario_id))
+
+    def invalidar(self):
+        """Forzar un refresco en la próxima lectura (p. ej. al completar una lección)"""
+        self._refrescada = 0.0
+
+    def refrescar(self, completa=False):
+        """Aplicar los cambios de `estadisticas` desde el último refresco; con `completa`, releer la tabla"""
+        if completa or not self._reconstruida:
+            self.reconstruir()
+            return
+        ahora = time.time()
+        with self._lock:
+            filas = self.db.conexion().execute(SQL_CAMBIOS, (self._marca - MARGEN_REFRESCO,)).fetchall()
+            for usuario_id, nombre, puntos, _ in filas:
+                self._colocar(usuario_id, nombre, puntos)
+            self._marca = max([self._marca] + [fila[3] for fila in filas])
+            self._refrescada = ahora
+        if ahora - self._reconstruida >= self.reconstruccion:
+            self._reconstruir_en_fondo()
+
+    def reconstruir(self):
+        """Releer toda la tabla y sustituir la lista; la nueva se construye sin tener el lock"""
+        inicio = time.time()
+        with self._lock:
+            self._quitados = set()
+        filas = self.db.conexion().execute(SQL_TODOS).fetchall()
+        claves = ListaOrdenada(sorted((-puntos, usuario_id) for usuario_id, _, puntos, _ in filas))
+        usuarios = {usuario_id: (puntos, nombre) for usuario_id, nombre, puntos, _ in filas}
+        with self._lock:
+            self._claves, self._usuarios = claves, usuarios
+            for usuario_id in self._quitados:
+                anterior = usuarios.pop(usuario_id, None)
+                if anterior is not None:
+                    claves.quitar((-anterior[0], usuario_id))
+            # Lo escrito mientras se leía la tabla llega con el siguiente refresco incremental
+            self._marca = inicio
+            self._refrescada = 0.0
+            self._reconstruida = inicio
+
+    def _reconstruir_en_fondo(self):
+        with self._lock_hilo:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._hilo = threading.Thread(target=self._reconstruir_hilo, name='clasificacion', daemon=True)
+            self._hilo.start()
+
+    def _reconstruir_hilo(self):
+        try:
+            self.reconstruir()
+        except Exception:
+            logger.exception("No se pudo reconstruir la clasificación")
+            # Reintentar en el próximo intervalo, no en cada refresco
+            self._reconstruida = time.time()
+
+    def _vigente(self):
+        if time.time() - self._refrescada >= self.intervalo:
+            self.refrescar()
+
+    def primeros(self, cantidad=10):
+        """Los `cantidad` primeros: lista de (posición, nombre, puntos)"""
+        self._vigente()
+        with self._lock:
+            resultado = []
+            for usuario_id in (clave[1] for clave in self._claves.primeros(cantidad)):
+                puntos, nombre = self._usuarios[usuario_id]
+                resultado.append((self._posicion_de(puntos), nombre, puntos))
+            return resultado
+
+    def posicion(self, usuario_id):
+        """Posición del usuario (1 = primero; empatados comparten posición), o None"""
+        self._vigente()
+        with self._lock:
+            actual = self._usuarios.get(usuario_id)
+            return None if actual is None else self._posicion_de(actual[0])
+
+    def _posicion_de(self, puntos):
+        # Usuarios con más puntos: los que van antes de (-puntos,) en la lista
+        return self._claves.indice((-puntos,)) + 1
+
+    def __len__(self):
+        return len(self._claves)
+
+
+def estadisticas_usuario(conn, usuario_id):
+    """Agregados de un usuario como dict (ceros si aún no ha respondido nada)"""
+    fila = conn.execute(SQL_USUARIO, (usuario_id,)).fetchone() or (0, 0, 0, 0)
+    puntos, respuestas, aciertos, lecciones = fila
+    return {
+        "puntos": puntos,
+        "respuestas": respuestas,
+        "aciertos": aciertos,
+        "precision": round(aciertos / respuestas, 3) if respuestas else None,
+        "lecciones_completadas": lecciones,
+    }
@@ -0,0 +1,208 @@
+"""Diccionario maya-español con todo el vocabulario de las lecciones.
+
+El índice se construye una vez por versión del catálogo, en la primera
+búsqueda (cargar el catálogo no lo paga), y no cambia después:
+
+- Cada par (maya, español) es una entrada, con las lecciones en que aparece.
+- Las claves son la forma normalizada de la palabra maya, de la española
+  y de cada palabra suelta de las frases ("utz awach" también es "awach").
+- Búsqueda por prefijo: las claves están ordenadas, así que todas las que
+  empiezan por un prefijo forman un rango contiguo que se encuentra con
+  una búsqueda binaria, O(log n + k). Es un trie aplanado en una lista:
+  las mismas consultas que un trie, sin un dict de Python por nodo.
+- Búsqueda aproximada (borrados simétricos): cada clave se indexa por sí
+  misma y por cada forma que queda al quitarle un carácter. La consulta
+  busca las suyas (unas pocas búsquedas binarias) y solo se mide la
+  distancia de edición a las claves que comparten alguna. Así salen todas
+  las claves a una edición y las que están a dos si quitando un carácter a
+  cada una quedan iguales (dos letras traspuestas, una letra cambiada de
+  sitio), sin recorrer el vocabulario. Las variantes se guardan como
+  huellas de 32 bits con la posición de la clave en un array ordenado de
+  enteros de 64 bits: 8 bytes por variante, sin un objeto por variante.
+
+La normalización quita tildes y diéresis, mayúsculas, signos de puntuación
+y los apóstrofos del saltillo en todas sus variantes (q'ij, q’ij y qij son
+la misma clave).
+"""
+import bisect
+import unicodedata
+from array import array
+
+# Apóstrofos con los que se escribe el saltillo (oclusiva glotal) y signos que se ignoran
+APOSTROFOS = "'’‘ʼʻ`´"
+SIGNOS = '¿?¡!.,;:"«»()'
+_TRADUCCION = str.maketrans({**{c: None for c in APOSTROFOS + SIGNOS}, '/': ' ', '-': ' '})
+
+RESULTADOS_POR_DEFECTO = 20
+MAX_RESULTADOS = 100
+
+# Ediciones admitidas en la búsqueda aproximada; con consultas cortas, solo una
+DISTANCIA_MAXIMA = 2
+LONGITUD_UNA_EDICION = 4
+
+_MASCARA = (1 << 32) - 1
+
+
+def normalizar(texto):
+    """Forma de búsqueda: sin tildes, apóstrofos ni signos, en minúsculas y con espacios simples"""
+    # Un texto ASCII no tiene tildes que quitar (NFKD lo dejaría igual)
+    if not texto.isascii():
+        texto = unicodedata.normalize('NFKD', texto)
+        texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.casefold().translate(_TRADUCCION).split())
+
+
+def variantes(clave):
+    """La clave y las formas que quedan al quitarle un carácter"""
+    return {clave, *(clave[:i] + clave[i + 1:] for i in range(len(clave)))}
+
+
+def distancia(a, b, tope=None):
+    """Distancia de Levenshtein; con `tope`, cualquier valor mayor se devuelve como tope + 1"""
+    if len(a) < len(b):
+        a, b = b, a
+    if tope is not None and len(a) - len(b) > tope:
+        return tope + 1
+    # El principio y el final comunes no cambian la distancia
+    inicio = 0
+    while inicio < len(b) and a[inicio] == b[inicio]:
+        inicio += 1
+    fin = 0
+    while fin < len(b) - inicio and a[-1 - fin] == b[-1 - fin]:
+        fin += 1
+    a, b = a[inicio:len(a) - fin], b[inicio:len(b) - fin]
+    if not b:
+        return len(a) if tope is None else min(len(a), tope + 1)
+    anterior = list(range(len(b) + 1))
+    for i, letra in enumerate(a, 1):
+        actual = [i]
+        for j, otra in enumerate(b, 1):
+            actual.append(min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (letra != otra)))
+        # Ninguna celda de la fila baja del tope: el resultado tampoco lo hará
+        if tope is not None and min(actual) > tope:
+            return tope + 1
+        anterior = actual
+    return anterior[-1] if tope is None else min(anterior[-1], tope + 1)
+
+
+class Diccionario:
+    """Índice de prefijos y de borrados sobre el vocabulario de un catálogo"""
+
+    def __init__(self, catalogo):
+        lecciones_por_par = {}
+        for leccion_id, leccion in catalogo.por_id.items():
+            for palabra in leccion['contenido']:
+                lecciones = lecciones_por_par.setdefault((palabra['maya'], palabra['espanol']), [])
+                if not lecciones or lecciones[-1] != leccion_id:
+                    lecciones.append(leccion_id)
+        self.pares = list(lecciones_por_par)
+        self.lecciones = [sorted(lecciones) for lecciones in lecciones_por_par.values()]
+
+        # Claves (forma normalizada, es palabra suelta, entrada); con la misma
+        # clave la forma completa va antes que la palabra suelta de una frase
+        formas = set()
+        for entrada, (maya, espanol) in enumerate(self.pares):
+            for texto in (maya, espanol):
+                clave = normalizar(texto)
+                if clave:
+                    formas.add((clave, False, entrada))
+                    # La primera palabra ya es prefijo de la frase entera
+                    for palabra in clave.split(' ')[1:]:
+                        formas.add((palabra, True, entrada))
+        formas = sorted(formas)
+        self.claves = [clave for clave, _, _ in formas]
+        self.entradas = array('I', (entrada for _, _, entrada in formas))
+
+        # (huella de la variante << 32) | posición de la primera clave con ese texto, ordenado
+        huellas = []
+        anterior = None
+        for posicion, clave in enumerate(self.claves):
+            if clave != anterior:
+                anterior = clave
+                # Como variantes(clave), sin quitar repetidas: solo repiten candidatas
+                huellas.append((hash(clave) & _MASCARA) << 32 | posicion)
+                huellas.extend([(hash(clave[:i] + clave[i + 1:]) & _MASCARA) << 32 | posicion
+                                for i in range(len(clave))])
+        huellas.sort()
+        self._borrados = array('Q', huellas)
+
+    def __len__(self):
+        return len(self.pares)
+
+    def _resultado(self, entrada, coincidencia):
+        maya, espanol = self.pares[entrada]
+        return {"maya": maya, "espanol": espanol, "lecciones": self.lecciones[entrada],
+                "coincidencia": coincidencia}
+
+    def por_prefijo(self, consulta, limite=RESULTADOS_POR_DEFECTO):
+        """Entradas con alguna clave que empieza por la consulta, en orden alfabético de clave.
+
+        La propia consulta es la primera clave del rango: la coincidencia exacta sale primero.
+        """
+        prefijo = normalizar(consulta)
+        if not prefijo:
+            return []
+        orden = []
+        vistas = set()
+        posicion = bisect.bisect_left(self.claves, prefijo)
+        while (posicion < len(self.claves) and len(orden) < limite
+               and self.claves[posicion].startswith(prefijo)):
+            entrada = self.entradas[posicion]
+            if entrada not in vistas:
+                vistas.add(entrada)
+                orden.append(entrada)
+            posicion += 1
+        return orden
+
+    def aproximadas(self, consulta, limite=RESULTADOS_POR_DEFECTO):
+        """Entradas con una clave a pocas ediciones de la consulta, de la más cercana a la más lejana"""
+        clave = normalizar(consulta)
+        if not clave:
+            return []
+        radio = 1 if len(clave) <= LONGITUD_UNA_EDICION else DISTANCIA_MAXIMA
+
+        # Candidatas: claves con alguna variante (ella misma o sin un carácter) en común con la consulta
+        candidatas = set()
+        borrados = self._borrados
+        for variante in variantes(clave):
+            inicio = (hash(variante) & _MASCARA) << 32
+            desde = bisect.bisect_left(borrados, inicio)
+            hasta = bisect.bisect_right(borrados, inicio | _MASCARA, desde)
+            candidatas.update(valor & _MASCARA for valor in borrados[desde:hasta])
+
+        puntuadas = []
+        for posicion in candidatas:
+            texto = self.claves[posicion]
+            # La huella es de 32 bits: una colisión solo añade una candidata que aquí se descarta
+            d = distancia(clave, texto, radio)
+            if d <= radio:
+                # `posicion` es la primera de las claves iguales; las demás van detrás. En
+                # el orden de las claves la forma completa va antes que la palabra suelta
+                while posicion < len(self.claves) and self.claves[posicion] == texto:
+                    puntuadas.append((d, posicion))
+                    posicion += 1
+        puntuadas.sort()
+
+        orden = []
+        vistas = set()
+        for _, posicion in puntuadas:
+            entrada = self.entradas[posicion]
+            if entrada not in vistas:
+                vistas.add(entrada)
+                orden.append(entrada)
+                if len(orden) == limite:
+                    break
+        return orden
+
+    def buscar(self, consulta, limite=RESULTADOS_POR_DEFECTO):
+        """Resultados por prefijo y, si faltan, aproximados, como dicts listos para JSON"""
+        prefijo = self.por_prefijo(consulta, limite)
+        resultados = [self._resultado(entrada, 'prefijo') for entrada in prefijo]
+        if len(resultados) < limite and len(normalizar(consulta)) >= 3:
+            vistas = set(prefijo)
+            for entrada in self.aproximadas(consulta, limite):
+                if entrada not in vistas:
+                    resultados.append(self._resultado(entrada, 'aproximada'))
+                    if len(resultados) == limite:
+                        break
+        return resultados
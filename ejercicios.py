@@ -0,0 +1,29 @@
+import random
+
+# Opciones mostradas por ejercicio: la correcta y tres distractores
+NUM_OPCIONES = 4
+
+
+def respuestas_distintas(palabras_maya):
+    """Respuestas sin duplicados, conservando el orden de la lección"""
+    return tuple(dict.fromkeys(palabras_maya))
+
+
+def elegir_distractores(distintas, correcta, cantidad=NUM_OPCIONES - 1, rng=random):
+    """Elegir `cantidad` respuestas incorrectas sin reemplazo.
+
+    `distintas` es el conjunto precalculado de respuestas distintas de la
+    lección. Se toma una muestra de `cantidad + 1` (por si incluye la
+    correcta), así que el coste no depende del tamaño de la lección ni de
+    cuántas palabras repetidas tenga. Si la lección no tiene suficientes
+    respuestas distintas se devuelven las que haya.
+    """
+    muestra = rng.sample(distintas, min(cantidad + 1, len(distintas)))
+    return [opcion for opcion in muestra if opcion != correcta][:cantidad]
+
+
+def generar_opciones(distintas, correcta, rng=random):
+    """Devolver la respuesta correcta y sus distractores, mezclados"""
+    opciones = [correcta] + elegir_distractores(distintas, correcta, rng=rng)
+    rng.shuffle(opciones)
+    return opciones
@@ -0,0 +1,154 @@
+"""Ejercicios de respuesta escrita: el alumno escribe la palabra en K'iche'.
+
+Las respuestas de cada lección se normalizan una sola vez (por versión del
+catálogo) y se guardan en un árbol BK sobre la distancia de edición:
+
+- la respuesta escrita se normaliza igual (NFC, minúsculas, espacios
+  simples, sin signos de puntuación y con un solo tipo de apóstrofo para
+  el saltillo: q'ij, q’ij y qʼij se escriben igual) y se compara con la
+  forma de la palabra preguntada;
+- si no es igual pero está a pocas ediciones (TOLERANCIAS) se acepta como
+  "casi", salvo que sea otra palabra de la lección o esté más cerca de otra;
+- las palabras de la lección a distancia <= r de la respuesta se buscan en
+  el árbol, que descarta ramas enteras por la desigualdad triangular: con
+  r pequeño se calculan unas pocas distancias, no una por palabra.
+
+A diferencia del diccionario, aquí el apóstrofo cuenta: q y q' son
+consonantes distintas, y olvidarlo es una edición (una respuesta "casi").
+"""
+import unicodedata
+from collections import namedtuple
+
+from diccionario import APOSTROFOS, SIGNOS, distancia
+
+MODO_OPCIONES = 'opciones'
+MODO_ESCRIBIR = 'escribir'
+MODOS = (MODO_OPCIONES, MODO_ESCRIBIR)
+
+# Resultados de corregir una respuesta escrita
+EXACTA = 'exacta'
+CASI = 'casi'
+OTRA_PALABRA = 'otra_palabra'
+INCORRECTA = 'incorrecta'
+
+# (longitud máxima de la palabra, ediciones permitidas); las más largas admiten 2
+TOLERANCIAS = ((3, 0), (7, 1))
+TOLERANCIA_MAXIMA = 2
+
+_TRADUCCION = str.maketrans({**{c: "'" for c in APOSTROFOS}, **{c: None for c in SIGNOS}})
+
+Correccion = namedtuple('Correccion', 'acierto tipo parecida')
+Correccion.__doc__ = """Resultado de una respuesta escrita: `parecida` es el índice de otra palabra de la lección o None"""
+
+
+def normalizar_respuesta(texto):
+    """Forma con la que se comparan las respuestas escritas"""
+    texto = unicodedata.normalize('NFC', texto).casefold().translate(_TRADUCCION)
+    return ' '.join(texto.split())
+
+
+def tolerancia(longitud):
+    """Ediciones que se aceptan como errata en una palabra de `longitud` caracteres"""
+    for maxima, ediciones in TOLERANCIAS:
+        if longitud <= maxima:
+            return ediciones
+    return TOLERANCIA_MAXIMA
+
+
+class ArbolBK:
+    """Árbol BK: cada hijo cuelga de su nodo con la distancia exacta entre los dos.
+
+    Para buscar a distancia <= r de una palabra que está a d de un nodo,
+    solo pueden servir los hijos con clave entre d - r y d + r.
+    """
+
+    def __init__(self, palabras=()):
+        self.raiz = None
+        self.tamano = 0
+        for palabra in palabras:
+            self.agregar(palabra)
+
+    def __len__(self):
+        return self.tamano
+
+    def agregar(self, palabra):
+        if self.raiz is None:
+            self.raiz = (palabra, {})
+            self.tamano = 1
+            return
+        nodo = self.raiz
+        while True:
+            d = distancia(palabra, nodo[0])
+            if d == 0:
+                return
+            hijo = nodo[1].get(d)
+            if hijo is None:
+                nodo[1][d] = (palabra, {})
+                self.tamano += 1
+                return
+            nodo = hijo
+
+    def buscar(self, palabra, radio):
+        """Palabras a distancia <= radio, de la más cercana a la más lejana: [(distancia, palabra)]"""
+        encontradas = []
+        pendientes = [self.raiz] if self.raiz is not None else []
+        while pendientes:
+            texto, hijos = pendientes.pop()
+            d = distancia(palabra, texto)
+            if d <= radio:
+                encontradas.append((d, texto))
+            for clave, hijo in hijos.items():
+                if d - radio <= clave <= d + radio:
+                    pendientes.append(hijo)
+        encontradas.sort()
+        return encontradas
+
+
+class RespuestasEscritas:
+    """Formas normalizadas de las respuestas de una lección y su árbol BK"""
+
+    def __init__(self, palabras_maya):
+        self.formas = tuple(normalizar_respuesta(palabra) for palabra in palabras_maya)
+        # Forma -> índice de la primera palabra con esa forma
+        self.indices = {}
+        for indice, forma in enumerate(self.formas):
+            self.indices.setdefault(forma, indice)
+        self.arbol = ArbolBK(self.indices)
+
+    def corregir(self, respuesta, indice):
+        """Corregir la respuesta escrita a la palabra `indice` de la lección"""
+        esperada = self.formas[indice]
+        escrita = normalizar_respuesta(respuesta)
+        if escrita == esperada:
+            return Correccion(True, EXACTA, None)
+        if not escrita:
+            return Correccion(False, INCORRECTA, None)
+
+        radio = tolerancia(len(esperada))
+        d = distancia(escrita, esperada, radio)
+        if d <= radio:
+            # Una errata, salvo que otra palabra de la lección esté todavía más cerca
+            cercanas = self.arbol.buscar(escrita, d - 1)
+        else:
+            # ¿Escribió (casi) otra palabra de la lección?
+            cercanas = self.arbol.buscar(escrita, tolerancia(len(escrita)))
+        # La propia palabra preguntada no es "otra palabra" (p. ej. "juun" para "Jun")
+        cercanas = [forma for _, forma in cercanas if forma != esperada]
+        if cercanas:
+            return Correccion(False, OTRA_PALABRA, self.indices[cercanas[0]])
+        if d <= radio:
+            return Correccion(True, CASI, None)
+        return Correccion(False, INCORRECTA, None)
+
+
+def explicar(correccion, contenido, indice):
+    """Frase para el alumno sobre una respuesta escrita, o None si fue exacta"""
+    correcta = contenido[indice]["maya"]
+    if correccion.tipo == CASI:
+        return f"Casi: se escribe «{correcta}»."
+    if correccion.tipo == OTRA_PALABRA:
+        otra = contenido[correccion.parecida]
+        return f"«{otra['maya']}» es «{otra['espanol']}»; se escribía «{correcta}»."
+    if correccion.tipo == INCORRECTA:
+        return f"Se escribía «{correcta}»."
+    return None
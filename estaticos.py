@@ -0,0 +1,118 @@
+"""Recursos estáticos (CSS/JS) minificados, con huella de contenido y precomprimidos.
+
+Al arrancar se leen los archivos de static/css y static/js, se minifican,
+se les pone en el nombre un hash de su contenido y se comprimen con gzip
+(y brotli si el módulo está instalado). Todo queda en memoria: son pocos
+KB y así no hay workers compitiendo por escribir archivos. Como el nombre
+cambia con el contenido, se sirven con caché inmutable de un año.
+"""
+import gzip
+import hashlib
+import os
+import re
+
+from flask import request, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él se sirve gzip
+    brotli = None
+
+DIRECTORIO_ESTATICOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+TIPOS = {
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'text/javascript; charset=utf-8',
+}
+
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def minificar_css(texto):
+    """Quitar comentarios y espacios sobrantes sin tocar el significado del CSS"""
+    texto = re.sub(r'/\*.*?\*/', '', texto, flags=re.S)
+    texto = re.sub(r'\s+', ' ', texto)
+    # No se quitan espacios antes de ':' para no unir "a :hover" en "a:hover"
+    texto = re.sub(r'\s*([{};,>])\s*', r'\1', texto)
+    texto = re.sub(r':\s+', ':', texto)
+    return texto.replace(';}', '}').strip()
+
+
+def minificar_js(texto):
+    """Quitar sangría, líneas vacías y comentarios de línea completa.
+
+    Se conservan los saltos de línea para no depender de la inserción
+    automática de punto y coma.
+    """
+    lineas = (linea.strip() for linea in texto.splitlines())
+    return '\n'.join(linea for linea in lineas if linea and not linea.startswith('//'))
+
+
+MINIFICADORES = {
+    '.css': minificar_css,
+    '.js': minificar_js,
+}
+
+
+class Recurso:
+    __slots__ = ('datos', 'gzip', 'brotli', 'tipo', 'etag')
+
+    def __init__(self, datos, tipo, etag):
+        self.datos = datos
+        self.tipo = tipo
+        self.etag = etag
+        self.gzip = gzip.compress(datos, compresslevel=9, mtime=0)
+        self.brotli = brotli.compress(datos) if brotli else None
+
+
+class Recursos:
+    """Manifiesto ruta original -> nombre con huella, y el contenido servido"""
+
+    def __init__(self, directorio=DIRECTORIO_ESTATICOS):
+        self.manifiesto = {}
+        self.recursos = {}
+        for subdirectorio in sorted(os.listdir(directorio)) if os.path.isdir(directorio) else []:
+            ruta_sub = os.path.join(directorio, subdirectorio)
+            if not os.path.isdir(ruta_sub):
+                continue
+            for archivo in sorted(os.listdir(ruta_sub)):
+                base, extension = os.path.splitext(archivo)
+                if extension not in MINIFICADORES:
+                    continue
+                with open(os.path.join(ruta_sub, archivo), encoding='utf-8') as f:
+                    datos = MINIFICADORES[extension](f.read()).encode('utf-8')
+                huella = hashlib.sha256(datos).hexdigest()[:12]
+                nombre = f"{subdirectorio}/{base}.{huella}{extension}"
+                self.manifiesto[f"{subdirectorio}/{archivo}"] = nombre
+                self.recursos[nombre] = Recurso(datos, TIPOS[extension], huella)
+
+    def url(self, ruta):
+        """URL con huella para usar en las plantillas: {{ recurso('css/index.css') }}"""
+        return url_for('recurso', nombre=self.manifiesto[ruta])
+
+    def responder(self, app, nombre, peticion=None):
+        """Respuesta con el recurso, comprimido según Accept-Encoding; None si no existe.
+
+        `peticion` es la petición de Flask por defecto; el modo ASGI pasa la suya.
+        """
+        recurso = self.recursos.get(nombre)
+        if recurso is None:
+            return None
+        if peticion is None:
+            peticion = request
+
+        codificaciones = peticion.accept_encodings
+        if recurso.brotli is not None and codificaciones['br']:
+            cuerpo, codificacion = recurso.brotli, 'br'
+        elif codificaciones['gzip']:
+            cuerpo, codificacion = recurso.gzip, 'gzip'
+        else:
+            cuerpo, codificacion = recurso.datos, None
+
+        respuesta = app.response_class(cuerpo, content_type=recurso.tipo)
+        if codificacion:
+            respuesta.headers['Content-Encoding'] = codificacion
+        respuesta.headers['Vary'] = 'Accept-Encoding'
+        respuesta.headers['Cache-Control'] = CACHE_INMUTABLE
+        respuesta.set_etag(f"{recurso.etag}-{codificacion or 'id'}")
+        return respuesta.make_conditional(peticion)
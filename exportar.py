@@ -0,0 +1,219 @@
+"""Exportar el progreso de los alumnos en CSV o NDJSON, sin cargarlo en memoria.
+
+Cada fila es un usuario con una lección de `progreso` (usuarios JOIN
+progreso), con filtros opcionales por lección y por fecha de completado.
+Se usa desde la web (/api/exportar) y desde la línea de órdenes:
+
+    python exportar.py --formato ndjson --desde 2024-01-01 --leccion 3 > progreso.ndjson
+
+- La exportación abre su propia conexión de solo lectura y lee el cursor
+  con fetchmany(FILAS_POR_LOTE): en memoria hay un lote de filas y un
+  trozo de texto, tanto con mil filas como con millones.
+- Las filas salen en el orden de la clave primaria de progreso (usuario,
+  lección), que es el orden en que está guardada la tabla (WITHOUT ROWID):
+  SQLite no ordena nada antes de dar la primera fila.
+- El texto se entrega en trozos de unos TAMANO_TROZO bytes desde un
+  generador; Flask lo envía como respuesta en streaming y el modo ASGI lo
+  reenvía trozo a trozo. La cabecera CSV sale sola y enseguida, y el
+  primer trozo de filas se corta en PRIMER_TROZO bytes: la descarga
+  empieza sin esperar a juntar 64 KB.
+- En WAL la lectura ve una foto fija de la base durante toda la
+  exportación y no bloquea a la aplicación, que sigue escribiendo.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from datetime import date
+
+from basedatos import RUTA_DB, abrir_conexion
+from catalogo import cargar_lecciones
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+COLUMNAS = ('usuario_id', 'nombre', 'puntos', 'leccion_id', 'leccion', 'completada', 'fecha_completado')
+
+FILAS_POR_LOTE = 1000
+TAMANO_TROZO = 64 * 1024
+PRIMER_TROZO = 4 * 1024
+
+SQL_EXPORTAR = '''SELECT p.usuario_id, u.nombre, u.puntos, p.leccion_id, p.completada, p.fecha_completado
+                  FROM progreso p JOIN usuarios u ON u.id = p.usuario_id'''
+
+
+class FiltroInvalido(ValueError):
+    """Fecha, lección o formato de exportación no válidos"""
+
+
+def filtros(desde=None, hasta=None, leccion=None):
+    """Validar los filtros (texto de la URL o de la línea de órdenes) y normalizarlos"""
+    fechas = []
+    for nombre, valor in (('desde', desde), ('hasta', hasta)):
+        if valor:
+            try:
+                valor = date.fromisoformat(valor).isoformat()
+            except ValueError:
+                raise FiltroInvalido(f"'{nombre}' debe ser una fecha AAAA-MM-DD")
+        fechas.append(valor or None)
+    if leccion not in (None, ''):
+        try:
+            leccion = int(leccion)
+        except ValueError:
+            raise FiltroInvalido("'leccion' debe ser un número")
+    else:
+        leccion = None
+    return {'desde': fechas[0], 'hasta': fechas[1], 'leccion': leccion}
+
+
+def consulta(desde=None, hasta=None, leccion=None):
+    """SQL y parámetros de la exportación con los filtros indicados"""
+    condiciones = []
+    parametros = []
+    if leccion is not None:
+        condiciones.append("p.leccion_id = ?")
+        parametros.append(leccion)
+    # fecha_completado se guarda como AAAA-MM-DD: se compara como texto
+    if desde:
+        condiciones.append("p.fecha_completado >= ?")
+        parametros.append(desde)
+    if hasta:
+        condiciones.append("p.fecha_completado <= ?")
+        parametros.append(hasta)
+    sql = SQL_EXPORTAR
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    return sql + " ORDER BY p.usuario_id, p.leccion_id", parametros
+
+
+def filas(conn, lote=FILAS_POR_LOTE, **filtros):
+    """Filas de la exportación, leídas del cursor de `lote` en `lote`"""
+    cursor = conn.execute(*consulta(**filtros))
+    try:
+        while True:
+            bloque = cursor.fetchmany(lote)
+            if not bloque:
+                return
+            yield from bloque
+    finally:
+        cursor.close()
+
+
+def _csv(filas, titulos):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUMNAS)
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+    tope = PRIMER_TROZO
+    for usuario_id, nombre, puntos, leccion_id, completada, fecha in filas:
+        escritor.writerow((usuario_id, nombre, puntos, leccion_id, titulos.get(leccion_id, ''),
+                           int(bool(completada)), fecha or ''))
+        if buffer.tell() >= tope:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            tope = TAMANO_TROZO
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _ndjson(filas, titulos):
+    codificar = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    partes = []
+    tamano = 0
+    tope = PRIMER_TROZO
+    for usuario_id, nombre, puntos, leccion_id, completada, fecha in filas:
+        linea = codificar(dict(zip(COLUMNAS, (usuario_id, nombre, puntos, leccion_id, titulos.get(leccion_id),
+                                              bool(completada), fecha)))) + '\n'
+        partes.append(linea)
+        tamano += len(linea)
+        if tamano >= tope:
+            yield ''.join(partes).encode('utf-8')
+            partes = []
+            tamano = 0
+            tope = TAMANO_TROZO
+    if partes:
+        yield ''.join(partes).encode('utf-8')
+
+
+def exportar(ruta=None, formato='csv', titulos=None, **filtros):
+    """Generador con la exportación en trozos de bytes.
+
+    La conexión se abre al pedir el primer trozo y se cierra al terminar o
+    al cerrar el generador (p. ej. si el cliente corta la descarga).
+    """
+    if formato not in FORMATOS:
+        raise FiltroInvalido(f"Formato desconocido: {formato}")
+    escribir = _csv if formato == 'csv' else _ndjson
+    titulos = titulos or {}
+
+    def generar():
+        # El modo ASGI pide cada trozo desde un hilo cualquiera de su pool
+        conn = abrir_conexion(ruta, check_same_thread=False)
+        try:
+            conn.execute("PRAGMA query_only=ON")
+            # Una sola transacción de lectura: todas las filas de la misma foto
+            conn.execute("BEGIN")
+            yield from escribir(filas(conn, **filtros), titulos)
+        finally:
+            conn.close()
+
+    return generar()
+
+
+def nombre_archivo(formato, desde=None, hasta=None, leccion=None):
+    """Nombre sugerido para la descarga, con los filtros aplicados"""
+    partes = ['progreso']
+    if leccion is not None:
+        partes.append(f"leccion{leccion}")
+    if desde or hasta:
+        partes.append(f"{desde or 'inicio'}_{hasta or 'hoy'}")
+    return '_'.join(partes) + '.' + formato
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--db', default=RUTA_DB, help="base de datos (por defecto MAYA_KICHE_DB o maya_kiche.db)")
+    parser.add_argument('--formato', choices=tuple(FORMATOS), default='csv')
+    parser.add_argument('--desde', help="lecciones completadas desde esta fecha (AAAA-MM-DD)")
+    parser.add_argument('--hasta', help="lecciones completadas hasta esta fecha, incluida")
+    parser.add_argument('--leccion', help="solo esta lección")
+    parser.add_argument('--lecciones', default='lecciones_maya_kiche.json',
+                        help="catálogo para añadir el título de cada lección")
+    parser.add_argument('--salida', help="archivo de salida (por defecto, la salida estándar)")
+    args = parser.parse_args(argv)
+    # sqlite3 crearía una base vacía y la exportación saldría vacía sin avisar
+    if not os.path.exists(args.db):
+        parser.error(f"no existe la base de datos {args.db}")
+    try:
+        elegidos = filtros(args.desde, args.hasta, args.leccion)
+    except FiltroInvalido as e:
+        parser.error(str(e))
+
+    titulos = {}
+    if os.path.exists(args.lecciones):
+        titulos = {leccion['id']: leccion['titulo']
+                   for nivel in cargar_lecciones(args.lecciones).values() for leccion in nivel}
+
+    salida = open(args.salida, 'wb') if args.salida else sys.stdout.buffer
+    try:
+        for trozo in exportar(args.db, args.formato, titulos, **elegidos):
+            salida.write(trozo)
+    except BrokenPipeError:
+        # `| head`: el lector se fue; que Python no falle al vaciar stdout al salir
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        if args.salida:
+            salida.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
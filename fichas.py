@@ -0,0 +1,138 @@
+"""Fichas de ejercicio: la respuesta correcta no sale del servidor.
+
+Cada ejercicio lleva una ficha `cifrado.emitida.nonce.mac`. El índice de
+la palabra va cifrado: se le aplica XOR con 32 bits de HMAC(clave, nonce),
+y el nonce es aleatorio y distinto en cada ficha, así que el cliente no
+puede sacar el índice (y con el catálogo público, la respuesta) de la
+ficha. El MAC (HMAC-SHA256 truncado) cubre además el usuario, la lección
+y la versión del catálogo, que no viajan en la ficha. Al responder, el
+servidor comprueba el MAC, la caducidad y que la ficha no se haya usado
+antes, descifra el índice y busca la respuesta correcta en el catálogo:
+todo O(1) y sin guardar nada por ficha.
+
+La protección contra repeticiones es por proceso: con varios workers una
+ficha podría aceptarse, como mucho, una vez en cada uno.
+"""
+import base64
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Segundos que se puede tardar en contestar un ejercicio
+VIGENCIA_FICHA = 1800
+
+# Respuestas por segundo sostenidas por usuario y ráfaga permitida
+RESPUESTAS_POR_SEGUNDO = 2.0
+RAFAGA_RESPUESTAS = 20
+
+
+class FichaInvalida(ValueError):
+    """Ficha mal formada, con MAC incorrecto, caducada o ya usada"""
+
+
+class RegistroUsos:
+    """Claves usadas durante los últimos `vigencia` segundos.
+
+    Dos generaciones de conjuntos que rotan cada `vigencia` segundos: una
+    clave se recuerda al menos ese tiempo y la memoria no crece más allá de
+    lo usado en dos periodos.
+    """
+
+    def __init__(self, vigencia):
+        self.vigencia = vigencia
+        self._actual = set()
+        self._anterior = set()
+        self._rotacion = time.time() + vigencia
+        self._lock = threading.Lock()
+
+    def primera_vez(self, clave, ahora=None):
+        """Marcar `clave` como usada; False si ya lo estaba"""
+        ahora = time.time() if ahora is None else ahora
+        with self._lock:
+            if ahora >= self._rotacion:
+                self._anterior, self._actual = self._actual, set()
+                self._rotacion = ahora + self.vigencia
+            if clave in self._actual or clave in self._anterior:
+                return False
+            self._actual.add(clave)
+            return True
+
+
+class LimiteRespuestas:
+    """Cubeta de fichas por usuario para limitar respuestas por segundo.
+
+    Guarda como mucho `capacidad` usuarios (los menos recientes se olvidan
+    y vuelven con la cubeta llena).
+    """
+
+    def __init__(self, por_segundo=RESPUESTAS_POR_SEGUNDO, rafaga=RAFAGA_RESPUESTAS, capacidad=100000):
+        self.por_segundo = por_segundo
+        self.rafaga = rafaga
+        self.capacidad = capacidad
+        self._cubetas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def permitir(self, usuario_id, cantidad=1, ahora=None):
+        """Consumir `cantidad` respuestas del usuario; False si supera el límite"""
+        ahora = time.monotonic() if ahora is None else ahora
+        with self._lock:
+            disponibles, ultima = self._cubetas.pop(usuario_id, (self.rafaga, ahora))
+            disponibles = min(self.rafaga, disponibles + (ahora - ultima) * self.por_segundo)
+            permitido = disponibles >= cantidad
+            if permitido:
+                disponibles -= cantidad
+            self._cubetas[usuario_id] = (disponibles, ahora)
+            if len(self._cubetas) > self.capacidad:
+                self._cubetas.popitem(last=False)
+            return permitido
+
+
+class FichasEjercicio:
+    """Emitir y verificar fichas de ejercicio"""
+
+    def __init__(self, secreto, vigencia=VIGENCIA_FICHA):
+        if isinstance(secreto, str):
+            secreto = secreto.encode('utf-8')
+        # Claves propias para el MAC y el cifrado del índice, derivadas de la clave de la
+        # aplicación; las fichas con el índice en claro (anteriores al cifrado) ya no valen
+        self._clave = hmac.digest(secreto, b'fichas-ejercicio-2', 'sha256')
+        self._clave_indice = hmac.digest(secreto, b'fichas-indice', 'sha256')
+        self.vigencia = vigencia
+        self.usos = RegistroUsos(vigencia)
+
+    def _mac(self, usuario_id, leccion_id, version, cuerpo):
+        mensaje = f"{usuario_id}.{leccion_id}.{version}.{cuerpo}".encode('utf-8')
+        return base64.urlsafe_b64encode(hmac.digest(self._clave, mensaje, 'sha256')[:16]).rstrip(b'=').decode()
+
+    def _mascara(self, nonce):
+        return int.from_bytes(hmac.digest(self._clave_indice, nonce.encode('ascii'), 'sha256')[:4], 'big')
+
+    def emitir(self, usuario_id, leccion_id, version, indice, ahora=None):
+        """Ficha para preguntar la palabra `indice` de la lección"""
+        emitida = int(time.time() if ahora is None else ahora)
+        nonce = os.urandom(8).hex()
+        # Siempre 8 cifras: la longitud tampoco dice nada del índice
+        cuerpo = f"{indice ^ self._mascara(nonce):08x}.{emitida:x}.{nonce}"
+        return f"{cuerpo}.{self._mac(usuario_id, leccion_id, version, cuerpo)}"
+
+    def verificar(self, ficha, usuario_id, leccion_id, version, ahora=None):
+        """Devolver el índice de la palabra preguntada o lanzar FichaInvalida.
+
+        Una ficha válida queda usada: no se puede contestar dos veces.
+        """
+        ahora = time.time() if ahora is None else ahora
+        cuerpo, _, mac = ficha.rpartition('.')
+        partes = cuerpo.split('.')
+        if len(partes) != 3:
+            raise FichaInvalida("Ejercicio no válido")
+        esperado = self._mac(usuario_id, leccion_id, version, cuerpo)
+        if not hmac.compare_digest(mac.encode('utf-8'), esperado.encode('ascii')):
+            raise FichaInvalida("Ejercicio no válido")
+        cifrado, emitida, nonce = partes
+        if ahora - int(emitida, 16) > self.vigencia:
+            raise FichaInvalida("El ejercicio ha caducado")
+        if not self.usos.primera_vez(nonce, ahora):
+            raise FichaInvalida("Este ejercicio ya se contestó")
+        return int(cifrado, 16) ^ self._mascara(nonce)
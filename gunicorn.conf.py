@@ -0,0 +1,15 @@
+# Configuración de gunicorn (se carga automáticamente desde el directorio de trabajo)
+import os
+
+# Modo ASGI: MODO_ASGI=1 gunicorn asgi:aplicacion
+if os.environ.get('MODO_ASGI'):
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    # Las conexiones keep-alive inactivas no ocupan el worker: se pueden
+    # mantener abiertas más tiempo que con workers síncronos
+    keepalive = 75
+
+
+def worker_exit(server, worker):
+    """Escribir el progreso pendiente antes de que el worker termine"""
+    from app import app_maya
+    app_maya.progreso.cerrar()
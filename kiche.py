@@ -1,10 +1,138 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import json
-import random
 from datetime import datetime
 import sqlite3
 
+from basedatos import RUTA_DB, HiloBaseDatos, PoolConexiones
+from catalogo import CatalogoLecciones, cargar_lecciones
+from ejercicios import generar_opciones
+from escritura import MODO_ESCRIBIR, MODO_OPCIONES, explicar
+from migraciones import migrar
+from progreso import ColaEscritura
+from repaso import PlanRepaso, cargar_plan
+from usuarios import buscar_usuarios
+
+# Cada cuántos milisegundos la interfaz recoge los resultados del hilo de la base
+INTERVALO_ENTREGA_MS = 20
+
+
+def crear_usuario(conn, nombre):
+    """Insertar un usuario y devolver su id, o None si el nombre ya existe"""
+    try:
+        return conn.execute("INSERT INTO usuarios (nombre, puntos, leccion_actual) VALUES (?, ?, ?)",
+                            (nombre, 0, 1)).lastrowid
+    except sqlite3.IntegrityError:
+        return None
+
+
+def id_usuario(conn, nombre):
+    """Id del usuario con ese nombre, o None"""
+    fila = conn.execute("SELECT id FROM usuarios WHERE nombre = ?", (nombre,)).fetchone()
+    return fila[0] if fila else None
+
+
+class FilaLeccion:
+    __slots__ = ('frame', 'titulo', 'detalle', 'ventana', 'indice')
+
+    def __init__(self):
+        self.indice = None
+
+
+class ListaLecciones(tk.Frame):
+    """Lista de lecciones con scroll que solo crea las filas visibles.
+
+    Las filas son un grupo fijo de widgets que se recolocan en el canvas y
+    se rellenan con otra lección al desplazarse: con mil lecciones hay los
+    mismos widgets que con diez. La lección i se dibuja siempre en la fila
+    i % n, así que al bajar una posición solo cambia el texto de una fila.
+    """
+
+    ALTO_FILA = 90
+
+    def __init__(self, parent, al_elegir):
+        super().__init__(parent)
+        self.al_elegir = al_elegir
+        self.lecciones = []
+        self.filas = []
+        self.desplazamiento = 0
+
+        self.canvas = tk.Canvas(self, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.desplazar)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.bind("<Configure>", lambda e: self.actualizar())
+        self._rueda(self.canvas)
+
+    def mostrar(self, lecciones):
+        self.lecciones = lecciones
+        self.desplazamiento = 0
+        for fila in self.filas:
+            fila.indice = None
+        self.actualizar()
+
+    def desplazar(self, accion, cantidad, unidad=None):
+        """Comando de la scrollbar: ('moveto', fracción) o ('scroll', n, 'units'|'pages')"""
+        if accion == 'moveto':
+            self.desplazamiento = int(float(cantidad) * len(self.lecciones) * self.ALTO_FILA)
+        else:
+            paso = self.ALTO_FILA if unidad == 'units' else self.canvas.winfo_height()
+            self.desplazamiento += int(cantidad) * paso
+        self.actualizar()
+
+    def _rueda(self, widget):
+        # Windows y macOS envían <MouseWheel>; X11, los botones 4 y 5
+        widget.bind("<MouseWheel>", lambda e: self.desplazar('scroll', -1 if e.delta > 0 else 1, 'units'))
+        widget.bind("<Button-4>", lambda e: self.desplazar('scroll', -1, 'units'))
+        widget.bind("<Button-5>", lambda e: self.desplazar('scroll', 1, 'units'))
+
+    def _crear_fila(self):
+        fila = FilaLeccion()
+        fila.frame = tk.Frame(self.canvas, relief=tk.RAISED, borderwidth=1, padx=10, pady=10)
+        fila.titulo = tk.Label(fila.frame, font=('Arial', 14, 'bold'))
+        fila.titulo.pack(anchor=tk.W)
+        fila.detalle = tk.Label(fila.frame, font=('Arial', 10))
+        fila.detalle.pack(anchor=tk.W)
+        boton = tk.Button(fila.frame, text="Iniciar Lección", font=('Arial', 10),
+                          command=lambda: self.al_elegir(self.lecciones[fila.indice]))
+        boton.pack(anchor=tk.E)
+        for widget in (fila.frame, fila.titulo, fila.detalle, boton):
+            self._rueda(widget)
+        fila.ventana = self.canvas.create_window(10, 0, window=fila.frame, anchor="nw", state="hidden")
+        return fila
+
+    def actualizar(self):
+        """Colocar las filas visibles según el desplazamiento actual"""
+        alto = max(self.canvas.winfo_height(), 1)
+        total = len(self.lecciones) * self.ALTO_FILA
+        self.desplazamiento = max(0, min(self.desplazamiento, total - alto))
+        primera = self.desplazamiento // self.ALTO_FILA
+        visibles = max(0, min(len(self.lecciones) - primera, alto // self.ALTO_FILA + 2))
+        while len(self.filas) < visibles:
+            self.filas.append(self._crear_fila())
+
+        usadas = set()
+        for indice in range(primera, primera + visibles):
+            fila = self.filas[indice % len(self.filas)]
+            usadas.add(id(fila))
+            if fila.indice != indice:
+                leccion = self.lecciones[indice]
+                fila.titulo['text'] = leccion["titulo"]
+                fila.detalle['text'] = f"Tipo: {leccion['tipo']} | Palabras: {len(leccion['contenido'])}"
+                fila.indice = indice
+            self.canvas.coords(fila.ventana, 10, indice * self.ALTO_FILA - self.desplazamiento + 5)
+            self.canvas.itemconfigure(fila.ventana, state="normal", width=max(self.canvas.winfo_width() - 20, 1),
+                                      height=self.ALTO_FILA - 10)
+        for fila in self.filas:
+            if id(fila) not in usadas:
+                self.canvas.itemconfigure(fila.ventana, state="hidden")
+                fila.indice = None
+
+        if total > alto:
+            self.scrollbar.set(self.desplazamiento / total, (self.desplazamiento + alto) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+
 class AprendizajeMayaKiche:
     def __init__(self, root):
         self.root = root
@@ -17,10 +145,15 @@ class AprendizajeMayaKiche:
         
         # Variables de estado
         self.usuario_actual = None
+        self.usuario_id = None
         self.leccion_actual = None
         self.puntos = 0
         self.vidas = 3
-        self.palabras_preguntadas = set()
+        self.plan = None
+        self.pregunta = None
+        self.opciones = []
+        self.correcta = None
+        self.modo = tk.StringVar(value=MODO_OPCIONES)
         
         # Cargar datos de lecciones
         self.cargar_lecciones()
@@ -28,99 +161,88 @@ class AprendizajeMayaKiche:
         # Crear interfaz
         self.crear_interfaz()
         
+        # Resultados de la base de datos, recogidos en el hilo de Tk
+        self.root.after(INTERVALO_ENTREGA_MS, self.entregar_resultados)
+        self.root.protocol("WM_DELETE_WINDOW", self.cerrar)
+        
     def conectar_db(self):
         """Conectar a la base de datos SQLite"""
-        self.conn = sqlite3.connect('maya_kiche.db')
-        self.c = self.conn.cursor()
+        # Misma base (MAYA_KICHE_DB), WAL y busy_timeout que la aplicación web
+        self.db = PoolConexiones(RUTA_DB)
         
-        # Crear tablas si no existen
-        self.c.execute('''CREATE TABLE IF NOT EXISTS usuarios
-                         (id INTEGER PRIMARY KEY, nombre TEXT, puntos INTEGER, leccion_actual INTEGER)''')
+        # Toda consulta va a un hilo propio: la interfaz nunca espera a SQLite,
+        # aunque la base esté en una carpeta de red o la web la tenga bloqueada
+        self.hilo_db = HiloBaseDatos(self.db)
         
-        self.c.execute('''CREATE TABLE IF NOT EXISTS progreso
-                         (usuario_id INTEGER, leccion_id INTEGER, completada BOOLEAN, 
-                         fecha_completado DATE, FOREIGN KEY(usuario_id) REFERENCES usuarios(id))''')
+        # Crear o actualizar el esquema (compartido con la aplicación web);
+        # las peticiones se atienden en orden, así que va antes que todas
+        self.hilo_db.enviar(migrar, al_fallar=self.error_db)
         
-        self.conn.commit()
+        # Respuestas, puntos y repasos se guardan por lotes en segundo plano
+        self.progreso = ColaEscritura(self.db)
+    
+    def entregar_resultados(self):
+        """Ejecutar las respuestas del hilo de la base y volver a programarse"""
+        self.hilo_db.entregar()
+        self.root.after(INTERVALO_ENTREGA_MS, self.entregar_resultados)
+    
+    def error_db(self, error):
+        messagebox.showerror("Error", f"No se pudo acceder a la base de datos: {error}")
     
     def cargar_lecciones(self):
         """Cargar lecciones desde archivo JSON o crear datos de ejemplo"""
-        try:
-            with open('lecciones_maya_kiche.json', 'r', encoding='utf-8') as f:
-                self.lecciones = json.load(f)
-        except FileNotFoundError:
-            # Crear datos de ejemplo si el archivo no existe
-            self.lecciones = {
-                "basico": [
-                    {
-                        "id": 1,
-                        "titulo": "Saludos Básicos",
-                        "tipo": "vocabulario",
-                        "contenido": [
-                            {"maya": "Saqarik", "espanol": "Buenos días", "imagen": "sol.png"},
-                            {"maya": "Xqa q'ij", "espanol": "Buenas tardes", "imagen": "tarde.png"},
-                            {"maya": "Xokaq'ab'", "espanol": "Buenas noches", "imagen": "noche.png"},
-                            {"maya": "Utz awach?", "espanol": "¿Cómo estás?", "imagen": "saludo.png"},
-                            {"maya": "Utz tinimit", "espanol": "Estoy bien", "imagen": "bien.png"}
-                        ]
-                    },
-                    {
-                        "id": 2,
-                        "titulo": "Números 1-10",
-                        "tipo": "numeros",
-                        "contenido": [
-                            {"maya": "Jun", "espanol": "Uno", "imagen": "1.png"},
-                            {"maya": "Kieb'", "espanol": "Dos", "imagen": "2.png"},
-                            {"maya": "Oxib'", "espanol": "Tres", "imagen": "3.png"},
-                            {"maya": "Kajib'", "espanol": "Cuatro", "imagen": "4.png"},
-                            {"maya": "Job'", "espanol": "Cinco", "imagen": "5.png"}
-                        ]
-                    }
-                ],
-                "intermedio": [
-                    {
-                        "id": 3,
-                        "titulo": "Familia",
-                        "tipo": "vocabulario",
-                        "contenido": [
-                            {"maya": "Na", "espanol": "Madre", "imagen": "madre.png"},
-                            {"maya": "Te", "espanol": "Padre", "imagen": "padre.png"},
-                            {"maya": "Ali", "espanol": "Hijo/Hija", "imagen": "hijo.png"},
-                            {"maya": "Achijab'", "espanol": "Hermano", "imagen": "hermano.png"}
-                        ]
-                    }
-                ]
-            }
-            
-            # Guardar datos de ejemplo
-            with open('lecciones_maya_kiche.json', 'w', encoding='utf-8') as f:
-                json.dump(self.lecciones, f, ensure_ascii=False, indent=2)
+        self.lecciones = cargar_lecciones('lecciones_maya_kiche.json')
+
+        # Índice de lecciones compartido con la aplicación web
+        self.catalogo = CatalogoLecciones(self.lecciones)
     
     def crear_interfaz(self):
         """Crear la interfaz principal de la aplicación"""
         # Frame principal
         self.main_frame = tk.Frame(self.root, bg='#1a73e8')
         self.main_frame.pack(fill=tk.BOTH, expand=True)
+        self.main_frame.grid_rowconfigure(0, weight=1)
+        self.main_frame.grid_columnconfigure(0, weight=1)
+        
+        # Cada pantalla se construye una sola vez; después solo se actualiza
+        self.pantallas = {}
+        self.pantalla_actual = None
         
         # Mostrar pantalla de inicio
         self.mostrar_pantalla_inicio()
     
+    def pantalla(self, nombre):
+        """Mostrar la pantalla `nombre`, construyéndola la primera vez que se pide"""
+        frame = self.pantallas.get(nombre)
+        if frame is None:
+            frame = tk.Frame(self.main_frame, bg='#1a73e8')
+            getattr(self, f"construir_{nombre}")(frame)
+            self.pantallas[nombre] = frame
+        if frame is not self.pantalla_actual:
+            # La pantalla anterior se oculta sin destruirla (grid recuerda su sitio)
+            if self.pantalla_actual is not None:
+                self.pantalla_actual.grid_remove()
+            frame.grid(row=0, column=0, sticky='nsew')
+            self.pantalla_actual = frame
+        return frame
+    
     def mostrar_pantalla_inicio(self):
         """Mostrar pantalla de inicio con opciones"""
-        self.limpiar_pantalla()
-        
+        self.pantalla('inicio')
+    
+    def construir_inicio(self, frame):
         # Título
-        titulo = tk.Label(self.main_frame, text="Aprende Maya K'iche'", 
+        titulo = tk.Label(frame, text="Aprende Maya K'iche'", 
                          font=('Arial', 24, 'bold'), fg='white', bg='#1a73e8')
         titulo.pack(pady=30)
         
         # Subtítulo
-        subtitulo = tk.Label(self.main_frame, text="Sumérgete en la lengua y cultura Maya K'iche'", 
+        subtitulo = tk.Label(frame, text="Sumérgete en la lengua y cultura Maya K'iche'", 
                             font=('Arial', 14), fg='white', bg='#1a73e8')
         subtitulo.pack(pady=10)
         
         # Botones de opciones
-        frame_botones = tk.Frame(self.main_frame, bg='#1a73e8')
+        frame_botones = tk.Frame(frame, bg='#1a73e8')
         frame_botones.pack(pady=50)
         
         btn_nuevo_usuario = tk.Button(frame_botones, text="Nuevo Usuario", 
@@ -140,9 +262,12 @@ class AprendizajeMayaKiche:
     
     def registrar_usuario(self):
         """Registrar un nuevo usuario"""
-        self.limpiar_pantalla()
-        
-        frame_registro = tk.Frame(self.main_frame, bg='white', padx=20, pady=20)
+        self.pantalla('registro')
+        self.entry_usuario.delete(0, tk.END)
+        self.entry_usuario.focus_set()
+    
+    def construir_registro(self, frame):
+        frame_registro = tk.Frame(frame, bg='white', padx=20, pady=20)
         frame_registro.pack(expand=True)
         
         tk.Label(frame_registro, text="Nombre de usuario:", 
@@ -151,9 +276,9 @@ class AprendizajeMayaKiche:
         self.entry_usuario = tk.Entry(frame_registro, font=('Arial', 14), width=20)
         self.entry_usuario.pack(pady=10)
         
-        btn_guardar = tk.Button(frame_registro, text="Guardar", 
-                               font=('Arial', 12), command=self.guardar_usuario)
-        btn_guardar.pack(pady=10)
+        self.btn_guardar = tk.Button(frame_registro, text="Guardar", 
+                                    font=('Arial', 12), command=self.guardar_usuario)
+        self.btn_guardar.pack(pady=10)
         
         btn_volver = tk.Button(frame_registro, text="Volver", 
                               font=('Arial', 12), command=self.mostrar_pantalla_inicio)
@@ -164,180 +289,213 @@ class AprendizajeMayaKiche:
         nombre = self.entry_usuario.get().strip()
         
         if nombre:
-            # Verificar si el usuario ya existe
-            self.c.execute("SELECT id FROM usuarios WHERE nombre = ?", (nombre,))
-            existe = self.c.fetchone()
-            
-            if existe:
-                messagebox.showerror("Error", "Este nombre de usuario ya existe")
-            else:
-                # Insertar nuevo usuario
-                self.c.execute("INSERT INTO usuarios (nombre, puntos, leccion_actual) VALUES (?, ?, ?)", 
-                              (nombre, 0, 1))
-                self.conn.commit()
-                
-                self.usuario_actual = nombre
-                messagebox.showinfo("Éxito", f"Usuario {nombre} creado correctamente")
-                self.mostrar_lecciones()
+            # Sin doble envío mientras se guarda
+            self.btn_guardar['state'] = tk.DISABLED
+            self.hilo_db.enviar(crear_usuario, nombre,
+                                al_terminar=lambda usuario_id: self.usuario_guardado(nombre, usuario_id),
+                                al_fallar=self.error_guardar)
         else:
             messagebox.showerror("Error", "Por favor ingresa un nombre de usuario")
     
+    def usuario_guardado(self, nombre, usuario_id):
+        self.btn_guardar['state'] = tk.NORMAL
+        if usuario_id is None:
+            messagebox.showerror("Error", "Este nombre de usuario ya existe")
+            return
+        
+        self.usuario_actual = nombre
+        self.usuario_id = usuario_id
+        messagebox.showinfo("Éxito", f"Usuario {nombre} creado correctamente")
+        self.mostrar_lecciones()
+    
+    def error_guardar(self, error):
+        self.btn_guardar['state'] = tk.NORMAL
+        self.error_db(error)
+    
     def seleccionar_usuario(self):
         """Seleccionar usuario existente"""
-        self.limpiar_pantalla()
+        self.pantalla('seleccion')
+        self.combo_usuarios.set('')
         
-        frame_seleccion = tk.Frame(self.main_frame, bg='white', padx=20, pady=20)
+        # Obtener la primera página de usuarios; el resto se busca al escribir
+        self.hilo_db.enviar(buscar_usuarios, al_terminar=self.mostrar_usuarios, al_fallar=self.error_db)
+    
+    def mostrar_usuarios(self, usuarios):
+        if usuarios:
+            self.combo_usuarios['values'] = usuarios
+            self.label_sin_usuarios.pack_forget()
+            self.frame_con_usuarios.pack(before=self.btn_volver_seleccion)
+        else:
+            self.frame_con_usuarios.pack_forget()
+            self.label_sin_usuarios.pack(pady=10, before=self.btn_volver_seleccion)
+    
+    def construir_seleccion(self, frame):
+        frame_seleccion = tk.Frame(frame, bg='white', padx=20, pady=20)
         frame_seleccion.pack(expand=True)
         
         tk.Label(frame_seleccion, text="Selecciona tu usuario:", 
                 font=('Arial', 14), bg='white').pack(pady=10)
         
-        # Obtener lista de usuarios
-        self.c.execute("SELECT nombre FROM usuarios")
-        usuarios = [fila[0] for fila in self.c.fetchall()]
+        # Combobox y botón si hay usuarios, o el aviso si no; se muestra uno u otro
+        self.frame_con_usuarios = tk.Frame(frame_seleccion, bg='white')
+        self.combo_usuarios = ttk.Combobox(self.frame_con_usuarios, font=('Arial', 14))
+        self.combo_usuarios.bind('<KeyRelease>', self.filtrar_usuarios)
+        self.combo_usuarios.pack(pady=10)
         
-        if usuarios:
-            self.combo_usuarios = ttk.Combobox(frame_seleccion, values=usuarios, 
-                                              font=('Arial', 14), state='readonly')
-            self.combo_usuarios.pack(pady=10)
-            
-            btn_seleccionar = tk.Button(frame_seleccion, text="Seleccionar", 
-                                       font=('Arial', 12), command=self.cargar_usuario)
-            btn_seleccionar.pack(pady=10)
-        else:
-            tk.Label(frame_seleccion, text="No hay usuarios registrados", 
-                    font=('Arial', 12), bg='white').pack(pady=10)
+        btn_seleccionar = tk.Button(self.frame_con_usuarios, text="Seleccionar", 
+                                   font=('Arial', 12), command=self.cargar_usuario)
+        btn_seleccionar.pack(pady=10)
         
-        btn_volver = tk.Button(frame_seleccion, text="Volver", 
-                              font=('Arial', 12), command=self.mostrar_pantalla_inicio)
-        btn_volver.pack(pady=10)
+        self.label_sin_usuarios = tk.Label(frame_seleccion, text="No hay usuarios registrados", 
+                                           font=('Arial', 12), bg='white')
+        
+        self.btn_volver_seleccion = tk.Button(frame_seleccion, text="Volver", 
+                                              font=('Arial', 12), command=self.mostrar_pantalla_inicio)
+        self.btn_volver_seleccion.pack(pady=10)
+    
+    def filtrar_usuarios(self, event=None):
+        """Actualizar las opciones del combobox con los usuarios que empiezan por lo escrito"""
+        prefijo = self.combo_usuarios.get().strip()
+        self.hilo_db.enviar(buscar_usuarios, prefijo,
+                            al_terminar=lambda usuarios: self.usuarios_filtrados(prefijo, usuarios))
+    
+    def usuarios_filtrados(self, prefijo, usuarios):
+        # Si se siguió escribiendo, ya viene en camino una búsqueda más nueva
+        if self.combo_usuarios.get().strip() == prefijo:
+            self.combo_usuarios['values'] = usuarios
     
     def cargar_usuario(self):
         """Cargar usuario seleccionado"""
-        nombre = self.combo_usuarios.get()
+        nombre = self.combo_usuarios.get().strip()
         
-        if nombre:
+        if not nombre:
+            messagebox.showerror("Error", "Por favor selecciona un usuario")
+            return
+        
+        self.hilo_db.enviar(id_usuario, nombre,
+                            al_terminar=lambda usuario_id: self.usuario_cargado(nombre, usuario_id),
+                            al_fallar=self.error_db)
+    
+    def usuario_cargado(self, nombre, usuario_id):
+        if usuario_id is not None:
             self.usuario_actual = nombre
+            self.usuario_id = usuario_id
             messagebox.showinfo("Bienvenido", f"Hola {nombre}!")
             self.mostrar_lecciones()
         else:
-            messagebox.showerror("Error", "Por favor selecciona un usuario")
+            messagebox.showerror("Error", "Usuario no encontrado")
     
     def mostrar_lecciones(self):
         """Mostrar lista de lecciones disponibles"""
-        self.limpiar_pantalla()
-        
+        self.pantalla('lecciones')
+    
+    def construir_lecciones(self, frame):
         # Título
-        titulo = tk.Label(self.main_frame, text="Lecciones de Maya K'iche'", 
+        titulo = tk.Label(frame, text="Lecciones de Maya K'iche'", 
                          font=('Arial', 20, 'bold'), fg='white', bg='#1a73e8')
         titulo.pack(pady=20)
         
         # Frame para lecciones
-        frame_lecciones = tk.Frame(self.main_frame, bg='white')
+        frame_lecciones = tk.Frame(frame, bg='white')
         frame_lecciones.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
         
         # Crear notebook (pestañas) para diferentes niveles
         notebook = ttk.Notebook(frame_lecciones)
         notebook.pack(fill=tk.BOTH, expand=True)
         
-        # Pestaña Básico
-        frame_basico = ttk.Frame(notebook)
-        notebook.add(frame_basico, text="Básico")
-        self.crear_lista_lecciones(frame_basico, "basico")
-        
-        # Pestaña Intermedio
-        frame_intermedio = ttk.Frame(notebook)
-        notebook.add(frame_intermedio, text="Intermedio")
-        self.crear_lista_lecciones(frame_intermedio, "intermedio")
+        # Una lista virtual por nivel: solo existen las filas que se ven
+        self.listas_lecciones = {}
+        for nivel, texto in (("basico", "Básico"), ("intermedio", "Intermedio"), ("avanzado", "Avanzado")):
+            lista = ListaLecciones(notebook, self.iniciar_leccion)
+            notebook.add(lista, text=texto)
+            lista.mostrar(self.lecciones.get(nivel, []))
+            self.listas_lecciones[nivel] = lista
         
-        # Pestaña Avanzado
-        frame_avanzado = ttk.Frame(notebook)
-        notebook.add(frame_avanzado, text="Avanzado")
-        self.crear_lista_lecciones(frame_avanzado, "avanzado")
+        # Modo de los ejercicios: elegir entre opciones o escribir la palabra
+        tk.Checkbutton(frame, text="Escribir las respuestas", variable=self.modo,
+                       onvalue=MODO_ESCRIBIR, offvalue=MODO_OPCIONES, font=('Arial', 12),
+                       fg='white', bg='#1a73e8', selectcolor='#1a73e8',
+                       activebackground='#1a73e8', activeforeground='white').pack()
         
         # Botón volver
-        btn_volver = tk.Button(self.main_frame, text="Volver al Inicio", 
+        btn_volver = tk.Button(frame, text="Volver al Inicio", 
                               font=('Arial', 12), command=self.mostrar_pantalla_inicio)
         btn_volver.pack(pady=10)
     
-    def crear_lista_lecciones(self, parent, nivel):
-        """Crear lista de lecciones para un nivel específico"""
-        # Obtener lecciones del nivel
-        lecciones_nivel = self.lecciones.get(nivel, [])
-        
-        # Frame con scrollbar
-        frame_contenedor = tk.Frame(parent)
-        frame_contenedor.pack(fill=tk.BOTH, expand=True)
-        
-        canvas = tk.Canvas(frame_contenedor)
-        scrollbar = ttk.Scrollbar(frame_contenedor, orient="vertical", command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-        
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-        
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        
-        # Mostrar lecciones
-        for leccion in lecciones_nivel:
-            frame_leccion = tk.Frame(scrollable_frame, relief=tk.RAISED, borderwidth=1, padx=10, pady=10)
-            frame_leccion.pack(fill=tk.X, padx=10, pady=5)
-            
-            tk.Label(frame_leccion, text=leccion["titulo"], 
-                    font=('Arial', 14, 'bold')).pack(anchor=tk.W)
-            
-            tk.Label(frame_leccion, text=f"Tipo: {leccion['tipo']} | Palabras: {len(leccion['contenido'])}", 
-                    font=('Arial', 10)).pack(anchor=tk.W)
-            
-            btn_iniciar = tk.Button(frame_leccion, text="Iniciar Lección", 
-                                   font=('Arial', 10), 
-                                   command=lambda l=leccion: self.iniciar_leccion(l))
-            btn_iniciar.pack(anchor=tk.E)
-        
-        canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-    
     def iniciar_leccion(self, leccion):
         """Iniciar una lección específica"""
+        # Plan de repetición espaciada con el estado guardado del usuario
+        palabras = [p["maya"] for p in leccion["contenido"]]
+        if self.usuario_id is None:
+            self.empezar_leccion(leccion, PlanRepaso(palabras))
+        else:
+            self.hilo_db.enviar(cargar_plan, self.usuario_id, leccion["id"], palabras,
+                                al_terminar=lambda plan: self.empezar_leccion(leccion, plan),
+                                al_fallar=self.error_db)
+    
+    def empezar_leccion(self, leccion, plan):
         self.leccion_actual = leccion
+        self.plan = plan
         self.puntos = 0
         self.vidas = 3
-        self.palabras_preguntadas = set()
-
+        self.pregunta = None
         self.mostrar_ejercicio()
     
     def mostrar_ejercicio(self):
         """Mostrar un ejercicio de la lección actual"""
-        self.limpiar_pantalla()
-
-        # Obtener palabra aleatoria de la lección que no haya sido preguntada
-        contenido = self.leccion_actual["contenido"]
-        palabras_disponibles = [p for p in contenido if p["espanol"] not in self.palabras_preguntadas]
-
-        if not palabras_disponibles:
-            # Si todas las palabras han sido preguntadas, reiniciar el set
-            self.palabras_preguntadas = set()
-            palabras_disponibles = contenido
+        self.pantalla('ejercicio')
 
-        palabra = random.choice(palabras_disponibles)
-        self.palabras_preguntadas.add(palabra["espanol"])
-        
+        # La palabra que toca según la repetición espaciada, sin repetir la anterior
+        self.pregunta = self.plan.siguiente(evitar=self.pregunta)
+        palabra = self.leccion_actual["contenido"][self.pregunta]
+        
+        self.correcta = palabra["maya"]
+        
+        # Solo cambia el texto de los widgets que ya existen
+        self.label_puntos['text'] = f"Puntos: {self.puntos}"
+        self.label_vidas['text'] = f"Vidas: {self.vidas}"
+        self.label_palabra['text'] = palabra["espanol"]
+        
+        if self.modo.get() == MODO_ESCRIBIR:
+            self.frame_opciones.pack_forget()
+            self.frame_escribir.pack(pady=20, before=self.btn_saltar)
+            self.entrada_respuesta.delete(0, tk.END)
+            self.entrada_respuesta.focus_set()
+            return
+        self.frame_escribir.pack_forget()
+        self.frame_opciones.pack(pady=20, before=self.btn_saltar)
+        
+        # Opciones: la correcta y distractores sin repetir, ya mezcladas
+        distintas = self.catalogo.respuestas_distintas(self.leccion_actual["id"])
+        self.opciones = generar_opciones(distintas, palabra["maya"])
+        
+        while len(self.botones_opciones) < len(self.opciones):
+            posicion = len(self.botones_opciones)
+            self.botones_opciones.append(tk.Button(self.frame_opciones, font=('Arial', 14), width=20, height=2,
+                                                   command=lambda p=posicion: self.elegir_opcion(p)))
+        # Con menos de cuatro respuestas distintas sobran botones: se ocultan los últimos
+        for posicion, btn in enumerate(self.botones_opciones):
+            if posicion < len(self.opciones):
+                btn['text'] = self.opciones[posicion]
+                if not btn.winfo_manager():
+                    btn.pack(pady=5)
+            else:
+                btn.pack_forget()
+    
+    def construir_ejercicio(self, frame):
         # Frame principal del ejercicio
-        frame_ejercicio = tk.Frame(self.main_frame, bg='white', padx=20, pady=20)
+        frame_ejercicio = tk.Frame(frame, bg='white', padx=20, pady=20)
         frame_ejercicio.pack(fill=tk.BOTH, expand=True)
         
         # Información de progreso
         frame_info = tk.Frame(frame_ejercicio, bg='white')
         frame_info.pack(fill=tk.X, pady=10)
         
-        tk.Label(frame_info, text=f"Puntos: {self.puntos}", 
-                font=('Arial', 12), bg='white').pack(side=tk.LEFT)
+        self.label_puntos = tk.Label(frame_info, font=('Arial', 12), bg='white')
+        self.label_puntos.pack(side=tk.LEFT)
         
-        tk.Label(frame_info, text=f"Vidas: {self.vidas}", 
-                font=('Arial', 12), bg='white').pack(side=tk.RIGHT)
+        self.label_vidas = tk.Label(frame_info, font=('Arial', 12), bg='white')
+        self.label_vidas.pack(side=tk.RIGHT)
         
         # Pregunta
         frame_pregunta = tk.Frame(frame_ejercicio, bg='white')
@@ -346,43 +504,59 @@ class AprendizajeMayaKiche:
         tk.Label(frame_pregunta, text="¿Cómo se dice en Maya K'iche'?", 
                 font=('Arial', 16, 'bold'), bg='white').pack()
         
-        tk.Label(frame_pregunta, text=palabra["espanol"], 
-                font=('Arial', 20, 'bold'), bg='white', fg='#1a73e8').pack(pady=10)
-        
-        # Opciones de respuesta
-        frame_opciones = tk.Frame(frame_ejercicio, bg='white')
-        frame_opciones.pack(pady=20)
-        
-        # Obtener opciones incorrectas
-        opciones_incorrectas = []
-        contenido = self.leccion_actual["contenido"]
+        self.label_palabra = tk.Label(frame_pregunta, font=('Arial', 20, 'bold'), bg='white', fg='#1a73e8')
+        self.label_palabra.pack(pady=10)
         
-        while len(opciones_incorrectas) < 3:
-            opcion = random.choice(contenido)
-            if opcion["maya"] != palabra["maya"] and opcion["maya"] not in opciones_incorrectas:
-                opciones_incorrectas.append(opcion["maya"])
+        # Opciones de respuesta: los botones se crean al hacer falta y se reutilizan
+        self.frame_opciones = tk.Frame(frame_ejercicio, bg='white')
+        self.frame_opciones.pack(pady=20)
+        self.botones_opciones = []
         
-        # Mezclar opciones
-        opciones = [palabra["maya"]] + opciones_incorrectas
-        random.shuffle(opciones)
-        
-        # Crear botones de opciones
-        for opcion in opciones:
-            btn = tk.Button(frame_opciones, text=opcion, 
-                           font=('Arial', 14), width=20, height=2,
-                           command=lambda o=opcion: self.verificar_respuesta(o, palabra["maya"]))
-            btn.pack(pady=5)
+        # Respuesta escrita (se muestra en lugar de las opciones según el modo)
+        self.frame_escribir = tk.Frame(frame_ejercicio, bg='white')
+        self.entrada_respuesta = tk.Entry(self.frame_escribir, font=('Arial', 16), width=24)
+        self.entrada_respuesta.pack(side=tk.LEFT, padx=5)
+        self.entrada_respuesta.bind('<Return>', self.comprobar_escrita)
+        tk.Button(self.frame_escribir, text="Comprobar", font=('Arial', 12),
+                  command=self.comprobar_escrita).pack(side=tk.LEFT, padx=5)
         
         # Botón para saltar pregunta
-        btn_saltar = tk.Button(frame_ejercicio, text="Saltar", 
-                              font=('Arial', 12), command=self.mostrar_ejercicio)
-        btn_saltar.pack(pady=10)
+        self.btn_saltar = tk.Button(frame_ejercicio, text="Saltar", 
+                                    font=('Arial', 12), command=self.mostrar_ejercicio)
+        self.btn_saltar.pack(pady=10)
+    
+    def elegir_opcion(self, posicion):
+        """Responder con la opción del botón `posicion` del ejercicio actual"""
+        self.verificar_respuesta(self.opciones[posicion], self.correcta)
     
-    def verificar_respuesta(self, respuesta, correcta):
+    def comprobar_escrita(self, event=None):
+        """Corregir la palabra escrita, igual que la aplicación web"""
+        respuesta = self.entrada_respuesta.get()
+        if not respuesta.strip():
+            return
+        leccion_id = self.leccion_actual["id"]
+        correccion = self.catalogo.respuestas_escritas(leccion_id).corregir(respuesta, self.pregunta)
+        explicacion = explicar(correccion, self.leccion_actual["contenido"], self.pregunta)
+        self.verificar_respuesta(respuesta, self.correcta, correccion.acierto, explicacion)
+    
+    def verificar_respuesta(self, respuesta, correcta, acierto=None, explicacion=None):
         """Verificar si la respuesta es correcta"""
-        if respuesta == correcta:
+        if acierto is None:
+            acierto = respuesta == correcta
+        estado = self.plan.registrar(self.pregunta, acierto)
+        
+        if self.usuario_id is not None:
+            leccion_id = self.leccion_actual["id"]
+            self.progreso.registrar_respuesta(self.usuario_id, leccion_id, correcta,
+                                              acierto, puntos=10 if acierto else 0)
+            self.progreso.registrar_repaso(self.usuario_id, leccion_id, correcta, estado)
+            if acierto and self.puntos + 10 >= 100:
+                self.progreso.registrar_leccion_completada(self.usuario_id, leccion_id)
+        
+        if acierto:
             self.puntos += 10
-            messagebox.showinfo("Correcto", "¡Respuesta correcta! +10 puntos")
+            messagebox.showinfo("Correcto", f"{explicacion} +10 puntos" if explicacion
+                                else "¡Respuesta correcta! +10 puntos")
             if self.puntos >= 100:
                 messagebox.showinfo("¡Felicidades!", f"Has completado la lección con {self.puntos} puntos!")
                 self.mostrar_lecciones()
@@ -391,21 +565,20 @@ class AprendizajeMayaKiche:
         else:
             self.vidas -= 1
             if self.vidas <= 0:
-                messagebox.showinfo("Fin", f"Juego terminado. Puntos finales: {self.puntos}")
+                aviso = f"Juego terminado. Puntos finales: {self.puntos}"
+                messagebox.showinfo("Fin", f"{explicacion}\n{aviso}" if explicacion else aviso)
                 self.mostrar_lecciones()
             else:
-                messagebox.showerror("Incorrecto", f"Respuesta incorrecta. Te quedan {self.vidas} vidas")
+                aviso = f"Respuesta incorrecta. Te quedan {self.vidas} vidas"
+                messagebox.showerror("Incorrecto", f"{explicacion}\n{aviso}" if explicacion else aviso)
                 self.mostrar_ejercicio()
     
-    def limpiar_pantalla(self):
-        """Limpiar todos los widgets de la pantalla actual"""
-        for widget in self.main_frame.winfo_children():
-            widget.destroy()
-    
-    def __del__(self):
-        """Cerrar conexión a la base de datos al destruir la aplicación"""
-        if hasattr(self, 'conn'):
-            self.conn.close()
+    def cerrar(self):
+        """Escribir lo pendiente, detener los hilos de la base y cerrar la ventana"""
+        self.progreso.cerrar()
+        self.hilo_db.cerrar()
+        self.db.cerrar()
+        self.root.destroy()
 
 def main():
     root = tk.Tk()
@@ -0,0 +1,114 @@
+"""Lotes de ejercicios para la API JSON.
+
+En vez de un POST/redirect/GET por respuesta, el cliente pide N ejercicios
+de una vez, los contesta en el navegador y envía todas las respuestas
+juntas. El lote viaja con un token firmado con la clave de la aplicación
+que indica el usuario, la lección, la versión del catálogo y los índices
+de las palabras preguntadas, y el modo (opciones o respuesta escrita). La
+respuesta correcta no se envía al cliente: al corregir se busca en el
+catálogo.
+"""
+import random
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from ejercicios import generar_opciones
+from escritura import MODO_OPCIONES
+from fichas import RAFAGA_RESPUESTAS
+
+EJERCICIOS_POR_LOTE = 10
+# Un lote entero tiene que caber en la ráfaga del límite de respuestas
+MAX_EJERCICIOS_POR_LOTE = RAFAGA_RESPUESTAS
+
+# Segundos que un lote puede tardar en contestarse
+VIGENCIA_LOTE = 3600
+
+PUNTOS_POR_ACIERTO = 10
+PUNTOS_PARA_COMPLETAR = 100
+VIDAS_INICIALES = 3
+
+
+class LoteInvalido(ValueError):
+    """Token de lote mal firmado, caducado o de otro usuario/lección/catálogo"""
+
+
+class FirmaLotes:
+    """Firmar y verificar los tokens de lote"""
+
+    def __init__(self, secreto):
+        self._serializador = URLSafeTimedSerializer(secreto, salt='lote-ejercicios')
+
+    def firmar(self, usuario_id, leccion_id, version, indices, nonce, modo=MODO_OPCIONES):
+        return self._serializador.dumps(
+            {'u': usuario_id, 'l': leccion_id, 'v': version, 'p': indices, 'n': nonce, 'm': modo})
+
+    def verificar(self, token, usuario_id, leccion_id, version):
+        """Devolver el contenido del token o lanzar LoteInvalido"""
+        try:
+            lote = self._serializador.loads(token, max_age=VIGENCIA_LOTE)
+        except SignatureExpired:
+            raise LoteInvalido("El lote ha caducado")
+        except BadSignature:
+            raise LoteInvalido("Token de lote no válido")
+        if lote['u'] != usuario_id or lote['l'] != leccion_id:
+            raise LoteInvalido("El lote no corresponde a esta lección")
+        if lote['v'] != version:
+            raise LoteInvalido("Las lecciones cambiaron; pide un lote nuevo")
+        # Los tokens firmados antes de existir el modo escrito son de opciones
+        lote.setdefault('m', MODO_OPCIONES)
+        return lote
+
+
+def generar_lote(plan, catalogo, leccion_id, cantidad, rng=random, modo=MODO_OPCIONES):
+    """Elegir `cantidad` palabras según el plan de repaso y armar sus ejercicios.
+
+    Si la lección tiene menos palabras que `cantidad` se vuelve a empezar
+    por las que tocan antes. Los ejercicios de respuesta escrita no llevan
+    opciones. Devuelve (índices, ejercicios).
+    """
+    orden = plan.proximas(cantidad)
+    indices = [orden[i % len(orden)] for i in range(cantidad)] if orden else []
+
+    contenido = catalogo.leccion(leccion_id)["contenido"]
+    distintas = catalogo.respuestas_distintas(leccion_id)
+    ejercicios = []
+    for indice in indices:
+        palabra = contenido[indice]
+        ejercicio = {
+            "pregunta": palabra["espanol"],
+            "imagen": palabra.get("imagen"),
+            "audio": palabra.get("audio"),
+        }
+        if modo == MODO_OPCIONES:
+            ejercicio["opciones"] = generar_opciones(distintas, palabra["maya"], rng)
+        ejercicios.append(ejercicio)
+    return indices, ejercicios
+
+
+def corregir(correctas, respuestas, puntos, vidas, calificar=None):
+    """Corregir las respuestas de un lote en orden, con las reglas del juego.
+
+    Una respuesta None es un ejercicio saltado. `calificar(posicion, respuesta)`
+    decide si una respuesta es correcta; por defecto, si es igual a la
+    correcta (la opción elegida). Se deja de corregir al
+    completar la lección o al quedarse sin vidas. Devuelve
+    (aciertos, puntos, vidas, terminado), donde `aciertos` tiene un
+    True/False/None por respuesta corregida y `terminado` es
+    'completada', 'sin_vidas' o None.
+    """
+    aciertos = []
+    for posicion, (correcta, respuesta) in enumerate(zip(correctas, respuestas)):
+        if respuesta is None:
+            aciertos.append(None)
+            continue
+        acierto = respuesta == correcta if calificar is None else calificar(posicion, respuesta)
+        aciertos.append(acierto)
+        if acierto:
+            puntos += PUNTOS_POR_ACIERTO
+            if puntos >= PUNTOS_PARA_COMPLETAR:
+                return aciertos, puntos, vidas, 'completada'
+        else:
+            vidas -= 1
+            if vidas <= 0:
+                return aciertos, puntos, vidas, 'sin_vidas'
+    return aciertos, puntos, vidas, None
@@ -0,0 +1,271 @@
+"""Imágenes y audios de las palabras, servidos por contenido.
+
+Los archivos viven en DIRECTORIO_MEDIOS (variable MAYA_MEDIOS; por defecto
+media/ junto a la aplicación) con el nombre que aparece en el catálogo:
+`imagen` ("sol.png") y `audio` ("saqarik.mp3"). Al arrancar se indexan
+por su SHA-256 y cada uno se sirve en /medios/<huella>.<ext>:
+
+- la URL cambia si cambia el contenido, así que la caché es inmutable, y
+  dos palabras con el mismo archivo comparten URL y caché del navegador;
+- el hash de cada archivo se guarda en .medios.json junto con su tamaño y
+  fecha, y solo se recalcula para los archivos que cambian;
+- los archivos pequeños (las imágenes, casi siempre) se guardan en una
+  caché LRU en memoria con un tope de bytes;
+- los grandes se envían como archivo con wsgi.file_wrapper, que gunicorn
+  convierte en os.sendfile (sin copiar el contenido al proceso);
+- las peticiones Range (el navegador las usa con <audio>) devuelven 206
+  con el trozo pedido, también por sendfile.
+
+El manifiesto de una lección (manifiesto()) lista las URLs de todos sus
+medios para que el cliente los precargue de una vez.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from flask import request, url_for
+from werkzeug.wsgi import wrap_file
+
+DIRECTORIO_MEDIOS = os.environ.get(
+    'MAYA_MEDIOS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media'))
+ARCHIVO_INDICE = '.medios.json'
+
+TIPOS = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+    '.svg': 'image/svg+xml',
+    '.mp3': 'audio/mpeg',
+    '.ogg': 'audio/ogg',
+    '.opus': 'audio/ogg',
+    '.m4a': 'audio/mp4',
+    '.wav': 'audio/wav',
+}
+
+# Hasta este tamaño un archivo se guarda en memoria; los demás van por sendfile
+MAXIMO_EN_MEMORIA = 256 * 1024
+CAPACIDAD_CACHE = int(os.environ.get('MEDIOS_CACHE_MB', 32)) * 1024 * 1024
+# Trozos de lectura cuando el servidor no usa sendfile (p. ej. modo ASGI)
+TROZO_ARCHIVO = 64 * 1024
+
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+# El manifiesto cambia con el catálogo o los archivos: se revalida
+CACHE_MANIFIESTO = 'public, max-age=300'
+
+LONGITUD_HUELLA = 16
+
+
+class Medio:
+    __slots__ = ('ruta', 'tamano', 'huella', 'tipo')
+
+    def __init__(self, ruta, tamano, huella, tipo):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.huella = huella
+        self.tipo = tipo
+
+
+class CacheMedios:
+    """LRU de contenidos por huella, limitada por el total de bytes"""
+
+    def __init__(self, capacidad=CAPACIDAD_CACHE):
+        self.capacidad = capacidad
+        self.ocupados = 0
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, huella):
+        with self._lock:
+            datos = self._datos.get(huella)
+            if datos is None:
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(huella)
+            self.aciertos += 1
+            return datos
+
+    def guardar(self, huella, datos):
+        if len(datos) > self.capacidad:
+            return
+        with self._lock:
+            if huella in self._datos:
+                return
+            self._datos[huella] = datos
+            self.ocupados += len(datos)
+            while self.ocupados > self.capacidad:
+                _, expulsado = self._datos.popitem(last=False)
+                self.ocupados -= len(expulsado)
+
+
+class TrozosArchivo:
+    """Cuerpo WSGI con `cantidad` bytes de un archivo ya posicionado, por trozos"""
+
+    def __init__(self, archivo, cantidad):
+        self.archivo = archivo
+        self.cantidad = cantidad
+
+    def __iter__(self):
+        pendiente = self.cantidad
+        while pendiente > 0:
+            trozo = self.archivo.read(min(TROZO_ARCHIVO, pendiente))
+            if not trozo:
+                return
+            pendiente -= len(trozo)
+            yield trozo
+
+    def close(self):
+        self.archivo.close()
+
+
+def _sha256(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for trozo in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(trozo)
+    return h.hexdigest()
+
+
+class AlmacenMedios:
+    """Índice nombre del catálogo -> medio, y medios por huella para servirlos"""
+
+    def __init__(self, directorio=DIRECTORIO_MEDIOS, cache=None):
+        self.directorio = directorio
+        self.cache = cache if cache is not None else CacheMedios()
+        self.nombres = {}   # "sol.png" -> Medio
+        self.objetos = {}   # "<huella>.png" -> Medio
+        self.indexar()
+
+    def indexar(self):
+        """Recorrer el directorio, reutilizando los hashes de .medios.json si no cambió nada"""
+        ruta_indice = os.path.join(self.directorio, ARCHIVO_INDICE)
+        try:
+            with open(ruta_indice, encoding='utf-8') as f:
+                previo = json.load(f)
+        except (OSError, ValueError):
+            previo = {}
+
+        indice = {}
+        nombres = {}
+        for raiz, directorios, archivos in os.walk(self.directorio):
+            directorios[:] = sorted(d for d in directorios if not d.startswith('.'))
+            for archivo in sorted(archivos):
+                extension = os.path.splitext(archivo)[1].lower()
+                if archivo.startswith('.') or extension not in TIPOS:
+                    continue
+                ruta = os.path.join(raiz, archivo)
+                nombre = os.path.relpath(ruta, self.directorio).replace(os.sep, '/')
+                estado = os.stat(ruta)
+                tamano, fecha = estado.st_size, estado.st_mtime_ns
+                anterior = previo.get(nombre)
+                if anterior and anterior[0] == tamano and anterior[1] == fecha:
+                    huella = anterior[2]
+                else:
+                    huella = _sha256(ruta)
+                indice[nombre] = [tamano, fecha, huella]
+                nombres[nombre] = Medio(ruta, tamano, huella, TIPOS[extension])
+
+        self.nombres = nombres
+        self.objetos = {self.clave(medio): medio for medio in nombres.values()}
+        if indice != previo and os.path.isdir(self.directorio):
+            self._guardar_indice(ruta_indice, indice)
+
+    def _guardar_indice(self, ruta, indice):
+        # Varios workers pueden indexar a la vez: temporal propio y os.replace
+        try:
+            fd, temporal = tempfile.mkstemp(dir=self.directorio, prefix='.medios', suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(indice, f, sort_keys=True)
+            os.replace(temporal, ruta)
+        except OSError:
+            # Directorio de solo lectura: se vuelve a hashear en el próximo arranque
+            pass
+
+    @staticmethod
+    def clave(medio):
+        return medio.huella[:LONGITUD_HUELLA] + os.path.splitext(medio.ruta)[1].lower()
+
+    def url(self, nombre):
+        """URL por contenido del archivo `nombre` del catálogo, o None si no existe"""
+        medio = self.nombres.get(nombre)
+        return url_for('medio', clave=self.clave(medio)) if medio else None
+
+    def manifiesto(self, leccion):
+        """Medios de una lección para precargarlos: por palabra y la lista de URLs sin repetir"""
+        palabras = []
+        urls = {}
+        for palabra in leccion['contenido']:
+            entrada = {"maya": palabra["maya"]}
+            for campo in ('imagen', 'audio'):
+                medio = self.nombres.get(palabra.get(campo))
+                entrada[campo] = self.url(palabra.get(campo))
+                if medio is not None:
+                    urls[entrada[campo]] = medio.tamano
+            palabras.append(entrada)
+        return {"palabras": palabras, "urls": list(urls), "bytes": sum(urls.values())}
+
+    def responder(self, app, clave, peticion=None):
+        """Respuesta con el medio (entero o el rango pedido); None si no existe.
+
+        `peticion` es la petición de Flask por defecto; el modo ASGI pasa la suya.
+        """
+        medio = self.objetos.get(clave)
+        if medio is None:
+            return None
+        if peticion is None:
+            peticion = request
+
+        cabeceras = {'Cache-Control': CACHE_INMUTABLE, 'Accept-Ranges': 'bytes'}
+        if peticion.if_none_match.contains(medio.huella):
+            respuesta = app.response_class(status=304, headers=cabeceras)
+            respuesta.set_etag(medio.huella)
+            return respuesta
+
+        inicio, fin, estado = 0, medio.tamano, 200
+        rango = peticion.range
+        # Con If-Range solo se da el trozo si el navegador tiene esta misma versión
+        if rango is not None and ('If-Range' not in peticion.headers or peticion.if_range.etag == medio.huella):
+            limites = rango.range_for_length(medio.tamano)
+            if limites is not None:
+                (inicio, fin), estado = limites, 206
+            elif len(rango.ranges) == 1:
+                cabeceras['Content-Range'] = f"bytes */{medio.tamano}"
+                return app.response_class(status=416, headers=cabeceras)
+            # Varios rangos a la vez: se ignora Range y se envía el archivo entero
+        if estado == 206:
+            cabeceras['Content-Range'] = f"bytes {inicio}-{fin - 1}/{medio.tamano}"
+
+        datos = self.cache.obtener(medio.huella) if medio.tamano <= MAXIMO_EN_MEMORIA else None
+        if datos is None and medio.tamano <= MAXIMO_EN_MEMORIA:
+            with open(medio.ruta, 'rb') as f:
+                datos = f.read()
+            if len(datos) != medio.tamano:
+                # El archivo cambió después de indexarlo: ya no es este contenido
+                return None
+            self.cache.guardar(medio.huella, datos)
+
+        if datos is not None:
+            respuesta = app.response_class(datos[inicio:fin], status=estado, headers=cabeceras,
+                                           content_type=medio.tipo)
+        else:
+            f = open(medio.ruta, 'rb')
+            if os.fstat(f.fileno()).st_size != medio.tamano:
+                f.close()
+                return None
+            f.seek(inicio)
+            if 'wsgi.file_wrapper' in peticion.environ:
+                # gunicorn envía con sendfile Content-Length bytes desde la posición actual
+                cuerpo = wrap_file(peticion.environ, f, TROZO_ARCHIVO)
+            else:
+                cuerpo = TrozosArchivo(f, fin - inicio)
+            respuesta = app.response_class(cuerpo, status=estado, headers=cabeceras,
+                                           content_type=medio.tipo, direct_passthrough=True)
+            respuesta.content_length = fin - inicio
+        respuesta.set_etag(medio.huella)
+        return respuesta
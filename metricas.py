@@ -0,0 +1,306 @@
+"""Instrumentación de la aplicación web y exportación en formato Prometheus.
+
+Qué se mide (por proceso; con varios workers cada uno tiene sus números):
+    maya_peticion_segundos      latencia por ruta (histograma)
+    maya_peticiones_total       peticiones por ruta y código de estado
+    maya_plantilla_segundos     render de cada plantilla
+    maya_sql_segundos           ejecución de sentencias SQL por operación y tabla
+    maya_sesion_bytes           tamaño de la sesión cada vez que se guarda
+    maya_tramo_segundos         tramos marcados en el código (p. ej. distractores)
+    maya_cache_*_total          aciertos y fallos de las cachés, leídos al exportar
+
+Todo se guarda en contadores en memoria: observar un valor es una búsqueda
+binaria en los límites del histograma y unas sumas bajo un lock, del orden
+de un microsegundo. Con METRICAS=0 no se instala nada. /metrics solo
+responde con METRICAS_TOKEN definido (Authorization: Bearer <token>).
+
+Perfilador opcional (PERFIL_HZ=<muestras por segundo>): un hilo toma
+muestras de las pilas de todos los hilos y las acumula en formato
+"collapsed" (una línea por pila), listo para generar un flame graph desde
+/metrics/perfil. Se guardan como mucho MAX_PILAS_PERFIL pilas distintas;
+las muestras de pilas nuevas a partir de ahí se cuentan en una sola línea.
+"""
+import bisect
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Límites de los histogramas de tiempo, en segundos
+LIMITES_SEGUNDOS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                    0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LIMITES_BYTES = (64, 128, 256, 512, 1024, 2048, 3072, 4096, 8192)
+
+PROFUNDIDAD_PERFIL = 64
+MAX_PILAS_PERFIL = 10000
+PILA_DESCARTADA = '(otras pilas)'
+
+
+class Histograma:
+    __slots__ = ('limites', 'cuentas', 'suma', 'total')
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.cuentas[bisect.bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+
+class Registro:
+    """Métricas del proceso: contadores, histogramas y medidores calculados al exportar"""
+
+    def __init__(self):
+        self._definiciones = {}   # nombre -> (tipo, ayuda, límites)
+        self._valores = {}        # (nombre, etiquetas) -> número o Histograma
+        self._medidores = []      # funciones que devuelven [(nombre, etiquetas, valor)]
+        self._lock = threading.Lock()
+
+    def definir(self, nombre, tipo, ayuda, limites=None):
+        self._definiciones[nombre] = (tipo, ayuda, limites)
+
+    def incrementar(self, nombre, etiquetas=(), valor=1):
+        clave = (nombre, etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, etiquetas=()):
+        clave = (nombre, etiquetas)
+        with self._lock:
+            histograma = self._valores.get(clave)
+            if histograma is None:
+                histograma = self._valores[clave] = Histograma(self._definiciones[nombre][2])
+            histograma.observar(valor)
+
+    def medidor(self, funcion):
+        """Registrar una función que se llama al exportar y devuelve [(nombre, etiquetas, valor)]"""
+        self._medidores.append(funcion)
+
+    @contextmanager
+    def tramo(self, nombre):
+        """Medir un bloque de código en maya_tramo_segundos{tramo=nombre}"""
+        if not activas:
+            yield
+            return
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar('maya_tramo_segundos', time.perf_counter() - inicio, (('tramo', nombre),))
+
+    def exportar(self):
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)"""
+        with self._lock:
+            valores = [(nombre, etiquetas, valor if isinstance(valor, (int, float)) else
+                        (list(valor.cuentas), valor.suma, valor.total))
+                       for (nombre, etiquetas), valor in self._valores.items()]
+        for funcion in self._medidores:
+            valores.extend(funcion())
+
+        por_nombre = {}
+        for nombre, etiquetas, valor in valores:
+            por_nombre.setdefault(nombre, []).append((etiquetas, valor))
+
+        lineas = []
+        for nombre in sorted(por_nombre):
+            tipo, ayuda, limites = self._definiciones.get(nombre, ('untyped', '', None))
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for etiquetas, valor in sorted(por_nombre[nombre]):
+                if tipo != 'histogram':
+                    lineas.append(f"{nombre}{_etiquetas(etiquetas)} {valor}")
+                    continue
+                cuentas, suma, total = valor
+                acumulado = 0
+                for limite, cuenta in zip(limites + (float('inf'),), cuentas):
+                    acumulado += cuenta
+                    le = '+Inf' if limite == float('inf') else repr(limite)
+                    lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', le),))} {acumulado}")
+                lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {suma}")
+                lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {total}")
+        return '\n'.join(lineas) + '\n'
+
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ''
+    pares = ','.join(f'{clave}="{_escapar(str(valor))}"' for clave, valor in etiquetas)
+    return '{' + pares + '}'
+
+
+def _escapar(texto):
+    return texto.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registro = Registro()
+registro.definir('maya_peticion_segundos', 'histogram', 'Latencia de las peticiones por ruta', LIMITES_SEGUNDOS)
+registro.definir('maya_peticiones_total', 'counter', 'Peticiones por ruta y código de estado')
+registro.definir('maya_plantilla_segundos', 'histogram', 'Tiempo de render por plantilla', LIMITES_SEGUNDOS)
+registro.definir('maya_sql_segundos', 'histogram', 'Ejecución de sentencias SQL por operación y tabla',
+                 LIMITES_SEGUNDOS)
+registro.definir('maya_sesion_bytes', 'histogram', 'Tamaño de la sesión al guardarla', LIMITES_BYTES)
+registro.definir('maya_tramo_segundos', 'histogram', 'Tramos de código medidos', LIMITES_SEGUNDOS)
+registro.definir('maya_cache_aciertos_total', 'counter', 'Aciertos por caché')
+registro.definir('maya_cache_fallos_total', 'counter', 'Fallos por caché')
+registro.definir('maya_cola_pendientes', 'gauge', 'Eventos en la cola de escritura sin escribir')
+registro.definir('maya_sqlite_conexiones', 'gauge', 'Conexiones SQLite abiertas por el pool')
+
+activas = os.environ.get('METRICAS', '1') != '0'
+
+
+@lru_cache(maxsize=1024)
+def _etiquetas_sql(sql):
+    """(operación, tabla) de una sentencia; el texto SQL de la app es constante, se cachea"""
+    palabras = sql.replace('(', ' ').split()
+    if not palabras:
+        return (('operacion', ''), ('tabla', ''))
+    operacion = palabras[0].upper()
+    tabla = ''
+    for anterior, palabra in zip(palabras, palabras[1:]):
+        if anterior.upper() in ('FROM', 'INTO', 'UPDATE', 'TABLE'):
+            tabla = palabra
+            break
+    return (('operacion', operacion), ('tabla', tabla))
+
+
+class ConexionMedida(sqlite3.Connection):
+    """Conexión sqlite3 que mide cada execute/executemany (no incluye leer las filas)"""
+
+    def execute(self, sql, parametros=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            registro.observar('maya_sql_segundos', time.perf_counter() - inicio, _etiquetas_sql(sql))
+
+    def executemany(self, sql, parametros):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, parametros)
+        finally:
+            registro.observar('maya_sql_segundos', time.perf_counter() - inicio, _etiquetas_sql(sql))
+
+
+def instrumentar(app):
+    """Medir peticiones, plantillas y tamaño de la sesión de una aplicación Flask"""
+    from flask import before_render_template, request, request_finished, template_rendered
+
+    local = threading.local()
+
+    @app.before_request
+    def anotar_ruta():
+        request.environ['maya.ruta'] = request.endpoint
+
+    def medir_peticiones(aplicacion_wsgi):
+        def envoltura(entorno, start_response):
+            inicio = time.perf_counter()
+            estado = []
+
+            def start_response_medido(status, cabeceras, exc_info=None):
+                estado.append(status.split(' ', 1)[0])
+                return start_response(status, cabeceras, exc_info)
+
+            try:
+                return aplicacion_wsgi(entorno, start_response_medido)
+            finally:
+                ruta = entorno.get('maya.ruta') or 'sin_ruta'
+                registro.observar('maya_peticion_segundos', time.perf_counter() - inicio, (('ruta', ruta),))
+                registro.incrementar('maya_peticiones_total',
+                                     (('ruta', ruta), ('estado', estado[0] if estado else '500')))
+        return envoltura
+
+    app.wsgi_app = medir_peticiones(app.wsgi_app)
+
+    def antes_de_plantilla(sender, template, context, **extra):
+        local.inicio_plantilla = time.perf_counter()
+
+    def plantilla_renderizada(sender, template, context, **extra):
+        inicio = getattr(local, 'inicio_plantilla', None)
+        if inicio is not None:
+            registro.observar('maya_plantilla_segundos', time.perf_counter() - inicio,
+                              (('plantilla', template.name),))
+
+    before_render_template.connect(antes_de_plantilla, app, weak=False)
+    template_rendered.connect(plantilla_renderizada, app, weak=False)
+
+    if hasattr(app.session_interface, 'observar_tamano'):
+        # Sesión en el servidor: la interfaz avisa del tamaño de lo que guarda
+        app.session_interface.observar_tamano = lambda n: registro.observar('maya_sesion_bytes', n)
+    else:
+        nombre_cookie = app.config['SESSION_COOKIE_NAME'] + '='
+
+        def tamano_cookie(sender, response, **extra):
+            for cookie in response.headers.getlist('Set-Cookie'):
+                if cookie.startswith(nombre_cookie):
+                    valor = cookie.split(';', 1)[0]
+                    registro.observar('maya_sesion_bytes', len(valor) - len(nombre_cookie))
+
+        request_finished.connect(tamano_cookie, app, weak=False)
+
+
+def medir_caches(caches):
+    """Exportar aciertos/fallos de objetos con atributos `aciertos` y `fallos`"""
+    def medidor():
+        valores = []
+        for nombre, cache in caches.items():
+            valores.append(('maya_cache_aciertos_total', (('cache', nombre),), cache.aciertos))
+            valores.append(('maya_cache_fallos_total', (('cache', nombre),), cache.fallos))
+        return valores
+    registro.medidor(medidor)
+
+
+class PerfiladorMuestreo:
+    """Perfilador estadístico: muestras periódicas de las pilas de todos los hilos"""
+
+    def __init__(self, hz):
+        self.intervalo = 1 / hz
+        self.pilas = Counter()
+        self.muestras = 0
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._pid = None
+        self._lock_hilo = threading.Lock()
+
+    def arrancar(self):
+        # Como la cola de escritura: un hilo por proceso, creado ya en el worker
+        if self._hilo is not None and self._hilo.is_alive() and self._pid == os.getpid():
+            return
+        # Dos peticiones que llegan a la vez no arrancan cada una su perfilador
+        with self._lock_hilo:
+            if self._hilo is None or not self._hilo.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._hilo = threading.Thread(target=self._bucle, name='perfilador', daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        propio = threading.get_ident()
+        while True:
+            time.sleep(self.intervalo)
+            for ident, marco in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                nombres = []
+                while marco is not None and len(nombres) < PROFUNDIDAD_PERFIL:
+                    codigo = marco.f_code
+                    nombres.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+                    marco = marco.f_back
+                pila = ';'.join(reversed(nombres))
+                with self._lock:
+                    if pila not in self.pilas and len(self.pilas) >= MAX_PILAS_PERFIL:
+                        pila = PILA_DESCARTADA
+                    self.pilas[pila] += 1
+            self.muestras += 1
+
+    def exportar(self):
+        """Pilas en formato collapsed: "a;b;c cuenta" por línea, de más a menos frecuente"""
+        with self._lock:
+            pilas = self.pilas.most_common()
+        return ''.join(f"{pila} {cuenta}\n" for pila, cuenta in pilas)
@@ -0,0 +1,153 @@
+"""Migraciones del esquema de maya_kiche.db.
+
+La versión aplicada se guarda en `PRAGMA user_version`. Tanto app.py como
+kiche.py llaman a `migrar()` al conectarse, así que las dos aplicaciones
+ven siempre el mismo esquema. Para cambiar el esquema se añade una función
+al final de MIGRACIONES; nunca se modifica una ya publicada.
+"""
+
+
+def _v1_tablas_base(conn):
+    """Tablas iniciales, tal como las creaban app.py y kiche.py"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS usuarios
+                 (id INTEGER PRIMARY KEY, nombre TEXT UNIQUE, puntos INTEGER DEFAULT 0, leccion_actual INTEGER DEFAULT 1)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS progreso
+                 (usuario_id INTEGER, leccion_id INTEGER, completada BOOLEAN DEFAULT FALSE,
+                 fecha_completado DATE, FOREIGN KEY(usuario_id) REFERENCES usuarios(id))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS respuestas
+                 (usuario_id INTEGER, leccion_id INTEGER, palabra TEXT, correcta BOOLEAN,
+                 fecha TIMESTAMP, FOREIGN KEY(usuario_id) REFERENCES usuarios(id))''')
+
+
+def _v2_usuarios_unicos(conn):
+    """Reconstruir usuarios con nombre UNIQUE NOT NULL y valores por defecto.
+
+    Las bases creadas por kiche.py no tenían la restricción; si hay nombres
+    repetidos se conserva el usuario más antiguo y el progreso y las
+    respuestas de los repetidos pasan a él (v3 junta luego las filas de
+    progreso de la misma lección). Lo de los usuarios sin nombre se borra.
+    """
+    conn.execute('''CREATE TEMP TABLE usuarios_destino AS
+                 SELECT u.id AS id, (SELECT MIN(o.id) FROM usuarios o WHERE o.nombre = u.nombre) AS destino
+                 FROM usuarios u''')
+    for tabla in ('progreso', 'respuestas'):
+        conn.execute(f'''DELETE FROM {tabla} WHERE usuario_id IN
+                     (SELECT id FROM usuarios_destino WHERE destino IS NULL)''')
+        conn.execute(f'''UPDATE {tabla} SET usuario_id =
+                     (SELECT destino FROM usuarios_destino WHERE id = {tabla}.usuario_id)
+                     WHERE usuario_id IN (SELECT id FROM usuarios_destino WHERE destino != id)''')
+    conn.execute("DROP TABLE usuarios_destino")
+    conn.execute('''CREATE TABLE usuarios_nueva
+                 (id INTEGER PRIMARY KEY, nombre TEXT NOT NULL UNIQUE,
+                 puntos INTEGER NOT NULL DEFAULT 0, leccion_actual INTEGER NOT NULL DEFAULT 1)''')
+    conn.execute('''INSERT INTO usuarios_nueva (id, nombre, puntos, leccion_actual)
+                 SELECT id, nombre, COALESCE(puntos, 0), COALESCE(leccion_actual, 1) FROM usuarios
+                 WHERE id IN (SELECT MIN(id) FROM usuarios WHERE nombre IS NOT NULL GROUP BY nombre)''')
+    conn.execute("DROP TABLE usuarios")
+    conn.execute("ALTER TABLE usuarios_nueva RENAME TO usuarios")
+
+
+def _v3_progreso_clave_compuesta(conn):
+    """Una fila de progreso por (usuario_id, leccion_id)"""
+    conn.execute('''CREATE TABLE progreso_nueva
+                 (usuario_id INTEGER NOT NULL, leccion_id INTEGER NOT NULL,
+                 completada BOOLEAN NOT NULL DEFAULT FALSE, fecha_completado DATE,
+                 PRIMARY KEY (usuario_id, leccion_id),
+                 FOREIGN KEY(usuario_id) REFERENCES usuarios(id)) WITHOUT ROWID''')
+    conn.execute('''INSERT INTO progreso_nueva (usuario_id, leccion_id, completada, fecha_completado)
+                 SELECT usuario_id, leccion_id, MAX(COALESCE(completada, 0)), MAX(fecha_completado)
+                 FROM progreso WHERE usuario_id IS NOT NULL AND leccion_id IS NOT NULL
+                 GROUP BY usuario_id, leccion_id''')
+    conn.execute("DROP TABLE progreso")
+    conn.execute("ALTER TABLE progreso_nueva RENAME TO progreso")
+
+
+def _v4_indices(conn):
+    """Índices para las consultas y borrados por usuario o lección"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_progreso_leccion ON progreso(leccion_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_respuestas_usuario ON respuestas(usuario_id)")
+
+
+def _v5_indice_nombre(conn):
+    """Índice sin distinción de mayúsculas para buscar usuarios por prefijo con LIKE"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_nombre_nocase ON usuarios(nombre COLLATE NOCASE)")
+
+
+def _v6_repaso(conn):
+    """Estado de repetición espaciada por usuario, lección y palabra"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS repaso
+                 (usuario_id INTEGER NOT NULL, leccion_id INTEGER NOT NULL, palabra TEXT NOT NULL,
+                 caja INTEGER NOT NULL DEFAULT 0, facilidad REAL NOT NULL DEFAULT 2.5,
+                 intervalo REAL NOT NULL DEFAULT 0, proxima REAL NOT NULL DEFAULT 0,
+                 PRIMARY KEY (usuario_id, leccion_id, palabra),
+                 FOREIGN KEY(usuario_id) REFERENCES usuarios(id)) WITHOUT ROWID''')
+
+
+def _v7_estadisticas(conn):
+    """Agregados por usuario para la clasificación, mantenidos al escribir el progreso"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS estadisticas
+                 (usuario_id INTEGER PRIMARY KEY, puntos INTEGER NOT NULL DEFAULT 0,
+                 respuestas INTEGER NOT NULL DEFAULT 0, aciertos INTEGER NOT NULL DEFAULT 0,
+                 lecciones INTEGER NOT NULL DEFAULT 0, actualizado REAL NOT NULL DEFAULT 0,
+                 FOREIGN KEY(usuario_id) REFERENCES usuarios(id))''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_estadisticas_actualizado ON estadisticas(actualizado)")
+    conn.execute('''INSERT OR REPLACE INTO estadisticas
+                 (usuario_id, puntos, respuestas, aciertos, lecciones, actualizado)
+                 SELECT u.id, u.puntos,
+                        (SELECT COUNT(*) FROM respuestas r WHERE r.usuario_id = u.id),
+                        (SELECT COUNT(*) FROM respuestas r WHERE r.usuario_id = u.id AND r.correcta),
+                        (SELECT COUNT(*) FROM progreso p WHERE p.usuario_id = u.id AND p.completada),
+                        CAST(strftime('%s', 'now') AS REAL)
+                 FROM usuarios u''')
+
+
+def _v8_sesiones(conn):
+    """Sesiones en el servidor (SESSION_BACKEND=sqlite), compartidas entre workers"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS sesiones
+                 (id TEXT PRIMARY KEY, datos TEXT NOT NULL, expira REAL NOT NULL)''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sesiones_expira ON sesiones(expira)")
+
+
+MIGRACIONES = [
+    _v1_tablas_base,
+    _v2_usuarios_unicos,
+    _v3_progreso_clave_compuesta,
+    _v4_indices,
+    _v5_indice_nombre,
+    _v6_repaso,
+    _v7_estadisticas,
+    _v8_sesiones,
+]
+
+VERSION_ACTUAL = len(MIGRACIONES)
+
+
+def version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar(conn, hasta=VERSION_ACTUAL):
+    """Aplicar las migraciones pendientes y devolver la versión final.
+
+    Cada migración corre en su propia transacción `BEGIN IMMEDIATE`, así que
+    si varios workers arrancan a la vez solo uno la aplica; los demás
+    esperan el bloqueo (busy_timeout) y vuelven a leer la versión.
+    """
+    if conn.in_transaction:
+        conn.commit()
+
+    while version(conn) < hasta:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            actual = version(conn)
+            if actual >= hasta:
+                conn.rollback()
+                break
+            MIGRACIONES[actual](conn)
+            conn.execute(f"PRAGMA user_version = {actual + 1}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    return version(conn)
@@ -0,0 +1,47 @@
+import hashlib
+
+from flask import current_app, render_template, request, session
+
+from sesiones import AlmacenMemoria
+
+# Las páginas dependen de la versión del catálogo, no del tiempo: el TTL
+# solo evita conservar versiones viejas para siempre
+TTL_PAGINAS = 24 * 3600
+
+
+class CachePaginas:
+    """Caché de páginas renderizadas con ETag fuerte y respuestas 304.
+
+    La clave la elige cada ruta (plantilla, versión del catálogo y los pocos
+    datos del usuario que aparezcan en la página). Las páginas con mensajes
+    flash pendientes se renderizan siempre y no se guardan.
+    """
+
+    def __init__(self, capacidad=64):
+        self._paginas = AlmacenMemoria(capacidad)
+        self.aciertos = 0
+        self.fallos = 0
+
+    def responder(self, clave, plantilla, **contexto):
+        """Devolver la página `plantilla`, desde la caché si es posible"""
+        if session.get('_flashes') or current_app.jinja_env.auto_reload:
+            return render_template(plantilla, **contexto)
+
+        pagina = self._paginas.obtener(clave)
+        if pagina is None:
+            self.fallos += 1
+            cuerpo = render_template(plantilla, **contexto).encode('utf-8')
+            pagina = (cuerpo, hashlib.sha256(cuerpo).hexdigest()[:32])
+            self._paginas.guardar(clave, pagina, TTL_PAGINAS)
+        else:
+            self.aciertos += 1
+
+        cuerpo, etag = pagina
+        respuesta = current_app.response_class(cuerpo, mimetype='text/html')
+        respuesta.set_etag(etag)
+        # El navegador guarda la página pero la revalida siempre (304 si no cambió)
+        respuesta.headers['Cache-Control'] = 'private, no-cache'
+        return respuesta.make_conditional(request)
+
+    def limpiar(self):
+        self._paginas.limpiar()
@@ -0,0 +1,293 @@
+"""Paquete binario de lecciones para arrancar workers sin parsear JSON.
+
+Compilar (paso offline, tras editar el JSON):
+    python paquete.py [lecciones_maya_kiche.json] [lecciones_maya_kiche.pack]
+
+El paquete se abre con mmap y se lee sin copiar: las tablas son arrays de
+enteros de 32 bits sobre el propio archivo y los textos se decodifican solo
+al usarlos. Como todas las cadenas se guardan una sola vez (internadas) y
+las páginas del archivo viven en la caché del sistema operativo, varios
+workers de gunicorn comparten la misma memoria.
+
+Formato (enteros en el orden de bytes de la máquina que compila):
+    cabecera       MAGIA, versión, orden de bytes, SHA-256 del JSON, conteos
+                   y desplazamientos de cada sección
+    textos         (n_textos + 1) desplazamientos + bytes UTF-8
+    niveles        (nombre, primera lección, cantidad)
+    lecciones      (id, título, tipo, inicio palabras, n palabras,
+                    inicio distintas, n distintas)
+    palabras       (maya, español, imagen, audio)
+    distintas      índices de texto de las respuestas maya sin duplicados
+
+Solo se guardan los campos que usa la aplicación; cualquier otro campo del
+JSON se ignora.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from collections.abc import Sequence
+
+from diccionario import Diccionario
+from ejercicios import respuestas_distintas
+from escritura import RespuestasEscritas
+
+MAGIA = b'MKPK'
+VERSION_FORMATO = 2
+CABECERA = struct.Struct('<4sHB x32s5I6I')
+SIN_TEXTO = 0xFFFFFFFF
+
+CAMPOS_LECCION = 7
+CAMPOS_PALABRA = 4
+
+
+def ruta_paquete(ruta_json):
+    """Ruta del paquete compilado que corresponde a un archivo JSON"""
+    return os.path.splitext(ruta_json)[0] + '.pack'
+
+
+def huella_paquete(ruta):
+    """SHA-256 del JSON del que se compiló el paquete, o None si no es válido"""
+    try:
+        with open(ruta, 'rb') as f:
+            cabecera = f.read(CABECERA.size)
+        magia, version_formato, _, huella, *_ = CABECERA.unpack(cabecera)
+    except (OSError, struct.error):
+        return None
+    if magia != MAGIA or version_formato != VERSION_FORMATO:
+        return None
+    return huella.hex()
+
+
+def compilar(lecciones, huella):
+    """Convertir el catálogo (ya validado) en los bytes del paquete"""
+    textos = {}
+
+    def indice(texto):
+        if texto is None:
+            return SIN_TEXTO
+        return textos.setdefault(texto, len(textos))
+
+    niveles = array('I')
+    tabla_lecciones = array('i')
+    palabras = array('I')
+    distintas = array('I')
+
+    n_lecciones = 0
+    for nivel, lecciones_nivel in lecciones.items():
+        niveles.extend((indice(nivel), n_lecciones, len(lecciones_nivel)))
+        for leccion in lecciones_nivel:
+            contenido = leccion['contenido']
+            inicio_palabras = len(palabras) // CAMPOS_PALABRA
+            for palabra in contenido:
+                palabras.extend((indice(palabra['maya']), indice(palabra['espanol']),
+                                 indice(palabra.get('imagen')), indice(palabra.get('audio'))))
+            inicio_distintas = len(distintas)
+            unicas = respuestas_distintas(p['maya'] for p in contenido)
+            distintas.extend(indice(texto) for texto in unicas)
+            tabla_lecciones.extend((leccion['id'], indice(leccion['titulo']), indice(leccion['tipo']),
+                                    inicio_palabras, len(contenido), inicio_distintas, len(unicas)))
+            n_lecciones += 1
+
+    codificados = [texto.encode('utf-8') for texto in textos]
+    desplazamientos = array('I', [0])
+    for datos in codificados:
+        desplazamientos.append(desplazamientos[-1] + len(datos))
+    datos_textos = b''.join(codificados)
+    datos_textos += b'\0' * (-len(datos_textos) % 4)
+
+    secciones = [desplazamientos.tobytes(), datos_textos, niveles.tobytes(),
+                 tabla_lecciones.tobytes(), palabras.tobytes(), distintas.tobytes()]
+    posiciones = []
+    posicion = CABECERA.size
+    for seccion in secciones:
+        posiciones.append(posicion)
+        posicion += len(seccion)
+
+    cabecera = CABECERA.pack(
+        MAGIA, VERSION_FORMATO, 0 if sys.byteorder == 'little' else 1, bytes.fromhex(huella),
+        len(textos), len(niveles) // 3, n_lecciones, len(palabras) // CAMPOS_PALABRA, len(distintas),
+        *posiciones)
+    return cabecera + b''.join(secciones)
+
+
+def compilar_archivo(ruta_json, destino=None):
+    """Compilar un JSON de lecciones y escribir el paquete de forma atómica"""
+    from catalogo import validar_lecciones
+
+    destino = destino or ruta_paquete(ruta_json)
+    with open(ruta_json, 'rb') as f:
+        datos = f.read()
+    lecciones = validar_lecciones(json.loads(datos.decode('utf-8')))
+    contenido = compilar(lecciones, hashlib.sha256(datos).hexdigest())
+
+    temporal = destino + '.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(contenido)
+    os.replace(temporal, destino)
+    return destino
+
+
+class TextosPaquete(Sequence):
+    """Secuencia de textos del paquete; cada uno se decodifica al pedirlo"""
+
+    def __init__(self, paquete, indices):
+        self._paquete = paquete
+        self._indices = indices
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __getitem__(self, posicion):
+        if isinstance(posicion, slice):
+            return tuple(self._paquete.texto(i) for i in self._indices[posicion])
+        return self._paquete.texto(self._indices[posicion])
+
+
+class ContenidoPaquete(Sequence):
+    """Vista de `contenido` de una lección: cada palabra es un dict al pedirla"""
+
+    def __init__(self, paquete, inicio, cantidad):
+        self._paquete = paquete
+        self._inicio = inicio
+        self._cantidad = cantidad
+
+    def __len__(self):
+        return self._cantidad
+
+    def __getitem__(self, posicion):
+        if isinstance(posicion, slice):
+            return [self[i] for i in range(*posicion.indices(self._cantidad))]
+        if posicion < 0:
+            posicion += self._cantidad
+        if not 0 <= posicion < self._cantidad:
+            raise IndexError(posicion)
+        base = (self._inicio + posicion) * CAMPOS_PALABRA
+        maya, espanol, imagen, audio = self._paquete.palabras[base:base + CAMPOS_PALABRA]
+        texto = self._paquete.texto
+        palabra = {"maya": texto(maya), "espanol": texto(espanol)}
+        if imagen != SIN_TEXTO:
+            palabra["imagen"] = texto(imagen)
+        if audio != SIN_TEXTO:
+            palabra["audio"] = texto(audio)
+        return palabra
+
+
+class LeccionPaquete:
+    """Lección leída del paquete, con la misma interfaz de dict que la del JSON"""
+
+    __slots__ = ('_paquete', '_fila')
+
+    def __init__(self, paquete, fila):
+        self._paquete = paquete
+        self._fila = fila
+
+    def _campo(self, n):
+        return self._paquete.lecciones[self._fila * CAMPOS_LECCION + n]
+
+    def __getitem__(self, campo):
+        if campo == 'id':
+            return self._campo(0)
+        if campo == 'titulo':
+            return self._paquete.texto(self._campo(1))
+        if campo == 'tipo':
+            return self._paquete.texto(self._campo(2))
+        if campo == 'contenido':
+            return ContenidoPaquete(self._paquete, self._campo(3), self._campo(4))
+        raise KeyError(campo)
+
+    def get(self, campo, defecto=None):
+        try:
+            return self[campo]
+        except KeyError:
+            return defecto
+
+    def distintas(self):
+        inicio, cantidad = self._campo(5), self._campo(6)
+        return TextosPaquete(self._paquete, self._paquete.distintas[inicio:inicio + cantidad])
+
+
+class CatalogoPaquete:
+    """Catálogo con la interfaz de CatalogoLecciones, leído de un paquete con mmap"""
+
+    def __init__(self, ruta):
+        with open(ruta, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        vista = memoryview(self._mmap)
+
+        (magia, version_formato, orden, huella, n_textos, n_niveles, n_lecciones, n_palabras,
+         n_distintas, *posiciones) = CABECERA.unpack_from(vista)
+        if magia != MAGIA or version_formato != VERSION_FORMATO:
+            raise ValueError(f"{ruta} no es un paquete de lecciones compatible")
+        if orden != (0 if sys.byteorder == 'little' else 1):
+            raise ValueError(f"{ruta} se compiló con otro orden de bytes")
+        self.version = huella.hex()
+
+        p_desplazamientos, p_textos, p_niveles, p_lecciones, p_palabras, p_distintas = posiciones
+        self._desplazamientos = vista[p_desplazamientos:p_textos].cast('I')
+        self._textos = vista[p_textos:p_niveles]
+        niveles = vista[p_niveles:p_lecciones].cast('I')
+        self.lecciones = vista[p_lecciones:p_palabras].cast('i')
+        self.palabras = vista[p_palabras:p_distintas].cast('I')
+        self.distintas = vista[p_distintas:p_distintas + 4 * n_distintas].cast('I')
+
+        self.por_nivel = {}
+        self.por_id = {}
+        self._escritas = {}
+        self._diccionario = None
+        self._lock_diccionario = threading.Lock()
+        for n in range(n_niveles):
+            nombre, primera, cantidad = niveles[n * 3:n * 3 + 3]
+            filas = [LeccionPaquete(self, fila) for fila in range(primera, primera + cantidad)]
+            self.por_nivel[self.texto(nombre)] = filas
+            for leccion in filas:
+                self.por_id[leccion['id']] = leccion
+
+    def texto(self, indice):
+        if indice == SIN_TEXTO:
+            return None
+        return str(self._textos[self._desplazamientos[indice]:self._desplazamientos[indice + 1]], 'utf-8')
+
+    def leccion(self, leccion_id):
+        """Devolver la lección con ese id, o None si no existe"""
+        return self.por_id.get(leccion_id)
+
+    def palabras_maya(self, leccion_id):
+        return tuple(p['maya'] for p in self.por_id[leccion_id]['contenido'])
+
+    def palabras_espanol(self, leccion_id):
+        return tuple(p['espanol'] for p in self.por_id[leccion_id]['contenido'])
+
+    def respuestas_distintas(self, leccion_id):
+        return self.por_id[leccion_id].distintas()
+
+    def respuestas_escritas(self, leccion_id):
+        escritas = self._escritas.get(leccion_id)
+        if escritas is None:
+            escritas = self._escritas[leccion_id] = RespuestasEscritas(self.palabras_maya(leccion_id))
+        return escritas
+
+    def diccionario(self):
+        """Índice de búsqueda del vocabulario (diccionario.py), construido en la primera búsqueda"""
+        if self._diccionario is None:
+            # Bajo el lock: peticiones simultáneas no construyen cada una el suyo
+            with self._lock_diccionario:
+                if self._diccionario is None:
+                    self._diccionario = Diccionario(self)
+        return self._diccionario
+
+    def __contains__(self, leccion_id):
+        return leccion_id in self.por_id
+
+    def __len__(self):
+        return len(self.por_id)
+
+
+if __name__ == '__main__':
+    origen = sys.argv[1] if len(sys.argv) > 1 else 'lecciones_maya_kiche.json'
+    destino = sys.argv[2] if len(sys.argv) > 2 else None
+    print(f"Paquete escrito en {compilar_archivo(origen, destino)}")
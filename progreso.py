@@ -0,0 +1,181 @@
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+from itertools import groupby
+from operator import itemgetter
+
+from repaso import SQL_GUARDAR as SQL_REPASO, fila_estado
+
+logger = logging.getLogger(__name__)
+
+# Reintentos de un lote que no se pudo escribir (base bloqueada), con espera exponencial
+REINTENTOS = 4
+ESPERA_REINTENTO = 0.1
+
+SQL_RESPUESTA = '''INSERT INTO respuestas (usuario_id, leccion_id, palabra, correcta, fecha)
+                   VALUES (?, ?, ?, ?, ?)'''
+SQL_PUNTOS = "UPDATE usuarios SET puntos = COALESCE(puntos, 0) + ? WHERE id = ?"
+SQL_ESTADISTICAS_RESPUESTA = '''INSERT INTO estadisticas (usuario_id, puntos, respuestas, aciertos, actualizado)
+                                VALUES (?, ?, 1, ?, ?)
+                                ON CONFLICT(usuario_id) DO UPDATE SET
+                                puntos = puntos + excluded.puntos, respuestas = respuestas + 1,
+                                aciertos = aciertos + excluded.aciertos, actualizado = excluded.actualizado'''
+# Se recuenta en vez de sumar 1: repetir una lección completada no cuenta dos veces
+SQL_ESTADISTICAS_LECCIONES = '''INSERT INTO estadisticas (usuario_id, lecciones, actualizado)
+                                VALUES (?1, (SELECT COUNT(*) FROM progreso WHERE usuario_id = ?1 AND completada), ?2)
+                                ON CONFLICT(usuario_id) DO UPDATE SET
+                                lecciones = excluded.lecciones, actualizado = excluded.actualizado'''
+SQL_COMPLETADA = '''INSERT INTO progreso (usuario_id, leccion_id, completada, fecha_completado)
+                    VALUES (?, ?, 1, ?)
+                    ON CONFLICT(usuario_id, leccion_id)
+                    DO UPDATE SET completada = 1, fecha_completado = excluded.fecha_completado'''
+
+
+class ColaEscritura:
+    """Cola de escritura diferida (write-behind) hacia la base de datos.
+
+    Las rutas encolan eventos y vuelven enseguida; un hilo de fondo los
+    agrupa y los escribe en una sola transacción cada `intervalo_ms` o
+    cuando se juntan `max_eventos`, lo que ocurra primero. Así ninguna
+    respuesta espera un fsync de SQLite.
+    """
+
+    def __init__(self, pool, intervalo_ms=200, max_eventos=500):
+        self.db = pool
+        self.intervalo = intervalo_ms / 1000
+        self.max_eventos = max_eventos
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # Eventos sin escribir de cada usuario, para vaciar_usuario()
+        self._por_usuario = Counter()
+        self._lock_usuarios = threading.Lock()
+        atexit.register(self.cerrar)
+
+    def registrar_respuesta(self, usuario_id, leccion_id, palabra, correcta, puntos=0):
+        """Guardar una respuesta y sumar al usuario los puntos ganados con ella"""
+        self._encolar(usuario_id, SQL_RESPUESTA, (usuario_id, leccion_id, palabra, bool(correcta),
+                                                  datetime.now().isoformat(timespec='seconds')))
+        if puntos:
+            self._encolar(usuario_id, SQL_PUNTOS, (puntos, usuario_id))
+        # Agregados de la clasificación, en la misma transacción que la respuesta
+        self._encolar(usuario_id, SQL_ESTADISTICAS_RESPUESTA,
+                      (usuario_id, puntos, int(bool(correcta)), time.time()))
+
+    def registrar_leccion_completada(self, usuario_id, leccion_id):
+        self._encolar(usuario_id, SQL_COMPLETADA, (usuario_id, leccion_id, date.today().isoformat()))
+        self._encolar(usuario_id, SQL_ESTADISTICAS_LECCIONES, (usuario_id, time.time()))
+
+    def registrar_repaso(self, usuario_id, leccion_id, palabra, estado):
+        """Guardar el estado de repetición espaciada de una palabra"""
+        self._encolar(usuario_id, SQL_REPASO, fila_estado(usuario_id, leccion_id, palabra, estado))
+
+    def pendientes(self):
+        """Eventos encolados que aún no se han escrito (aproximado)"""
+        return self._cola.qsize()
+
+    def vaciar(self, timeout=5):
+        """Esperar a que todo lo encolado hasta ahora esté escrito"""
+        if self._hilo is None or not self._hilo.is_alive():
+            return
+        listo = threading.Event()
+        self._cola.put(listo)
+        listo.wait(timeout)
+
+    def vaciar_usuario(self, usuario_id, timeout=5):
+        """Como vaciar(), pero sin esperar si ese usuario no tiene nada pendiente"""
+        with self._lock_usuarios:
+            pendientes = self._por_usuario[usuario_id]
+        if pendientes:
+            self.vaciar(timeout)
+
+    def cerrar(self, timeout=5):
+        """Escribir lo pendiente y detener el hilo de fondo"""
+        hilo = self._hilo
+        if hilo is None or not hilo.is_alive() or self._pid != os.getpid():
+            return
+        self._cola.put(None)
+        hilo.join(timeout)
+
+    def _encolar(self, usuario_id, sql, parametros):
+        self._asegurar_hilo()
+        with self._lock_usuarios:
+            self._por_usuario[usuario_id] += 1
+        self._cola.put((sql, parametros, usuario_id))
+
+    def _asegurar_hilo(self):
+        # El hilo se arranca en el primer evento, ya dentro del worker de gunicorn
+        if self._hilo is not None and self._hilo.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._hilo = threading.Thread(target=self._bucle, name='cola-escritura', daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        terminar = False
+        while not terminar:
+            lote, avisos = [], []
+            evento = self._cola.get()
+            limite = time.monotonic() + self.intervalo
+            while True:
+                if evento is None:
+                    terminar = True
+                elif isinstance(evento, threading.Event):
+                    avisos.append(evento)
+                else:
+                    lote.append(evento)
+
+                # Quien espera en vaciar() no debe esperar al intervalo
+                if terminar or avisos or len(lote) >= self.max_eventos:
+                    break
+                restante = limite - time.monotonic()
+                try:
+                    evento = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                except queue.Empty:
+                    break
+
+            if lote:
+                self._escribir(lote)
+            for aviso in avisos:
+                aviso.set()
+
+    def _escribir(self, lote):
+        """Escribir un lote en una sola transacción, en el orden de la cola.
+
+        Las sentencias iguales seguidas van en un solo executemany, pero no se
+        reordenan: SQL_ESTADISTICAS_LECCIONES recuenta lo que dejó SQL_COMPLETADA.
+        Si la base está ocupada se reintenta hasta REINTENTOS veces (0,1 s, 0,2 s,
+        ... de espera); solo entonces se da el lote por perdido.
+        """
+        try:
+            # Un bloqueo pasajero (otro worker, kiche.py, una migración) no debe perder
+            # respuestas: se reintenta aquí mismo, sin alterar el orden de la cola
+            for intento in range(REINTENTOS + 1):
+                try:
+                    with self.db.transaccion() as conn:
+                        for sql, eventos in groupby(lote, key=itemgetter(0)):
+                            conn.executemany(sql, [parametros for _, parametros, _ in eventos])
+                    break
+                except sqlite3.OperationalError:
+                    if intento == REINTENTOS:
+                        raise
+                    logger.warning("Base de datos ocupada; reintento %d de escribir %d eventos",
+                                   intento + 1, len(lote))
+                    time.sleep(ESPERA_REINTENTO * 2 ** intento)
+        except Exception:
+            logger.exception("No se pudo escribir un lote de %d eventos de progreso", len(lote))
+        finally:
+            with self._lock_usuarios:
+                for _, _, usuario_id in lote:
+                    self._por_usuario[usuario_id] -= 1
+                    if not self._por_usuario[usuario_id]:
+                        del self._por_usuario[usuario_id]
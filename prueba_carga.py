@@ -0,0 +1,363 @@
+"""Prueba de carga del recorrido completo de un estudiante.
+
+Cada usuario virtual hace lo mismo que una persona en el navegador:
+registro -> lecciones -> iniciar_leccion -> ejercicios (GET + POST) hasta
+completar la lección o quedarse sin vidas -> eliminar_usuario.
+
+Uso:
+    python prueba_carga.py                          # arranca gunicorn local (sync)
+    python prueba_carga.py --modo asgi --workers 2  # arranca el modo ASGI
+    python prueba_carga.py --url http://127.0.0.1:8000 --usuarios 200 --concurrencia 20
+    python prueba_carga.py --guardar base.json      # guardar la referencia
+    python prueba_carga.py --comparar base.json     # sale con código 1 si hay regresión
+
+Informa de p50/p99 por paso, peticiones por segundo, errores y respuestas
+429, y de la contención en la base de datos a partir de /metrics (tiempo
+de las sentencias de escritura y cola de escritura pendiente). Los
+micro-benchmarks (catálogo, generación de ejercicios...) están en
+benchmarks.py.
+"""
+import argparse
+import html
+import http.client
+import json
+import os
+import random
+import re
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from catalogo import cargar_lecciones, CatalogoLecciones
+
+PASOS = ('registro', 'lecciones', 'iniciar_leccion', 'ejercicio_get', 'ejercicio_post', 'eliminar_usuario')
+
+# Una regresión es un p99 o un rendimiento que empeora más que esto
+TOLERANCIA = 0.20
+
+
+def arrancar_servidor(comando, entorno_extra, puerto, workers=1):
+    """Arrancar gunicorn con una base de datos temporal y esperar a que acepte conexiones"""
+    raiz = os.path.dirname(os.path.abspath(__file__))
+    ruta_db = os.path.join(tempfile.mkdtemp(prefix='maya_carga_'), 'carga.db')
+    entorno = dict(os.environ, MAYA_KICHE_DB=ruta_db, **entorno_extra)
+    proceso = subprocess.Popen(comando + ['-b', f'127.0.0.1:{puerto}', '-w', str(workers)], env=entorno,
+                               cwd=raiz, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=0.1).close()
+            return proceso
+        except OSError:
+            time.sleep(0.1)
+    proceso.kill()
+    raise RuntimeError(f"El servidor no arrancó: {' '.join(comando)}")
+
+
+class Navegador:
+    """Cliente HTTP mínimo con keep-alive y la cookie de sesión, como un navegador"""
+
+    def __init__(self, anfitrion, puerto, resultados):
+        self.anfitrion = anfitrion
+        self.puerto = puerto
+        self.resultados = resultados
+        self.cookies = {}
+        self._conexion = None
+
+    def pedir(self, paso, metodo, ruta, datos=None):
+        """Hacer una petición y anotar su latencia en `paso`; devuelve (estado, cabeceras, cuerpo)"""
+        cuerpo = urlencode(datos).encode() if datos is not None else None
+        cabeceras = {'Accept-Encoding': 'identity'}
+        if cuerpo is not None:
+            cabeceras['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            cabeceras['Cookie'] = '; '.join(f"{k}={v}" for k, v in self.cookies.items())
+
+        inicio = time.perf_counter()
+        for intento in range(2):
+            if self._conexion is None:
+                self._conexion = http.client.HTTPConnection(self.anfitrion, self.puerto, timeout=30)
+            try:
+                self._conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+                respuesta = self._conexion.getresponse()
+                contenido = respuesta.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # Conexión keep-alive cerrada por el servidor: se reintenta una vez
+                self._conexion.close()
+                self._conexion = None
+                if intento:
+                    self.resultados.anotar(paso, time.perf_counter() - inicio, 0)
+                    raise
+        self.resultados.anotar(paso, time.perf_counter() - inicio, respuesta.status)
+
+        for cabecera in respuesta.headers.get_all('Set-Cookie') or ():
+            nombre, _, resto = cabecera.partition('=')
+            valor = resto.split(';', 1)[0]
+            if 'expires=Thu, 01 Jan 1970' in cabecera:
+                self.cookies.pop(nombre, None)
+            else:
+                self.cookies[nombre] = valor
+        return respuesta.status, respuesta.headers, contenido.decode('utf-8', 'replace')
+
+    def cerrar(self):
+        if self._conexion is not None:
+            self._conexion.close()
+
+
+class Resultados:
+    """Latencias por paso y códigos de estado, compartidos entre hilos"""
+
+    def __init__(self):
+        self.latencias = {paso: [] for paso in PASOS}
+        self.estados = {}
+        self._lock = threading.Lock()
+
+    def anotar(self, paso, segundos, estado):
+        with self._lock:
+            self.latencias[paso].append(segundos)
+            self.estados[estado] = self.estados.get(estado, 0) + 1
+
+    def total(self):
+        return sum(len(lista) for lista in self.latencias.values())
+
+
+def percentil(ordenadas, p):
+    if not ordenadas:
+        return float('nan')
+    return ordenadas[min(len(ordenadas) - 1, int(p / 100 * len(ordenadas)))]
+
+
+def recorrido(navegador, nombre, catalogo, leccion_id, acierto):
+    """El recorrido completo de un usuario virtual"""
+    navegador.pedir('registro', 'POST', '/registro', {'nombre': nombre})
+    navegador.pedir('lecciones', 'GET', '/lecciones')
+    navegador.pedir('iniciar_leccion', 'GET', f'/leccion/{leccion_id}')
+
+    # Con el catálogo local el usuario virtual "se sabe" la palabra que pregunta la página
+    respuestas = None
+    if catalogo:
+        respuestas = {}
+        for palabra in catalogo.leccion(leccion_id)['contenido']:
+            respuestas.setdefault(palabra['espanol'], palabra['maya'])
+    _, _, pagina = navegador.pedir('ejercicio_get', 'GET', '/ejercicio')
+    for _ in range(100):
+        ficha = re.search(r'name="ficha" value="([^"]*)"', pagina)
+        opciones = re.findall(r'name="respuesta" value="([^"]*)"', pagina)
+        if not ficha or not opciones:
+            break
+        ficha = html.unescape(ficha.group(1))
+        respuesta = html.unescape(random.choice(opciones))
+        pregunta = re.search(r'id="palabra">([^<]*)<', pagina)
+        if respuestas is not None and pregunta and random.random() < acierto:
+            respuesta = respuestas.get(html.unescape(pregunta.group(1)), respuesta)
+        estado, cabeceras, pagina = navegador.pedir('ejercicio_post', 'POST', '/ejercicio',
+                                                    {'ficha': ficha, 'respuesta': respuesta})
+        if estado == 302:
+            destino = urlsplit(cabeceras['Location']).path
+            if destino != '/ejercicio':
+                break
+            _, _, pagina = navegador.pedir('ejercicio_get', 'GET', destino)
+        elif estado != 200:
+            break
+
+    navegador.pedir('eliminar_usuario', 'POST', '/eliminar_usuario', {})
+
+
+def leer_metricas(anfitrion, puerto, token=None):
+    """Sumas y conteos de maya_sql_segundos y la cola pendiente, desde /metrics"""
+    conexion = http.client.HTTPConnection(anfitrion, puerto, timeout=10)
+    cabeceras = {'Authorization': f'Bearer {token}'} if token else {}
+    try:
+        conexion.request('GET', '/metrics', headers=cabeceras)
+        respuesta = conexion.getresponse()
+        texto = respuesta.read().decode()
+    except OSError:
+        return None
+    finally:
+        conexion.close()
+    if respuesta.status != 200:
+        return None
+
+    metricas = {}
+    for linea in texto.splitlines():
+        coincidencia = re.match(r'maya_sql_segundos_(sum|count)\{operacion="(\w+)",tabla="(\w*)"\} (\S+)', linea)
+        if coincidencia:
+            tipo, operacion, tabla, valor = coincidencia.groups()
+            metricas.setdefault((operacion, tabla), {})[tipo] = float(valor)
+        elif linea.startswith('maya_cola_pendientes '):
+            metricas['cola'] = float(linea.split()[1])
+    return metricas
+
+
+def ejecutar(anfitrion, puerto, usuarios, concurrencia, acierto, catalogo, token=None):
+    """Lanzar `usuarios` recorridos con `concurrencia` hilos; devolver el informe como dict"""
+    resultados = Resultados()
+    antes = leer_metricas(anfitrion, puerto, token)
+    pendientes = list(range(usuarios))
+    lock = threading.Lock()
+    errores = []
+    cola_maxima = [0.0]
+    terminado = threading.Event()
+    lecciones = list(catalogo.por_id) if catalogo else [1]
+    prefijo = f"carga{os.getpid()}_{int(time.time())}"
+
+    def trabajador():
+        while True:
+            with lock:
+                if not pendientes:
+                    return
+                numero = pendientes.pop()
+            navegador = Navegador(anfitrion, puerto, resultados)
+            try:
+                recorrido(navegador, f"{prefijo}_{numero}", catalogo, random.choice(lecciones), acierto)
+            except Exception as e:
+                errores.append(repr(e))
+            finally:
+                navegador.cerrar()
+
+    def vigilar_cola():
+        # Con varios workers /metrics responde uno cualquiera: es una muestra
+        while not terminado.wait(0.5):
+            actuales = leer_metricas(anfitrion, puerto, token)
+            if actuales and 'cola' in actuales:
+                cola_maxima[0] = max(cola_maxima[0], actuales['cola'])
+
+    vigilante = threading.Thread(target=vigilar_cola, daemon=True)
+    vigilante.start()
+    hilos = [threading.Thread(target=trabajador) for _ in range(concurrencia)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+    terminado.set()
+    despues = leer_metricas(anfitrion, puerto, token)
+
+    informe = {
+        'usuarios': usuarios,
+        'concurrencia': concurrencia,
+        'duracion_s': round(duracion, 3),
+        'peticiones': resultados.total(),
+        'peticiones_por_s': round(resultados.total() / duracion, 1),
+        'recorridos_por_s': round(usuarios / duracion, 2),
+        'estados': {str(k): v for k, v in sorted(resultados.estados.items())},
+        'errores': len(errores),
+        'pasos': {},
+    }
+    for paso, latencias in resultados.latencias.items():
+        latencias.sort()
+        informe['pasos'][paso] = {
+            'n': len(latencias),
+            'p50_ms': round(percentil(latencias, 50) * 1000, 2),
+            'p99_ms': round(percentil(latencias, 99) * 1000, 2),
+        }
+
+    if antes is not None and despues is not None:
+        sql = {}
+        for clave, valores in despues.items():
+            if clave == 'cola':
+                continue
+            previos = antes.get(clave, {})
+            cuenta = valores.get('count', 0) - previos.get('count', 0)
+            if cuenta:
+                suma = valores.get('sum', 0) - previos.get('sum', 0)
+                sql[f"{clave[0]} {clave[1]}".strip()] = {'n': int(cuenta), 'media_ms': round(suma / cuenta * 1000, 3)}
+        informe['sql'] = sql
+        informe['cola_maxima'] = cola_maxima[0]
+    if errores:
+        informe['primer_error'] = errores[0]
+    return informe
+
+
+def imprimir(informe):
+    print(f"{informe['usuarios']} usuarios, concurrencia {informe['concurrencia']}: "
+          f"{informe['peticiones']} peticiones en {informe['duracion_s']:.1f} s "
+          f"({informe['peticiones_por_s']:.0f} pet/s, {informe['recorridos_por_s']:.1f} recorridos/s)")
+    print(f"estados: {informe['estados']}  errores: {informe['errores']}")
+    print(f"{'paso':<18} {'n':>7} {'p50 ms':>9} {'p99 ms':>9}")
+    for paso, datos in informe['pasos'].items():
+        print(f"{paso:<18} {datos['n']:>7} {datos['p50_ms']:>9.2f} {datos['p99_ms']:>9.2f}")
+    if 'sql' in informe:
+        print(f"SQL por llamada a execute/executemany (de /metrics; cola de escritura máxima: {informe['cola_maxima']:.0f})")
+        for sentencia, datos in sorted(informe['sql'].items(), key=lambda e: -e[1]['n'] * e[1]['media_ms']):
+            print(f"  {sentencia:<28} {datos['n']:>7} x {datos['media_ms']:.3f} ms")
+    if 'primer_error' in informe:
+        print(f"primer error: {informe['primer_error']}")
+
+
+def comparar(informe, referencia, tolerancia=TOLERANCIA):
+    """Lista de regresiones frente a un informe guardado"""
+    regresiones = []
+    if informe['peticiones_por_s'] < referencia['peticiones_por_s'] * (1 - tolerancia):
+        regresiones.append(f"rendimiento {informe['peticiones_por_s']} < {referencia['peticiones_por_s']} pet/s")
+    for paso, datos in informe['pasos'].items():
+        previo = referencia['pasos'].get(paso)
+        if previo and datos['n'] and datos['p99_ms'] > previo['p99_ms'] * (1 + tolerancia):
+            regresiones.append(f"{paso}: p99 {datos['p99_ms']} ms > {previo['p99_ms']} ms")
+    if informe['errores'] > referencia['errores']:
+        regresiones.append(f"errores: {informe['errores']} > {referencia['errores']}")
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help="instancia ya arrancada; si no se indica se arranca una local")
+    parser.add_argument('--modo', choices=('sync', 'asgi'), default='sync', help="modo de la instancia local")
+    parser.add_argument('--workers', type=int, default=1, help="workers de la instancia local")
+    parser.add_argument('--usuarios', type=int, default=50)
+    parser.add_argument('--concurrencia', type=int, default=10)
+    parser.add_argument('--acierto', type=float, default=0.8, help="probabilidad de responder bien")
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--guardar', help="guardar el informe en este JSON")
+    parser.add_argument('--comparar', help="comparar con un informe JSON guardado")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA)
+    args = parser.parse_args(argv)
+    random.seed(args.semilla)
+
+    catalogo = None
+    if os.path.exists('lecciones_maya_kiche.json'):
+        catalogo = CatalogoLecciones(cargar_lecciones('lecciones_maya_kiche.json'))
+
+    proceso = None
+    token = os.environ.get('METRICAS_TOKEN')
+    if args.url:
+        partes = urlsplit(args.url)
+        anfitrion, puerto = partes.hostname, partes.port or 80
+    else:
+        anfitrion, puerto = '127.0.0.1', 18480
+        comando, entorno = (['gunicorn', 'asgi:aplicacion'], {'MODO_ASGI': '1'}) if args.modo == 'asgi' \
+            else (['gunicorn', 'app:app'], {})
+        # /metrics está cerrado sin token: la instancia local recibe uno propio
+        token = token or secrets.token_hex(16)
+        entorno['METRICAS_TOKEN'] = token
+        # Con un solo usuario por recorrido el límite de respuestas no llega a actuar
+        proceso = arrancar_servidor(comando, entorno, puerto, args.workers)
+
+    try:
+        informe = ejecutar(anfitrion, puerto, args.usuarios, args.concurrencia, args.acierto, catalogo, token)
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+
+    imprimir(informe)
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            regresiones = comparar(informe, json.load(f), args.tolerancia)
+        for regresion in regresiones:
+            print(f"REGRESIÓN: {regresion}")
+        return 1 if regresiones else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""Repetición espaciada (estilo SM-2/Leitner) para elegir la siguiente palabra.
+
+Cada palabra de una lección tiene, por usuario, una caja, un factor de
+facilidad, un intervalo y el momento en que vuelve a tocar. Las palabras
+viven en un heap ordenado por ese momento, así que elegir la siguiente y
+registrar una respuesta cuestan O(log n) aunque el historial crezca.
+"""
+import heapq
+import random
+import time
+
+# Segundos hasta repasar una palabra acertada por primera vez
+INTERVALO_INICIAL = 60
+
+FACILIDAD_INICIAL = 2.5
+FACILIDAD_MINIMA = 1.3
+FACILIDAD_MAXIMA = 3.0
+
+SQL_CARGAR = '''SELECT palabra, caja, facilidad, intervalo, proxima FROM repaso
+                WHERE usuario_id = ? AND leccion_id = ?'''
+SQL_GUARDAR = '''INSERT INTO repaso (usuario_id, leccion_id, palabra, caja, facilidad, intervalo, proxima)
+                 VALUES (?, ?, ?, ?, ?, ?, ?)
+                 ON CONFLICT(usuario_id, leccion_id, palabra) DO UPDATE SET
+                 caja = excluded.caja, facilidad = excluded.facilidad,
+                 intervalo = excluded.intervalo, proxima = excluded.proxima'''
+
+
+class EstadoPalabra:
+    """Estado de repaso de una palabra para un usuario"""
+
+    __slots__ = ('caja', 'facilidad', 'intervalo', 'proxima', 'version')
+
+    def __init__(self, caja=0, facilidad=FACILIDAD_INICIAL, intervalo=0.0, proxima=0.0):
+        self.caja = caja
+        self.facilidad = facilidad
+        self.intervalo = intervalo
+        self.proxima = proxima
+        self.version = 0
+
+    def responder(self, correcta, ahora):
+        if correcta:
+            self.caja += 1
+            self.intervalo = INTERVALO_INICIAL if self.caja == 1 else self.intervalo * self.facilidad
+            self.facilidad = min(FACILIDAD_MAXIMA, self.facilidad + 0.1)
+        else:
+            # Vuelve a la primera caja y toca de nuevo en cuanto se pueda
+            self.caja = 0
+            self.intervalo = 0.0
+            self.facilidad = max(FACILIDAD_MINIMA, self.facilidad - 0.2)
+        self.proxima = ahora + self.intervalo
+        self.version += 1
+
+
+class PlanRepaso:
+    """Cola de prioridad de las palabras de una lección para un usuario.
+
+    Las entradas del heap que quedan viejas al responder una palabra no se
+    borran: se descartan al llegar a la cima comparando su versión.
+    """
+
+    def __init__(self, palabras, estados=None):
+        """`palabras` son las respuestas maya de la lección, en orden;
+        `estados` es un dict palabra -> (caja, facilidad, intervalo, proxima)"""
+        estados = estados or {}
+        self.palabras = tuple(palabras)
+        self.estados = []
+        self._heap = []
+        for indice, palabra in enumerate(self.palabras):
+            # Un objeto por índice, aunque la palabra se repita en la lección
+            estado = EstadoPalabra(*estados.get(palabra, ()))
+            self.estados.append(estado)
+            # Las palabras nuevas (proxima = 0) salen en orden aleatorio
+            self._heap.append((estado.proxima, random.random(), indice, estado.version))
+        heapq.heapify(self._heap)
+
+    def _limpiar_cima(self):
+        heap = self._heap
+        while heap and heap[0][3] != self.estados[heap[0][2]].version:
+            heapq.heappop(heap)
+
+    def siguiente(self, evitar=None):
+        """Índice de la palabra que toca antes, evitando repetir `evitar` si hay otra"""
+        self._limpiar_cima()
+        if not self._heap:
+            return None
+        primera = self._heap[0]
+        if primera[2] != evitar or len(self.palabras) < 2:
+            return primera[2]
+
+        heapq.heappop(self._heap)
+        self._limpiar_cima()
+        indice = self._heap[0][2] if self._heap else primera[2]
+        heapq.heappush(self._heap, primera)
+        return indice
+
+    def proximas(self, cantidad):
+        """Índices de las `cantidad` palabras distintas que tocan antes, en orden"""
+        vigentes = (e for e in self._heap if e[3] == self.estados[e[2]].version)
+        return [e[2] for e in heapq.nsmallest(cantidad, vigentes)]
+
+    def registrar(self, indice, correcta, ahora=None):
+        """Actualizar la palabra tras una respuesta y devolver su nuevo estado"""
+        estado = self.estados[indice]
+        estado.responder(correcta, time.time() if ahora is None else ahora)
+        heapq.heappush(self._heap, (estado.proxima, random.random(), indice, estado.version))
+        # Reconstruir si las entradas viejas superan a las vigentes
+        if len(self._heap) > 2 * len(self.palabras) + 16:
+            self._heap = [(e.proxima, random.random(), i, e.version) for i, e in enumerate(self.estados)]
+            heapq.heapify(self._heap)
+        return estado
+
+
+def cargar_plan(conn, usuario_id, leccion_id, palabras):
+    """Construir el plan de una lección con el estado guardado del usuario"""
+    estados = {fila[0]: fila[1:] for fila in conn.execute(SQL_CARGAR, (usuario_id, leccion_id))}
+    return PlanRepaso(palabras, estados)
+
+
+def fila_estado(usuario_id, leccion_id, palabra, estado):
+    """Parámetros de SQL_GUARDAR para un estado"""
+    return (usuario_id, leccion_id, palabra, estado.caja, estado.facilidad, estado.intervalo, estado.proxima)
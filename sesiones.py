@@ -0,0 +1,213 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from basedatos import PoolConexiones
+from migraciones import migrar
+
+
+class AlmacenMemoria:
+    """Almacén LRU en el proceso, con expiración por TTL.
+
+    Solo sirve con un único proceso (o con gunicorn --threads): cada worker
+    tiene su propia copia.
+    """
+
+    def __init__(self, capacidad=10000):
+        self.capacidad = capacidad
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, sid, ttl=None):
+        """Datos de la sesión; con `ttl`, su caducidad vuelve a contar desde ahora"""
+        with self._lock:
+            entrada = self._datos.get(sid)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            expira, datos = entrada
+            ahora = time.time()
+            if expira < ahora:
+                del self._datos[sid]
+                self.fallos += 1
+                return None
+            if ttl is not None:
+                self._datos[sid] = (ahora + ttl, datos)
+            self._datos.move_to_end(sid)
+            self.aciertos += 1
+            return datos
+
+    def guardar(self, sid, datos, ttl):
+        with self._lock:
+            self._datos[sid] = (time.time() + ttl, datos)
+            self._datos.move_to_end(sid)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+
+    def eliminar(self, sid):
+        with self._lock:
+            self._datos.pop(sid, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def purgar(self):
+        """Eliminar todas las sesiones expiradas"""
+        ahora = time.time()
+        with self._lock:
+            for sid in [s for s, (expira, _) in self._datos.items() if expira < ahora]:
+                del self._datos[sid]
+
+
+class AlmacenSQLite:
+    """Almacén en la tabla `sesiones` de maya_kiche.db, compartido entre workers"""
+
+    # Cada cuántas escrituras se borran las sesiones expiradas
+    PURGAR_CADA = 500
+
+    def __init__(self, ruta=None, pool=None):
+        self.db = pool or PoolConexiones(ruta)
+        self._escrituras = 0
+        # La tabla la crea la migración v8
+        migrar(self.db.conexion())
+
+    def obtener(self, sid, ttl=None):
+        """Datos de la sesión; con `ttl`, su caducidad se renueva.
+
+        Para no escribir en cada petición, solo se renueva cuando ya pasó la
+        mitad del TTL: una sesión en uso nunca caduca.
+        """
+        ahora = time.time()
+        fila = self.db.conexion().execute(
+            "SELECT datos, expira FROM sesiones WHERE id = ? AND expira >= ?", (sid, ahora)).fetchone()
+        if fila is None:
+            return None
+        datos, expira = fila
+        if ttl is not None and expira - ahora < ttl / 2:
+            with self.db.transaccion() as conn:
+                conn.execute("UPDATE sesiones SET expira = ? WHERE id = ?", (ahora + ttl, sid))
+        return datos
+
+    def guardar(self, sid, datos, ttl):
+        with self.db.transaccion() as conn:
+            conn.execute("INSERT OR REPLACE INTO sesiones (id, datos, expira) VALUES (?, ?, ?)",
+                         (sid, datos, time.time() + ttl))
+        self._escrituras += 1
+        if self._escrituras % self.PURGAR_CADA == 0:
+            self.purgar()
+
+    def eliminar(self, sid):
+        with self.db.transaccion() as conn:
+            conn.execute("DELETE FROM sesiones WHERE id = ?", (sid,))
+
+    def purgar(self):
+        """Eliminar todas las sesiones expiradas"""
+        with self.db.transaccion() as conn:
+            conn.execute("DELETE FROM sesiones WHERE expira < ?", (time.time(),))
+
+
+class SesionServidor(CallbackDict, SessionMixin):
+    """Sesión cuyo contenido vive en el servidor; la cookie solo lleva el id"""
+
+    def __init__(self, datos=None, sid=None, nueva=False):
+        def al_modificar(self):
+            self.modified = True
+
+        super().__init__(datos, al_modificar)
+        self.sid = sid
+        self.new = nueva
+        self.modified = False
+        # Id que tenía la sesión antes de regenerar(); se borra del almacén al guardar
+        self.anterior = None
+
+    def regenerar(self):
+        """Cambiar el id de la sesión (al entrar un usuario): un id fijado de antemano deja de valer"""
+        if not self.new and self.anterior is None:
+            self.anterior = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+
+class InterfazSesionServidor(SessionInterface):
+    """SessionInterface de Flask sobre un almacén `AlmacenMemoria` o `AlmacenSQLite`.
+
+    La cookie contiene un id aleatorio de 256 bits, así que no hace falta
+    firmar ni volver a serializar el estado en cada respuesta: solo se
+    escribe en el almacén cuando la sesión cambia.
+    """
+
+    serializador = TaggedJSONSerializer()
+
+    # Función opcional que recibe el tamaño en bytes de cada sesión guardada
+    observar_tamano = None
+
+    def __init__(self, almacen, ttl=None):
+        self.almacen = almacen
+        self.ttl = ttl
+
+    def _ttl(self, app):
+        if self.ttl is not None:
+            return self.ttl
+        return app.permanent_session_lifetime.total_seconds()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            datos = self.almacen.obtener(sid, self._ttl(app))
+            if datos is not None:
+                return SesionServidor(self.serializador.loads(datos), sid=sid)
+        return SesionServidor(sid=secrets.token_urlsafe(32), nueva=True)
+
+    def save_session(self, app, session, response):
+        nombre = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        ruta = self.get_cookie_path(app)
+
+        if session.anterior is not None:
+            self.almacen.eliminar(session.anterior)
+
+        if not session:
+            if session.modified:
+                self.almacen.eliminar(session.sid)
+                response.delete_cookie(nombre, domain=dominio, path=ruta)
+            return
+
+        if session.modified:
+            datos = self.serializador.dumps(dict(session))
+            self.almacen.guardar(session.sid, datos, self._ttl(app))
+            if self.observar_tamano is not None:
+                self.observar_tamano(len(datos))
+
+        if session.new or session.anterior is not None or (session.permanent and app.config['SESSION_REFRESH_EACH_REQUEST']):
+            response.set_cookie(
+                nombre,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=dominio,
+                path=ruta,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def crear_interfaz(backend, pool=None, ttl=None):
+    """Crear la interfaz de sesión para `backend` ('cookie', 'memoria' o 'sqlite').
+
+    Devuelve None para 'cookie', que deja la sesión firmada de Flask.
+    """
+    if backend in (None, '', 'cookie'):
+        return None
+    if backend == 'memoria':
+        return InterfazSesionServidor(AlmacenMemoria(), ttl=ttl)
+    if backend == 'sqlite':
+        return InterfazSesionServidor(AlmacenSQLite(pool=pool), ttl=ttl)
+    raise ValueError(f"Backend de sesión desconocido: {backend}")
@@ -0,0 +1,142 @@
+// Contestar los ejercicios por lotes: se piden N de una vez y las respuestas
+// se envían juntas al terminar el lote. Sin JavaScript la página sigue
+// funcionando con un formulario por ejercicio. En el modo escrito el lote
+// no trae opciones: se contesta con el campo de texto.
+const contenedor = document.getElementById('ejercicio');
+const textoPuntos = document.getElementById('puntos');
+const textoVidas = document.getElementById('vidas');
+const textoPalabra = document.getElementById('palabra');
+const imagen = document.getElementById('imagen');
+const opciones = document.getElementById('opciones');
+const respuestaTexto = document.getElementById('respuesta-texto');
+const saltar = document.getElementById('saltar');
+
+let lote = null;
+let posicion = 0;
+let respuestas = [];
+
+function mostrarEstado(datos) {
+    textoPuntos.textContent = 'Puntos: ' + datos.puntos;
+    textoVidas.textContent = 'Vidas: ' + datos.vidas;
+}
+
+function mostrarAviso(texto, tipo) {
+    contenedor.querySelectorAll('.alert').forEach(aviso => aviso.remove());
+    const aviso = document.createElement('div');
+    aviso.className = 'alert ' + tipo;
+    aviso.textContent = texto;
+    contenedor.querySelector('.pregunta').before(aviso);
+}
+
+function mostrarEjercicio() {
+    const ejercicio = lote.ejercicios[posicion];
+    textoPalabra.textContent = ejercicio.pregunta;
+    imagen.hidden = !ejercicio.imagen;
+    if (ejercicio.imagen) {
+        imagen.src = ejercicio.imagen;
+    }
+    if (lote.modo === 'escribir') {
+        respuestaTexto.disabled = false;
+        respuestaTexto.value = '';
+        respuestaTexto.focus();
+        return;
+    }
+    opciones.replaceChildren(...ejercicio.opciones.map(opcion => {
+        const boton = document.createElement('button');
+        boton.type = 'button';
+        boton.className = 'opcion-btn';
+        boton.textContent = opcion;
+        boton.addEventListener('click', () => responder(opcion));
+        return boton;
+    }));
+}
+
+function pedirLote() {
+    return fetch(contenedor.dataset.lote)
+        .then(respuesta => respuesta.ok ? respuesta.json() : Promise.reject(respuesta))
+        .then(datos => {
+            lote = datos;
+            posicion = 0;
+            respuestas = [];
+            mostrarEstado(datos);
+            mostrarEjercicio();
+        });
+}
+
+function enviarRespuestas() {
+    if (lote.modo === 'escribir') {
+        respuestaTexto.disabled = true;
+    } else {
+        opciones.replaceChildren();
+    }
+    fetch(contenedor.dataset.respuestas, {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({token: lote.token, respuestas: respuestas})
+    })
+        .then(respuesta => respuesta.ok ? respuesta.json() : Promise.reject(respuesta))
+        .then(datos => {
+            if (datos.terminado) {
+                window.location = contenedor.dataset.fin;
+                return;
+            }
+            const aciertos = datos.resultados.filter(r => r.acierto).length;
+            const contestadas = datos.resultados.filter(r => r.acierto !== null).length;
+            // En el modo escrito se explica cada respuesta que no fue exacta
+            const explicaciones = datos.resultados.filter(r => r.explicacion).map(r => r.explicacion);
+            mostrarAviso([aciertos + ' de ' + contestadas + ' respuestas correctas.', ...explicaciones].join(' '),
+                         aciertos === contestadas ? 'success' : 'error');
+            return pedirLote();
+        })
+        .catch(() => window.location.reload());
+}
+
+function responder(opcion) {
+    // La pronunciación de la palabra se oye al contestar, no antes
+    const audio = lote.ejercicios[posicion].audio;
+    if (audio && opcion !== null) {
+        new Audio(audio).play().catch(() => {});
+    }
+    respuestas.push(opcion);
+    posicion += 1;
+    if (posicion < lote.ejercicios.length) {
+        mostrarEjercicio();
+    } else {
+        enviarRespuestas();
+    }
+}
+
+if (respuestaTexto) {
+    respuestaTexto.form.addEventListener('submit', evento => {
+        if (lote) {
+            evento.preventDefault();
+            if (!respuestaTexto.disabled && respuestaTexto.value.trim()) {
+                responder(respuestaTexto.value);
+            }
+        }
+    });
+}
+
+saltar.addEventListener('click', evento => {
+    if (lote) {
+        evento.preventDefault();
+        responder(null);
+    }
+});
+
+// Precargar de una vez todas las imágenes y audios de la lección; como sus
+// URLs llevan la huella del contenido, quedan en la caché del navegador
+function precargarMedios() {
+    return fetch(contenedor.dataset.medios)
+        .then(respuesta => respuesta.ok ? respuesta.json() : Promise.reject(respuesta))
+        .then(manifiesto => manifiesto.urls.forEach(url => {
+            const enlace = document.createElement('link');
+            enlace.rel = 'prefetch';
+            enlace.href = url;
+            document.head.append(enlace);
+        }));
+}
+
+// Si la API falla se queda el ejercicio de la página
+pedirLote().catch(() => {});
+precargarMedios().catch(() => {});
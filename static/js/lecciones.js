@@ -0,0 +1,15 @@
+function showTab(tabName) {
+    // Hide all tab panels
+    const panels = document.querySelectorAll('.tab-panel');
+    panels.forEach(panel => panel.style.display = 'none');
+
+    // Remove active class from all tab buttons
+    const buttons = document.querySelectorAll('.tab-btn');
+    buttons.forEach(button => button.classList.remove('active'));
+
+    // Show selected tab panel
+    document.getElementById(tabName).style.display = 'block';
+
+    // Add active class to clicked button
+    event.target.classList.add('active');
+}
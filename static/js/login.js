@@ -0,0 +1,32 @@
+// Sugerir usuarios por prefijo mientras se escribe
+const entrada = document.getElementById('nombre');
+const sugerencias = document.getElementById('sugerencias');
+let espera = null;
+let ultimaBusqueda = null;
+
+function buscarUsuarios() {
+    const prefijo = entrada.value.trim();
+    if (prefijo === ultimaBusqueda) {
+        return;
+    }
+    ultimaBusqueda = prefijo;
+
+    fetch(entrada.dataset.url + '?q=' + encodeURIComponent(prefijo))
+        .then(respuesta => respuesta.json())
+        .then(datos => {
+            if (prefijo !== ultimaBusqueda) {
+                return;
+            }
+            sugerencias.replaceChildren(...datos.usuarios.map(nombre => {
+                const opcion = document.createElement('option');
+                opcion.value = nombre;
+                return opcion;
+            }));
+        });
+}
+
+entrada.addEventListener('input', () => {
+    clearTimeout(espera);
+    espera = setTimeout(buscarUsuarios, 150);
+});
+entrada.addEventListener('focus', buscarUsuarios);
@@ -0,0 +1,64 @@
+from sesiones import AlmacenMemoria
+
+# Usuarios devueltos por página en la búsqueda
+USUARIOS_POR_PAGINA = 20
+
+# Solo se guardan en caché las primeras páginas de prefijos cortos, que son
+# las que más se repiten mientras alguien escribe su nombre
+LARGO_MAXIMO_EN_CACHE = 3
+TTL_CACHE = 30
+
+SQL_BUSCAR = '''SELECT nombre FROM usuarios
+                WHERE nombre LIKE ? ESCAPE '\\' AND nombre > ? COLLATE NOCASE
+                ORDER BY nombre COLLATE NOCASE LIMIT ?'''
+
+
+def _escapar_like(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def buscar_usuarios(conn, prefijo='', despues='', limite=USUARIOS_POR_PAGINA):
+    """Devolver hasta `limite` nombres que empiezan por `prefijo`, en orden.
+
+    La paginación es por clave: `despues` es el último nombre de la página
+    anterior, así cada página usa el índice `idx_usuarios_nombre_nocase`
+    sin recorrer las anteriores.
+    """
+    patron = _escapar_like(prefijo) + '%'
+    return [fila[0] for fila in conn.execute(SQL_BUSCAR, (patron, despues, limite))]
+
+
+class BuscadorUsuarios:
+    """Búsqueda por prefijo con una pequeña caché LRU de prefijos frecuentes"""
+
+    def __init__(self, pool, capacidad=256):
+        self.db = pool
+        self.cache = AlmacenMemoria(capacidad)
+        self.aciertos = 0
+        self.fallos = 0
+
+    def buscar(self, prefijo='', despues='', limite=USUARIOS_POR_PAGINA):
+        """Devolver (nombres, siguiente); `siguiente` es None en la última página"""
+        limite = max(1, min(limite, 100))
+        cacheable = not despues and len(prefijo) <= LARGO_MAXIMO_EN_CACHE
+        clave = (prefijo.casefold(), limite)
+
+        if cacheable:
+            resultado = self.cache.obtener(clave)
+            if resultado is not None:
+                self.aciertos += 1
+                return resultado
+            self.fallos += 1
+
+        # Se pide uno de más para saber si hay otra página
+        nombres = buscar_usuarios(self.db.conexion(), prefijo, despues, limite + 1)
+        siguiente = nombres[limite - 1] if len(nombres) > limite else None
+        resultado = (nombres[:limite], siguiente)
+
+        if cacheable:
+            self.cache.guardar(clave, resultado, TTL_CACHE)
+        return resultado
+
+    def invalidar(self):
+        """Vaciar la caché cuando se crean o eliminan usuarios"""
+        self.cache.limpiar()